@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: async_writer.py
+
+Asynchroniczny zapis plików wynikowych – zapis na dysk nakłada się na obliczenia kolejnych etapów.
+  - AsyncWriter – ograniczona kolejka (max_pending zadań; przy pełnej kolejce submit czeka, więc
+    w pamięci nie gromadzi się więcej niż max_pending tabel) i jeden wątek w tle wykonujący zapisy,
+  - każdy zapis jest atomowy: plik tymczasowy w tym samym folderze, potem os.replace – czytelnik
+    widzi poprzednią wersję pliku albo całą nową, nigdy częściowo zapisaną,
+  - wait_for(ścieżki) czeka tylko na zapisy wskazanych plików (lub plików w folderze) – etap potoku
+    czeka na swoje wejścia, nie na wszystkie zaległe zapisy,
+  - flush() czeka na wszystkie zapisy i zwraca błędy (ścieżka, wyjątek) zebrane w tle.
+Moduł ma jeden domyślny zapisujący (set_writer / get_writer). Bez niego write_csv zapisuje od razu
+(nadal atomowo) – skrypty uruchamiane samodzielnie działają jak wcześniej.
+main.py włącza zapis asynchroniczny na czas potoku (config 'async_writes', domyślnie włączony),
+a Pipeline.finish (pipeline_graph.py) opróżnia kolejkę i zgłasza błędy zapisu.
+"""
+
+import os
+import sys
+import time
+import queue
+import shutil
+import tempfile
+import threading
+
+class AsyncWriter:
+    def __init__(self, max_pending=4):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.errors = []
+        self.pending = {}
+        self.cond = threading.Condition()
+        self.stats = {"files": 0, "bytes": 0, "write_seconds": 0.0, "blocked_seconds": 0.0}
+        self.thread = threading.Thread(target=self._run, name="async-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, path, write):
+        """Zleca write(ścieżka_tymczasowa) dla pliku path; czeka tylko, gdy kolejka jest pełna."""
+        path = os.path.abspath(path)
+        with self.cond:
+            self.pending[path] = self.pending.get(path, 0) + 1
+        start = time.perf_counter()
+        self.queue.put((path, write))
+        self.stats["blocked_seconds"] += time.perf_counter() - start
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            path, write = item
+            start = time.perf_counter()
+            try:
+                atomic_write(path, write)
+                self.stats["files"] += 1
+                self.stats["bytes"] += os.path.getsize(path)
+            except Exception as e:
+                self.errors.append((path, e))
+            finally:
+                self.stats["write_seconds"] += time.perf_counter() - start
+                with self.cond:
+                    self.pending[path] -= 1
+                    if not self.pending[path]:
+                        del self.pending[path]
+                    self.cond.notify_all()
+                self.queue.task_done()
+
+    def _busy(self, paths):
+        for pending in self.pending:
+            for path in paths:
+                if pending == path or pending.startswith(path + os.sep):
+                    return True
+        return False
+
+    def wait_for(self, paths):
+        """Czeka, aż zakończą się zlecone zapisy podanych plików (dla folderu – plików w nim)."""
+        paths = [os.path.abspath(p) for p in paths]
+        with self.cond:
+            self.cond.wait_for(lambda: not self._busy(paths))
+
+    def flush(self):
+        """Czeka na wszystkie zapisy; zwraca i czyści listę błędów [(ścieżka, wyjątek), ...]."""
+        self.queue.join()
+        errors, self.errors = self.errors, []
+        return errors
+
+    def close(self):
+        """flush() i zakończenie wątku; zwraca błędy zapisu."""
+        errors = self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        return errors
+
+def atomic_write(path, write):
+    """write(tmp) do pliku tymczasowego obok path, potem os.replace(tmp, path); przy błędzie tmp jest usuwany."""
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+_writer = None
+
+def set_writer(writer):
+    """Ustawia domyślny zapisujący (None – zapis synchroniczny); zwraca poprzedni."""
+    global _writer
+    previous, _writer = _writer, writer
+    return previous
+
+def get_writer():
+    return _writer
+
+def write_csv(df, path, **to_csv_kwargs):
+    """
+    df.to_csv(path, **to_csv_kwargs) przez domyślny zapisujący (w tle) albo od razu, gdy go nie ustawiono.
+    Zapisywana jest płytka kopia df (copy-on-write) – późniejsze zmiany df przez wywołującego nie trafiają do pliku.
+    """
+    snapshot = df.copy(deep=False)
+    write = lambda tmp_path: snapshot.to_csv(tmp_path, **to_csv_kwargs)
+    if _writer is None:
+        atomic_write(path, write)
+    else:
+        _writer.submit(path, write)
+
+def wait_for(*paths):
+    """Czeka na zaległe zapisy podanych plików/folderów (bez domyślnego zapisującego – nic nie robi)."""
+    if _writer is not None:
+        _writer.wait_for(paths)
+
+def flush_writes():
+    """Czeka na wszystkie zaległe zapisy domyślnego zapisującego i zwraca błędy (wypisując je)."""
+    if _writer is None:
+        return []
+    errors = _writer.flush()
+    for path, error in errors:
+        print(f"Błąd zapisu pliku {path}: {error}")
+    return errors
+
+def benchmark_async_writes(n_cycles=1000, n_wells=96, repeats=2):
+    """
+    Potok z main.py (parse → merge → qc → blank → features → analysis → ratio) na syntetycznej płytce
+    (n_cycles cykli × 2 pomiary × n_wells dołków): czas całkowity z zapisem synchronicznym i asynchronicznym.
+    """
+    import numpy as np
+    import pandas as pd
+    import main
+    from pipeline_graph import Pipeline
+    rows = np.array(list("ABCDEFGH"))[np.arange(n_wells) // 12]
+    cols = np.arange(n_wells) % 12 + 1
+    wells = np.char.add(rows, cols.astype(str))
+    mapping = {w: ("BLANK" if i % 12 == 0 else f"S{i % 12}") for i, w in enumerate(wells)}
+    rng = np.random.default_rng(0)
+    frames = []
+    for meas, level in (("Meas A", 5000), ("Meas B", 800)):
+        frames.append(pd.DataFrame({
+            "Measurement": meas,
+            "Kinetics": np.repeat(np.arange(1, n_cycles + 1), n_wells),
+            "Well": np.tile(wells, n_cycles),
+            "Value": rng.normal(level, 50, n_cycles * n_wells).round(),
+        }))
+    workdir = tempfile.mkdtemp(prefix="async_writer_")
+    source = os.path.join(workdir, "plate.csv")
+    pd.concat(frames, ignore_index=True).to_csv(source, index=False)
+
+    def run(out_dir):
+        pipeline = Pipeline(out_dir, force=True)
+        long_a, long_b = os.path.join(out_dir, "long_measA.csv"), os.path.join(out_dir, "long_measB.csv")
+        merged = os.path.join(out_dir, "long_merged.csv")
+        qc_flags = os.path.join(out_dir, "qc", "well_flags.csv")
+        summary = os.path.join(out_dir, "blank_corrected_analysis", "blank_corrected_summary.csv")
+        pipeline.stage("parse", main.parse_enspire_file, source, out_dir, sample_mapping=mapping,
+                       inputs=[source], outputs=[long_a, long_b])
+        pipeline.stage("merge", main.merge_long_files, long_a, long_b, merged, inputs=[long_a, long_b], outputs=[merged])
+        pipeline.stage("qc", main.qc_file, merged, inputs=[merged], outputs=[qc_flags])
+        pipeline.stage("blank", main.blank_correct_file, merged, 20, qc_flags=qc_flags,
+                       inputs=[merged, qc_flags], outputs=[summary])
+        pipeline.stage("features", main.extract_kinetic_features, merged, 20, summary_file=summary,
+                       inputs=[merged, summary], outputs=[os.path.join(out_dir, "kinetic_features")])
+        pipeline.stage("analysis", main.analyze_long_file, summary, 20, inputs=[summary],
+                       outputs=[os.path.join(os.path.dirname(summary), "analysis")])
+        pipeline.stage("ratio", main.calculate_ratio, merged, 20, inputs=[merged],
+                       outputs=[os.path.join(out_dir, "Meas A_to_Meas B_ratio")])
+        pipeline.finish()
+
+    timings = {}
+    try:
+        for label, writer_factory in (("synchronicznie", lambda: None), ("asynchronicznie", AsyncWriter)):
+            best = None
+            for i in range(repeats):
+                out_dir = os.path.join(workdir, f"{label}_{i}")
+                writer = writer_factory()
+                previous = set_writer(writer)
+                start = time.perf_counter()
+                try:
+                    run(out_dir)
+                finally:
+                    set_writer(previous)
+                    if writer is not None:
+                        writer.close()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = best
+        sync_dir, async_dir = os.path.join(workdir, "synchronicznie_0"), os.path.join(workdir, "asynchronicznie_0")
+        same = all(open(os.path.join(sync_dir, rel), "rb").read() == open(os.path.join(async_dir, rel), "rb").read()
+                   for rel in ("long_measA.csv", "long_merged.csv", os.path.join("qc", "well_flags.csv"),
+                               os.path.join("blank_corrected_analysis", "blank_corrected_summary.csv")))
+        print(f"\nPotok ({n_cycles} cykli × 2 pomiary × {n_wells} dołków):")
+        for label, seconds in timings.items():
+            print(f"  zapis {label}: {seconds:.2f} s")
+        saved = timings["synchronicznie"] - timings["asynchronicznie"]
+        print(f"  oszczędność: {saved:.2f} s ({100 * saved / timings['synchronicznie']:.0f}%), "
+              f"pliki identyczne: {'tak' if same else 'NIE'}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_async_writes()
+        sys.exit(0)
+    print("Moduł używany przez main.py; uruchom z --benchmark, aby zmierzyć zysk z zapisu asynchronicznego.")
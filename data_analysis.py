@@ -4,33 +4,51 @@
 Plik: data_analysis.py
 
 Analizuje plik long (lub blank_corrected_summary.csv) – grupuje dane według Measurement, Sample, Kinetics i Time_min,
-obliczając statystyki (mean, std, count) dla wybranej kolumny (Corrected, jeśli istnieje, w przeciwnym razie Value).
+obliczając statystyki (mean, std, count) dla wybranej kolumny (Corrected, jeśli istnieje, w przeciwnym razie Value)
+oraz statystyki dostateczne sum i M2 (łączenie podsumowań wielu płytek – data_pooling.py).
+Opcjonalnie (qc_flags) wyklucza dołki oznaczone w kontroli jakości (data_qc.py).
+Dane wczytywane są ze wspólnym schematem typów (data_schema.py); pliki long (z kolumną Well)
+są agregowane jako kostka pomiar × cykl × dołek (plate_cube.py).
 Wynik zapisuje do pliku summary CSV. W tej wersji wykresy nie są generowane.
 """
 
 import os
-import pandas as pd
+from data_qc import load_qc_flags, qc_mask
+from data_schema import read_long_csv, time_minutes, apply_schema
+from plate_cube import PlateCube
+from group_stats import group_agg
+from async_writer import write_csv
 
-def analyze_long_file(input_file, measurement_interval):
+def analyze_long_file(input_file, measurement_interval, qc_flags=None):
     input_dir = os.path.dirname(input_file)
     output_folder = os.path.join(input_dir, "analysis")
     os.makedirs(output_folder, exist_ok=True)
     base_name = os.path.splitext(os.path.basename(input_file))[0]
     print(f"Folder wyjściowy: {output_folder}")
     try:
-        df = pd.read_csv(input_file, encoding="latin1")
+        df = read_long_csv(input_file)
         print("Wczytano dane:", df.shape)
     except Exception as e:
         print(f"Błąd wczytania {input_file}: {e}")
         return
-    df['Kinetics'] = pd.to_numeric(df['Kinetics'], errors="coerce")
     if "Time_min" not in df.columns:
-        df['Time_min'] = (df['Kinetics'] - 1) * measurement_interval
+        df['Time_min'] = time_minutes(df['Kinetics'], measurement_interval)
     value_column = "Corrected" if "Corrected" in df.columns else "Value"
-    summary = df.groupby(['Measurement','Sample','Kinetics','Time_min'])[value_column] \
-                .agg(['mean','std','count']).reset_index()
+    # Dla plików long (z kolumną Well) dołki oznaczone w QC są maskowane przed agregacją
+    flags = load_qc_flags(qc_flags)
+    if flags is not None and "Well" in df.columns:
+        df[value_column] = df[value_column].where(qc_mask(df, flags))
+    if "Well" in df.columns:
+        cube = PlateCube.from_long(df, value_column)
+        summary = cube.stats_frame(cube.replicate_stats(include_blank=True), measurement_interval,
+                                   {'mean': 'mean', 'std': 'std', 'n': 'count', 'sum': 'sum', 'm2': 'M2'})
+    else:
+        summary = group_agg(df, ['Measurement','Sample','Kinetics','Time_min'], value_column,
+                            ('mean', 'std', 'count', 'sum', 'M2'))
+        summary['M2'] = summary['M2'].fillna(0.0)
+    summary = apply_schema(summary)
     summary_path = os.path.join(output_folder, f"{base_name}_summary.csv")
-    summary.to_csv(summary_path, index=False)
+    write_csv(summary, summary_path, index=False)
     print(f"Podsumowanie zapisano do: {summary_path}")
 
 if __name__ == "__main__":
@@ -5,39 +5,43 @@ Plik: data_blank_corrected.py
 
 Dla pliku long (CSV) oblicza skorygowane wartości (Corrected = Sample_avg - Blank_avg)
 dla każdej grupy (Measurement, Sample, Kinetics, Time_min) i zapisuje wynik do blank_corrected_summary.csv.
+Oprócz średniej i std zapisywane są statystyki dostateczne (n, Sample_sum, Sample_M2), dzięki którym
+podsumowania wielu płytek można łączyć bez danych surowych (data_pooling.py).
+Opcjonalnie (qc_flags) wyklucza dołki oznaczone w kontroli jakości (data_qc.py).
+Dane wczytywane są ze wspólnym schematem typów (data_schema.py) – etykiety jako category –
+i przekształcane w kostkę pomiar × cykl × dołek (plate_cube.py); średnie BLANK i statystyki prób
+są redukcjami wzdłuż osi dołków.
 Nie generuje wykresów.
 """
 
 import os
 import pandas as pd
+from data_qc import load_qc_flags, qc_mask
+from data_schema import read_long_csv, apply_schema
+from plate_cube import PlateCube
+from async_writer import write_csv
 
-def blank_correct_file(input_file, measurement_interval):
+def blank_correct_file(input_file, measurement_interval, qc_flags=None):
     input_dir = os.path.dirname(input_file)
     analysis_folder = os.path.join(input_dir, "blank_corrected_analysis")
     os.makedirs(analysis_folder, exist_ok=True)
-    df = pd.read_csv(input_file, encoding="latin1")
-    df['Kinetics'] = pd.to_numeric(df['Kinetics'], errors="coerce")
-    df['Value'] = pd.to_numeric(df['Value'], errors="coerce")
-    df['Time_min'] = (df['Kinetics'] - 1) * measurement_interval
-    corrected_list = []
-    for meas in df['Measurement'].unique():
-        df_meas = df[df['Measurement'] == meas]
-        blank_avg = df_meas[df_meas['Sample'] == "BLANK"].groupby('Kinetics')['Value']\
-                      .mean().reset_index().rename(columns={'Value': 'Blank_avg'})
-        sample_stats = df_meas[df_meas['Sample'] != "BLANK"].groupby(['Sample','Kinetics','Time_min'])['Value']\
-                           .agg(['mean','std','count']).reset_index().rename(
-                           columns={'mean':'Sample_avg', 'std':'Sample_std', 'count':'n'})
-        merged = pd.merge(sample_stats, blank_avg, on='Kinetics', how='left')
-        merged['Blank_avg'] = merged['Blank_avg'].fillna(0)
-        merged['Corrected'] = merged['Sample_avg'] - merged['Blank_avg']
-        merged['Measurement'] = meas
-        corrected_list.append(merged)
-    if corrected_list:
-        result = pd.concat(corrected_list, ignore_index=True)
-    else:
+    df = read_long_csv(input_file)
+    # Dołki oznaczone w QC (data_qc.py) nie biorą udziału w średnich – maskowanie zamiast filtrowania
+    flags = load_qc_flags(qc_flags)
+    if flags is not None:
+        df['Value'] = df['Value'].where(qc_mask(df, flags))
+    cube = PlateCube.from_long(df)
+    stats = cube.blank_corrected()
+    result = cube.stats_frame(stats, measurement_interval, {
+        'mean': 'Sample_avg', 'std': 'Sample_std', 'n': 'n', 'blank': 'Blank_avg', 'corrected': 'Corrected',
+        'sum': 'Sample_sum', 'm2': 'Sample_M2'})
+    if result.empty:
         result = pd.DataFrame()
+    else:
+        result = apply_schema(result[['Sample', 'Kinetics', 'Time_min', 'Sample_avg', 'Sample_std', 'n',
+                                      'Blank_avg', 'Corrected', 'Measurement', 'Sample_sum', 'Sample_M2']])
     summary_path = os.path.join(analysis_folder, "blank_corrected_summary.csv")
-    result.to_csv(summary_path, index=False)
+    write_csv(result, summary_path, index=False)
     print("Blank-corrected summary zapisano do:", summary_path)
     return result
 
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: data_bootstrap.py
+
+Przedziały ufności bootstrap dla średnich skorygowanych (Corrected) i ilorazów pomiarów.
+Przy 3–5 replikatach ±std źle opisuje niepewność – szczególnie dla ilorazów.
+Losowanie dołków ze zwracaniem odbywa się dla wszystkich grup (Sample × Kinetics) naraz:
+  - dla każdej próby losowane są wsadowo indeksy replikatów (B × n) z generatora NumPy
+    o ziarnie pochodnym od seed (SeedSequence.spawn – wynik nie zależy od liczby procesów),
+    zamieniane na liczności (ile razy wylosowano każdy dołek),
+  - sumy ważone dla wszystkich cykli i losowań to jedno mnożenie macierzy wsadowe
+    (próby × cykle × replikaty) @ (próby × replikaty × B); cykle przetwarzane są porcjami,
+  - iloraz (np. Meas A / Meas B) używa tych samych wylosowanych dołków w liczniku i mianowniku
+    i odpowiada ilorazowi średnich skorygowanych rysowanemu w selektorze (F/OD Ratio).
+Wynikiem są przedziały percentylowe (CI_low, CI_high) oraz BCa (BCa_low, BCa_high; poprawka
+obciążenia z rozkładu bootstrap i przyspieszenie z jackknife). Próby można rozdzielić między procesy.
+Wynik zapisuje się do pliku bootstrap/bootstrap_ci.csv.
+"""
+
+import os
+import sys
+import time
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from data_schema import read_long_csv, apply_schema
+from plate_cube import PlateCube
+from async_writer import write_csv
+
+CI_COLUMNS = ["CI_low", "CI_high", "BCa_low", "BCa_high"]
+_NORMAL = NormalDist()
+_norm_cdf = np.vectorize(_NORMAL.cdf, otypes=[float])
+_norm_ppf = np.vectorize(_NORMAL.inv_cdf, otypes=[float])
+
+def _sample_layout(cube, include_blank=False):
+    """Macierz (próby × replikaty) indeksów dołków (-1 = uzupełnienie) oraz liczba replikatów."""
+    blank = cube.sample_code("BLANK")
+    codes = [c for c in range(len(cube.sample_names)) if include_blank or c != blank]
+    members = [np.flatnonzero(cube.sample_of_well == c) for c in codes]
+    r_max = max((len(m) for m in members), default=0)
+    wells = np.full((len(codes), r_max), -1, dtype=np.int64)
+    for i, m in enumerate(members):
+        wells[i, :len(m)] = m
+    return codes, wells, np.array([len(m) for m in members], dtype=np.int64)
+
+def _resample_counts(n_replicates, r_max, n_boot, seeds):
+    """Liczności (próby × replikaty × B): ile razy każdy replikat trafił do danego losowania."""
+    counts = np.zeros((len(n_replicates), r_max, n_boot), dtype=np.float32)
+    for i, (n, seed) in enumerate(zip(n_replicates, seeds)):
+        if n == 0:
+            continue
+        rng = np.random.default_rng(seed)
+        idx = rng.integers(0, n, size=(n_boot, n))
+        # bincount na indeksach przesuniętych o numer losowania – wszystkie losowania naraz
+        flat = (idx + np.arange(n_boot)[:, None] * r_max).ravel()
+        counts[i] = np.bincount(flat, minlength=n_boot * r_max).reshape(n_boot, r_max).T
+    return counts
+
+def _order_stat(sorted_boot, finite, alpha):
+    """Kwantyl alpha (tablica per grupa) z posortowanych wartości bootstrap (NaN na końcu)."""
+    ok = np.isfinite(alpha) & (finite > 0)
+    pos = np.clip(np.floor(np.where(ok, alpha, 0.0) * (finite - 1) + 0.5), 0, np.maximum(finite - 1, 0))
+    out = np.take_along_axis(sorted_boot, pos.astype(np.int64)[..., None], axis=-1)[..., 0].astype(float)
+    return np.where(ok, out, np.nan)
+
+def _bootstrap_part(task):
+    """
+    Obliczenia dla części prób (wywoływane także w procesach potomnych).
+    task: values (pomiary × próby × cykle × replikaty), blank (pomiary × cykle), n_replicates, seeds,
+          n_boot, alpha, kind ("mean" lub "ratio"), chunk_cycles.
+    """
+    values, blank, n_rep, seeds = task["values"], task["blank"], task["n_replicates"], task["seeds"]
+    n_boot, alpha, kind = task["n_boot"], task["alpha"], task["kind"]
+    n_meas, n_samples, n_cycles, r_max = values.shape
+    counts = _resample_counts(n_rep, r_max, n_boot, seeds)
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    z_lo, z_hi = _NORMAL.inv_cdf(alpha / 2), _NORMAL.inv_cdf(1 - alpha / 2)
+    out = {name: np.full((n_samples, n_cycles), np.nan) for name in ["Estimate"] + CI_COLUMNS}
+
+    blank32 = blank.astype(np.float32)
+
+    def statistic(sums, cnts, k_slice):
+        # Dla tablic float32 BLANK też float32 – bez promocji całych tablic bootstrap do float64
+        ref = blank32 if sums.dtype == np.float32 else blank
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corrected = sums / cnts - ref[:, None, k_slice, None]
+            return corrected[0] if kind == "mean" else corrected[0] / corrected[1]
+
+    chunk = task["chunk_cycles"]
+    for start in range(0, n_cycles, chunk):
+        ks = slice(start, min(start + chunk, n_cycles))
+        x = filled[:, :, ks, :].astype(np.float32)
+        v = valid[:, :, ks, :].astype(np.float32)
+        # (pomiary, próby, cykle, replikaty) @ (próby, replikaty, B) -> (pomiary, próby, cykle, B)
+        sums = np.matmul(x, counts[None])
+        if (v.sum(axis=-1) == n_rep[None, :, None]).all():
+            # Bez braków liczba wylosowanych dołków to zawsze n próby
+            cnts = n_rep.astype(np.float32)[None, :, None, None]
+        else:
+            cnts = np.matmul(v, counts[None])
+        boot = statistic(sums, cnts, ks).astype(np.float32)
+
+        # Estymata (wszystkie dołki z wagą 1) oraz jackknife (pominięcie jednego replikatu)
+        full_sum = x.sum(axis=3, dtype=np.float64)
+        full_cnt = v.sum(axis=3, dtype=np.float64)
+        estimate = statistic(full_sum[..., None], full_cnt[..., None], ks)[..., 0]
+        jack = statistic(full_sum[..., None] - x, full_cnt[..., None] - v, ks)
+        jack_ok = (v.min(axis=0) > 0) & np.isfinite(jack)
+        n_jack = jack_ok.sum(axis=-1)
+        jack_mean = np.where(jack_ok, jack, 0.0).sum(axis=-1) / np.maximum(n_jack, 1)
+        d = np.where(jack_ok, jack_mean[..., None] - jack, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            accel = (d ** 3).sum(axis=-1) / (6.0 * ((d ** 2).sum(axis=-1)) ** 1.5)
+        accel = np.where(np.isfinite(accel), accel, 0.0)
+
+        boot.sort(axis=-1)
+        finite = np.isfinite(boot).sum(axis=-1)
+        # Poprawka obciążenia z0: udział losowań poniżej estymaty (remisy liczone po połowie).
+        # Losowania będące permutacją oryginału dają tę samą wartość – porównanie z tolerancją float32.
+        spread = np.take_along_axis(boot, np.maximum(finite - 1, 0)[..., None], axis=-1)[..., 0] - boot[..., 0]
+        tol = (1e-5 * (np.abs(estimate) + np.nan_to_num(spread)))[..., None]
+        est = estimate[..., None]
+        below = (boot < est - tol).sum(axis=-1) + 0.5 * (np.abs(boot - est) <= tol).sum(axis=-1)
+        prop = np.clip(below / np.maximum(finite, 1), 1.0 / n_boot, 1.0 - 1.0 / n_boot)
+        z0 = _norm_ppf(prop)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            a_lo = _norm_cdf(z0 + (z0 + z_lo) / (1 - accel * (z0 + z_lo)))
+            a_hi = _norm_cdf(z0 + (z0 + z_hi) / (1 - accel * (z0 + z_hi)))
+        usable = (n_rep[:, None] >= 2) & np.isfinite(estimate)
+        out["Estimate"][:, ks] = estimate
+        for name, level in (("CI_low", alpha / 2), ("CI_high", 1 - alpha / 2), ("BCa_low", a_lo), ("BCa_high", a_hi)):
+            q = _order_stat(boot, finite, np.broadcast_to(level, finite.shape))
+            out[name][:, ks] = np.where(usable, q, np.nan)
+    return out
+
+def bootstrap_cube(cube, n_boot=2000, alpha=0.05, seed=0, numerator=None, denominator=None,
+                   measurement=None, workers=1, memory_mb=256):
+    """
+    Przedziały bootstrap dla kostki (plate_cube.PlateCube).
+    measurement – średnia skorygowana (Corrected) wybranego pomiaru;
+    numerator/denominator – iloraz średnich skorygowanych dwóch pomiarów.
+    Zwraca (nazwy prób, liczba replikatów, słownik tablic (próby × cykle)).
+    """
+    if numerator is not None:
+        measurements, kind = [numerator, denominator], "ratio"
+    else:
+        measurements, kind = [measurement or cube.measurements[0]], "mean"
+    m_idx = [cube.measurements.index(m) for m in measurements]
+    codes, wells, n_rep = _sample_layout(cube)
+    blank = np.nan_to_num(cube.blank_mean()[m_idx], nan=0.0)
+    # (pomiary, cykle, dołki) -> (pomiary, próby, cykle, replikaty); uzupełnienie = NaN
+    data = np.where(cube.mask, cube.values, np.nan)[m_idx]
+    values = np.where(wells[None, :, None, :] >= 0,
+                      np.take(data, np.maximum(wells, 0), axis=2).transpose(0, 2, 1, 3), np.nan)
+    seeds = np.random.SeedSequence(seed).spawn(len(codes))
+    n_cycles = values.shape[2]
+    per_cycle = max(1, len(measurements) * 2 + 2) * len(codes) * n_boot * 4
+    workers = max(1, min(int(workers or 1), len(codes) or 1))
+    parts = np.array_split(np.arange(len(codes)), workers)
+    chunk = max(1, int(memory_mb * 1024 * 1024 * workers // max(per_cycle, 1)))
+    tasks = [{"values": values[:, p], "blank": blank, "n_replicates": n_rep[p], "seeds": [seeds[i] for i in p],
+              "n_boot": n_boot, "alpha": alpha, "kind": kind, "chunk_cycles": min(chunk, n_cycles)}
+             for p in parts if len(p)]
+    if len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+            results = list(pool.map(_bootstrap_part, tasks))
+    else:
+        results = [_bootstrap_part(t) for t in tasks]
+    merged = {name: np.concatenate([r[name] for r in results], axis=0) if results else np.empty((0, n_cycles))
+              for name in ["Estimate"] + CI_COLUMNS}
+    return [cube.sample_names[c] for c in codes], n_rep, merged
+
+def _ci_frame(cube, samples, n_rep, arrays, label, measurement_interval):
+    s, k = np.nonzero(np.isfinite(arrays["Estimate"]))
+    frame = pd.DataFrame({
+        "Measurement": label,
+        "Sample": np.asarray(samples, dtype=object)[s],
+        "Kinetics": cube.kinetics[k],
+        "Time_min": cube.time_min(measurement_interval)[k],
+        "n": n_rep[s],
+    })
+    for name in ["Estimate"] + CI_COLUMNS:
+        frame[name] = arrays[name][s, k]
+    return frame
+
+def bootstrap_file(long_merged_file, measurement_interval, n_boot=2000, alpha=0.05, seed=0,
+                   ratio_mapping=None, workers=None, qc_flags=None):
+    """
+    Etap potoku: przedziały bootstrap dla Corrected każdego pomiaru oraz dla ilorazu
+    (pierwsza definicja z ratio_mapping, domyślnie Meas A / Meas B). Zapis do bootstrap/bootstrap_ci.csv.
+    """
+    from data_qc import load_qc_flags, qc_mask
+    df = read_long_csv(long_merged_file)
+    flags = load_qc_flags(qc_flags)
+    if flags is not None:
+        df['Value'] = df['Value'].where(qc_mask(df, flags))
+    cube = PlateCube.from_long(df)
+    workers = workers or os.cpu_count() or 1
+    frames = []
+    for meas in cube.measurements:
+        samples, n_rep, arrays = bootstrap_cube(cube, n_boot, alpha, seed, measurement=meas, workers=workers)
+        frames.append(_ci_frame(cube, samples, n_rep, arrays, meas, measurement_interval))
+    mapping0 = (ratio_mapping or [{"numerator": "Meas A", "denominator": "Meas B"}])[0]
+    if mapping0["numerator"] in cube.measurements and mapping0["denominator"] in cube.measurements:
+        samples, n_rep, arrays = bootstrap_cube(cube, n_boot, alpha, seed, numerator=mapping0["numerator"],
+                                                denominator=mapping0["denominator"], workers=workers)
+        frames.append(_ci_frame(cube, samples, n_rep, arrays,
+                                f"{mapping0['numerator']}/{mapping0['denominator']}", measurement_interval))
+    result = apply_schema(pd.concat(frames, ignore_index=True))
+    folder = os.path.join(os.path.dirname(long_merged_file), "bootstrap")
+    os.makedirs(folder, exist_ok=True)
+    out_path = os.path.join(folder, "bootstrap_ci.csv")
+    write_csv(result, out_path, index=False)
+    print(f"Przedziały bootstrap ({n_boot} losowań, {int((1 - alpha) * 100)}%) zapisano do: {out_path}")
+    return result
+
+def benchmark_bootstrap(n_boot=10000, n_wells=384, n_cycles=500, n_replicates=4, workers=None, seed=0):
+    """Iloraz Meas A / Meas B: n_boot losowań × n_wells dołków × n_cycles cykli."""
+    rng = np.random.default_rng(seed)
+    n_samples = n_wells // n_replicates
+    sample_of_well = np.repeat(np.arange(n_samples), n_replicates)[:n_wells]
+    sample_of_well[:n_replicates] = n_samples  # pierwsza próba jako BLANK
+    names = [f"S{i}" for i in range(n_samples)] + ["BLANK"]
+    values = rng.normal(1000, 50, (2, n_cycles, n_wells)) + np.linspace(0, 2000, n_cycles)[None, :, None]
+    values[:, :, sample_of_well == n_samples] = rng.normal(100, 5, (2, n_cycles, n_replicates))
+    cube = PlateCube(values, ["Meas A", "Meas B"], np.arange(1, n_cycles + 1),
+                     [f"W{i}" for i in range(n_wells)], sample_of_well, names)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    samples, n_rep, arrays = bootstrap_cube(cube, n_boot, numerator="Meas A", denominator="Meas B", workers=workers)
+    elapsed = time.perf_counter() - start
+    width = np.nanmedian(arrays["CI_high"] - arrays["CI_low"])
+    print(f"Bootstrap ilorazu: {n_boot} losowań × {n_wells} dołków × {n_cycles} cykli, "
+          f"{workers} proces(y) – {elapsed:.1f} s (mediana szerokości CI {width:.4f})")
+    return elapsed
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_bootstrap()
+        sys.exit(0)
+    long_merged_file = input("Podaj ścieżkę do pliku long_merged.csv: ").strip()
+    try:
+        measurement_interval = float(input("Podaj interwał pomiaru (min, domyślnie 20): ").strip() or 20)
+    except:
+        measurement_interval = 20
+    n_boot_input = input("Podaj liczbę losowań bootstrap (domyślnie 2000): ").strip()
+    bootstrap_file(long_merged_file, measurement_interval, int(n_boot_input) if n_boot_input else 2000)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: data_features.py
+
+Etap potoku uruchamiany po blank_correct_file – oblicza cechy kinetyczne krzywych:
+  - AUC (pole pod krzywą, metoda trapezów),
+  - maksymalne nachylenie (różnice skończone) oraz czas, w którym występuje,
+  - czas osiągnięcia progu (próg stały lub – domyślnie – 50% maksimum danej krzywej),
+  - wartość końcową oraz maksymalną (wraz z czasem maksimum).
+Cechy liczone są dla każdego dołka (dane long po odjęciu BLANK) oraz dla każdej próby
+(kolumna Corrected z blank_corrected_summary.csv). Dołki oznaczone w kontroli jakości (qc_flags,
+data_qc.py) są maskowane przed odjęciem BLANK – tak jak w blank_correct_file. Wszystkie krzywe przetwarzane są naraz
+jako jedna macierz NumPy (krzywe × czas) – bez pętli po dołkach.
+Wynik zapisuje się do pliku kinetic_features/kinetic_features.csv.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from data_schema import read_long_csv, time_minutes
+from group_stats import group_agg
+from data_qc import load_qc_flags, qc_mask
+from async_writer import write_csv
+
+FEATURE_COLUMNS = ["AUC", "Max_slope", "Max_slope_time", "Threshold", "Time_to_threshold",
+                   "Final_value", "Peak_value", "Peak_time"]
+
+def compute_curve_features(times, values, threshold=None):
+    """
+    times  – wektor czasów (K,), rosnący.
+    values – macierz (N, K); każdy wiersz to jedna krzywa, NaN oznacza brak pomiaru.
+    threshold – wartość progowa; None oznacza 50% maksimum każdej krzywej.
+    Zwraca słownik {nazwa_cechy: wektor (N,)}.
+    """
+    t = np.asarray(times, dtype=float)
+    y = np.atleast_2d(np.asarray(values, dtype=float))
+    n, k = y.shape
+    nan_row = np.full(n, np.nan)
+    valid = ~np.isnan(y)
+    has_data = valid.any(axis=1)
+    if k == 0 or not has_data.any():
+        return {name: nan_row.copy() for name in FEATURE_COLUMNS}
+
+    dt = np.diff(t)
+    # AUC – odcinki z brakującym końcem są pomijane
+    segments = 0.5 * (y[:, 1:] + y[:, :-1]) * dt
+    auc = np.where(has_data, np.nansum(segments, axis=1), np.nan)
+
+    # Maksymalne nachylenie i czas (środek odcinka)
+    max_slope = nan_row.copy()
+    max_slope_time = nan_row.copy()
+    if k > 1:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slopes = np.diff(y, axis=1) / dt
+        slope_ok = ~np.isnan(slopes)
+        slope_filled = np.where(slope_ok, slopes, -np.inf)
+        slope_idx = np.argmax(slope_filled, axis=1)
+        any_slope = slope_ok.any(axis=1)
+        mid_t = 0.5 * (t[1:] + t[:-1])
+        max_slope = np.where(any_slope, slope_filled[np.arange(n), slope_idx], np.nan)
+        max_slope_time = np.where(any_slope, mid_t[slope_idx], np.nan)
+
+    # Maksimum krzywej
+    peak_filled = np.where(valid, y, -np.inf)
+    peak_idx = np.argmax(peak_filled, axis=1)
+    peak_value = np.where(has_data, peak_filled[np.arange(n), peak_idx], np.nan)
+    peak_time = np.where(has_data, t[peak_idx], np.nan)
+
+    # Ostatnia dostępna wartość
+    last_idx = k - 1 - np.argmax(valid[:, ::-1], axis=1)
+    final_value = np.where(has_data, y[np.arange(n), last_idx], np.nan)
+
+    # Czas osiągnięcia progu – pierwsze przekroczenie z interpolacją liniową
+    thr = 0.5 * peak_value if threshold is None else np.full(n, float(threshold))
+    with np.errstate(invalid="ignore"):
+        reached = valid & (y >= thr[:, None])
+    any_reached = reached.any(axis=1)
+    cross_idx = np.argmax(reached, axis=1)
+    prev_idx = np.maximum(cross_idx - 1, 0)
+    y1 = y[np.arange(n), cross_idx]
+    y0 = y[np.arange(n), prev_idx]
+    t1 = t[cross_idx]
+    t0 = t[prev_idx]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.where((cross_idx > 0) & (y1 != y0) & ~np.isnan(y0), (thr - y0) / (y1 - y0), 1.0)
+    time_to_thr = np.where(any_reached, t0 + np.clip(frac, 0.0, 1.0) * (t1 - t0), np.nan)
+
+    return {
+        "AUC": auc,
+        "Max_slope": max_slope,
+        "Max_slope_time": max_slope_time,
+        "Threshold": np.where(has_data, thr, np.nan),
+        "Time_to_threshold": time_to_thr,
+        "Final_value": final_value,
+        "Peak_value": peak_value,
+        "Peak_time": peak_time,
+    }
+
+def _features_table(wide, level, threshold):
+    """Zamienia tabelę szeroką (indeks = etykiety krzywej, kolumny = Time_min) w tabelę cech."""
+    wide = wide.sort_index(axis=1)
+    features = compute_curve_features(wide.columns.to_numpy(dtype=float), wide.to_numpy(dtype=float), threshold)
+    table = wide.index.to_frame(index=False)
+    table.insert(0, "Level", level)
+    for name in FEATURE_COLUMNS:
+        table[name] = features[name]
+    return table
+
+def extract_kinetic_features(input_file, measurement_interval, threshold=None, summary_file=None, qc_flags=None):
+    """
+    input_file – plik long (najczęściej long_merged.csv) z kolumnami Measurement, Kinetics, Well, Sample, Value.
+    summary_file – blank_corrected_summary.csv (domyślnie szukany w blank_corrected_analysis obok input_file).
+    qc_flags – opcjonalny plik qc/well_flags.csv; oznaczone dołki nie wchodzą do średniej BLANK ani do cech dołków.
+    Zwraca DataFrame z cechami (Level = "Well" lub "Sample").
+    """
+    input_dir = os.path.dirname(input_file)
+    output_folder = os.path.join(input_dir, "kinetic_features")
+    os.makedirs(output_folder, exist_ok=True)
+    df = read_long_csv(input_file)
+    df['Time_min'] = time_minutes(df['Kinetics'], measurement_interval)
+    flags = load_qc_flags(qc_flags)
+    if flags is not None:
+        df['Value'] = df['Value'].where(qc_mask(df, flags))
+
+    # Odjęcie średniej BLANK (per Measurement, Kinetics) – tak jak w blank_correct_file
+    blank_avg = group_agg(df[df['Sample'] == "BLANK"], ['Measurement', 'Kinetics'], 'Value', ('mean',),
+                          names={'mean': 'Blank_avg'}).set_index(['Measurement', 'Kinetics'])['Blank_avg']
+    df = df.join(blank_avg, on=['Measurement', 'Kinetics'])
+    df['Corrected'] = df['Value'] - df['Blank_avg'].fillna(0)
+    wells = df[df['Sample'] != "BLANK"]
+    well_wide = wells.set_index(['Measurement', 'Sample', 'Well', 'Time_min'])['Corrected'].unstack('Time_min')
+    tables = [_features_table(well_wide, "Well", threshold)]
+
+    if summary_file is None:
+        summary_file = os.path.join(input_dir, "blank_corrected_analysis", "blank_corrected_summary.csv")
+    if os.path.isfile(summary_file):
+        summary = read_long_csv(summary_file)
+        sample_wide = summary.set_index(['Measurement', 'Sample', 'Time_min'])['Corrected'].unstack('Time_min')
+        sample_table = _features_table(sample_wide, "Sample", threshold)
+        sample_table.insert(3, "Well", "")
+        tables.append(sample_table)
+
+    result = pd.concat(tables, ignore_index=True)
+    features_path = os.path.join(output_folder, "kinetic_features.csv")
+    write_csv(result, features_path, index=False)
+    print("Cechy kinetyczne zapisano do:", features_path)
+    return result
+
+def benchmark_features(n_wells=384, n_cycles=1000, repeats=5, seed=0):
+    """Mierzy czas compute_curve_features na syntetycznych krzywych logistycznych."""
+    rng = np.random.default_rng(seed)
+    times = np.arange(n_cycles, dtype=float) * 3.0
+    midpoints = rng.uniform(times[-1] * 0.2, times[-1] * 0.8, size=(n_wells, 1))
+    values = 1000.0 / (1.0 + np.exp(-(times - midpoints) / 60.0)) + rng.normal(0, 10, (n_wells, n_cycles))
+    values[rng.random(values.shape) < 0.01] = np.nan
+    compute_curve_features(times, values)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        compute_curve_features(times, values)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"Cechy kinetyczne: {n_wells} dołków × {n_cycles} cykli – najlepszy czas {best*1000:.1f} ms "
+          f"(mediana {np.median(timings)*1000:.1f} ms, {repeats} powtórzeń)")
+    return best
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_features()
+        sys.exit(0)
+    input_file = input("Podaj ścieżkę do pliku long (CSV): ").strip()
+    try:
+        measurement_interval = float(input("Podaj interwał pomiaru (min, domyślnie 20): ").strip() or 20)
+    except:
+        measurement_interval = 20
+    threshold_input = input("Podaj próg (puste = 50% maksimum krzywej): ").strip()
+    threshold = float(threshold_input) if threshold_input else None
+    extract_kinetic_features(input_file, measurement_interval, threshold)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: data_pooling.py
+
+Łączenie (pooling) replikatów z wielu płytek bez ponownego wczytywania danych surowych.
+Podsumowania blank_corrected_summary.csv oraz *_summary.csv (data_analysis.py) zawierają
+statystyki dostateczne każdej grupy: liczność n, sumę oraz M2 (suma kwadratów odchyleń od średniej).
+Dla dowolnej liczby podsumowań grupy łączone są wzorem Chana:
+    n = Σ n_i,  mean = Σ n_i·mean_i / n,  M2 = Σ M2_i + Σ n_i·(mean_i − mean)²
+co wymaga jednej operacji grupowej na wierszach podsumowań (O(liczba grup)).
+Starsze podsumowania bez kolumny M2 są obsługiwane przez M2 = (n − 1)·std².
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+from group_stats import GroupIndex
+
+POOL_KEYS = ["Measurement", "Sample", "Kinetics", "Time_min"]
+
+def m2_from_std(std, n):
+    """M2 = (n − 1)·std²; dla n <= 1 (std = NaN) M2 = 0."""
+    std = pd.to_numeric(pd.Series(std), errors="coerce").to_numpy(dtype=float)
+    n = pd.to_numeric(pd.Series(n), errors="coerce").to_numpy(dtype=float)
+    return np.where(n > 1, (n - 1) * std ** 2, 0.0)
+
+def pool_moments(df, keys, n_col, mean_col, m2_col=None, std_col=None):
+    """
+    Łączy wiersze df o tych samych kluczach: zwraca DataFrame (keys, n, mean, M2, Runs).
+    M2 pobierane jest z m2_col, a gdy go brak – odtwarzane z std_col i n.
+    """
+    n = pd.to_numeric(df[n_col], errors="coerce").fillna(0).to_numpy(dtype=float)
+    mean = pd.to_numeric(df[mean_col], errors="coerce").to_numpy(dtype=float)
+    if m2_col is not None and m2_col in df.columns:
+        m2 = pd.to_numeric(df[m2_col], errors="coerce").fillna(0).to_numpy(dtype=float)
+    else:
+        m2 = m2_from_std(df[std_col], n)
+    valid = (n > 0) & ~np.isnan(mean)
+    n = np.where(valid, n, 0.0)
+    weighted = np.where(valid, n * mean, 0.0)
+    groups = GroupIndex.from_frame(df.reset_index(drop=True), keys, sort=True)
+    total_n = groups.reduce(n, ("sum",))["sum"]
+    total_s = groups.reduce(weighted, ("sum",))["sum"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pooled_mean = total_s / total_n
+    row_mean = np.where(groups.codes >= 0, pooled_mean[np.maximum(groups.codes, 0)], np.nan)
+    # Druga część wzoru Chana: rozrzut średnich grup wokół średniej łącznej
+    dev = np.where(valid, mean - row_mean, 0.0)
+    spread = groups.reduce(np.where(valid, m2 + n * dev ** 2, 0.0), ("sum",))["sum"]
+    result = groups.keys_frame()
+    result["n"] = total_n.astype(np.int64)
+    result["mean"] = pooled_mean
+    result["M2"] = spread
+    result["Runs"] = groups.reduce(valid.astype(float), ("sum",))["sum"].astype(np.int64)
+    return result
+
+def _std(m2, n):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 1, np.sqrt(m2 / (n - 1)), np.nan)
+
+def combine_summaries(summaries, keys=POOL_KEYS):
+    """
+    Łączy podsumowania (DataFrame lub ścieżki CSV) w jedno podsumowanie w tym samym formacie.
+    Obsługiwane formaty: blank_corrected_summary (Sample_avg, Sample_std, n, Blank_avg, Corrected)
+    oraz podsumowanie data_analysis (mean, std, count).
+    Dla blank_corrected Corrected łączone jest jako średnia wartości skorygowanych dołków,
+    a Corrected_std/Corrected_M2 uwzględniają różnice między płytkami (każda ma własny BLANK).
+    """
+    frames = [pd.read_csv(s, encoding="latin1") if isinstance(s, str) else s for s in summaries]
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    keys = [k for k in keys if k in df.columns]
+    if "Sample_avg" in df.columns:
+        samples = pool_moments(df, keys, "n", "Sample_avg", "Sample_M2", "Sample_std")
+        m2_corr = df["Corrected_M2"] if "Corrected_M2" in df.columns else \
+            (df["Sample_M2"] if "Sample_M2" in df.columns else m2_from_std(df["Sample_std"], df["n"]))
+        corrected = pool_moments(df.assign(_m2=m2_corr), keys, "n", "Corrected", "_m2")
+        result = samples[keys].copy()
+        result["Sample_avg"] = samples["mean"]
+        result["Sample_std"] = _std(samples["M2"], samples["n"])
+        result["n"] = samples["n"]
+        result["Blank_avg"] = samples["mean"] - corrected["mean"]
+        result["Corrected"] = corrected["mean"]
+        result["Sample_sum"] = samples["mean"] * samples["n"]
+        result["Sample_M2"] = samples["M2"]
+        result["Corrected_M2"] = corrected["M2"]
+        result["Corrected_std"] = _std(corrected["M2"], corrected["n"])
+        result["Runs"] = samples["Runs"]
+        return result
+    if "mean" in df.columns:
+        pooled = pool_moments(df, keys, "count", "mean", "M2", "std")
+        result = pooled[keys].copy()
+        result["mean"] = pooled["mean"]
+        result["std"] = _std(pooled["M2"], pooled["n"])
+        result["count"] = pooled["n"]
+        result["sum"] = pooled["mean"] * pooled["n"]
+        result["M2"] = pooled["M2"]
+        result["Runs"] = pooled["Runs"]
+        return result
+    raise ValueError("Nieznany format podsumowania (brak kolumn Sample_avg lub mean).")
+
+def pool_plot_data(df, mean_col, std_col, n_col="n", group_col="Base_sample"):
+    """
+    Dane wykresu (Run, Sample, Time_min, mean_col, std_col, n) -> średnia ± std z puli wszystkich analiz
+    dla każdej próby bazowej (group_col) i punktu czasu. Zwraca None, gdy brak kolumny liczności.
+    """
+    if n_col not in df.columns or std_col not in df.columns:
+        return None
+    group_col = group_col if group_col in df.columns else "Sample"
+    pooled = pool_moments(df, [group_col, "Time_min"], n_col, mean_col, std_col=std_col)
+    view = pd.DataFrame({
+        "Sample": pooled[group_col].astype(str),
+        "Time_min": pooled["Time_min"],
+        mean_col: pooled["mean"],
+        std_col: _std(pooled["M2"], pooled["n"]),
+        n_col: pooled["n"],
+        "Runs": pooled["Runs"],
+    })
+    return view
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Użycie: python data_pooling.py WYNIK.csv PODSUMOWANIE1.csv [PODSUMOWANIE2.csv ...]")
+        sys.exit(1)
+    pooled = combine_summaries(sys.argv[2:])
+    os.makedirs(os.path.dirname(os.path.abspath(sys.argv[1])), exist_ok=True)
+    pooled.to_csv(sys.argv[1], index=False)
+    print(f"Połączono {len(sys.argv) - 2} podsumowań ({len(pooled)} grup). Wynik zapisano do: {sys.argv[1]}")
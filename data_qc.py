@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: data_qc.py
+
+Kontrola jakości (QC) na poziomie dołków – przed uśrednianiem replikatów.
+Dla danych long (Measurement, Sample, Kinetics, Well, Value) oznacza dołki:
+  - Outlier   – odstające względem pozostałych replikatów: odporny z-score
+                0.6745·(x − mediana)/MAD liczony dla każdej grupy (Measurement, Sample, Kinetics)
+                przekracza z_threshold w więcej niż outlier_fraction punktów czasowych i w co najmniej
+                min_outlier_cycles cyklach; test wymaga min_replicates (4) replikatów – przy 3 MAD to tylko
+                mniejsze z dwóch odchyleń od mediany, więc jedna nierówna trójka daje ogromny z-score;
+                MAD nie jest mniejsze niż mad_floor·|mediana| (bliskie sobie replikaty nie dają dużych z),
+  - Saturated – przynajmniej jeden odczyt >= saturation_level (nasycenie detektora),
+  - NaN_heavy – udział brakujących wartości przekracza nan_fraction.
+Mediany i MAD liczone są operacjami grupowymi na całej tabeli naraz (bez pętli po grupach).
+Kolejne etapy (blank_correct_file, analyze_long_file) wykluczają oznaczone dołki maską logiczną
+(Value.where(maska)) – bez kopiowania i filtrowania tabeli.
+Wynik zapisuje się do pliku qc/well_flags.csv.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from data_schema import read_long_csv
+from group_stats import GroupIndex, key_columns
+from async_writer import write_csv
+
+GROUP_KEYS = ['Measurement', 'Sample', 'Kinetics']
+WELL_KEYS = ['Measurement', 'Sample', 'Well']
+
+def flag_wells(df, value_column="Value", z_threshold=3.5, outlier_fraction=0.2,
+               saturation_level=None, nan_fraction=0.2, min_replicates=4, min_outlier_cycles=3, mad_floor=0.02):
+    """
+    Zwraca tabelę flag dla każdego dołka (Measurement, Sample, Well):
+    Outlier_frac, Saturated_frac, NaN_frac, Outlier, Saturated, NaN_heavy, Flagged.
+    """
+    values = pd.to_numeric(df[value_column], errors="coerce")
+    # Jeden indeks grup (group_stats.py) dla mediany, MAD i liczby replikatów
+    keys = key_columns(df, dict.fromkeys(GROUP_KEYS + WELL_KEYS))
+    groups = GroupIndex.from_frame(keys, GROUP_KEYS, sort=False)
+    median = groups.transform(values, "median")
+    deviation = values.to_numpy(dtype=float) - median
+    mad = np.maximum(groups.transform(np.abs(deviation), "median"), mad_floor * np.abs(median))
+    replicates = groups.transform(values, "count")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        robust_z = 0.6745 * deviation / mad
+    robust_z = np.where(mad > 0, robust_z, 0.0)
+    point_outlier = (np.abs(robust_z) > z_threshold) & (replicates >= min_replicates)
+    if saturation_level is not None:
+        point_saturated = (values >= saturation_level).to_numpy()
+    else:
+        point_saturated = np.zeros(len(df), dtype=bool)
+    point_nan = values.isna().to_numpy()
+
+    wells = GroupIndex.from_frame(keys, WELL_KEYS, sort=True)
+    flags = wells.keys_frame()
+    for name, point in (("Outlier_frac", point_outlier), ("Saturated_frac", point_saturated), ("NaN_frac", point_nan)):
+        flags[name] = wells.reduce(point.astype(float), ("mean",))["mean"]
+    outlier_cycles = wells.reduce(point_outlier.astype(float), ("sum",))["sum"]
+    flags["Outlier"] = (flags["Outlier_frac"] > outlier_fraction) & (outlier_cycles >= min_outlier_cycles)
+    flags["Saturated"] = flags["Saturated_frac"] > 0
+    flags["NaN_heavy"] = flags["NaN_frac"] > nan_fraction
+    flags["Flagged"] = flags["Outlier"] | flags["Saturated"] | flags["NaN_heavy"]
+    return flags
+
+def qc_mask(df, flags):
+    """Maska logiczna wierszy df: True = dołek nie jest oznaczony i bierze udział w agregacji."""
+    if flags is None or "Well" not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    flagged = flags[flags["Flagged"]]
+    if flagged.empty:
+        return np.ones(len(df), dtype=bool)
+    flagged_index = pd.MultiIndex.from_frame(flagged[['Measurement', 'Well']].astype(str))
+    rows_index = pd.MultiIndex.from_arrays([df['Measurement'].astype(str), df['Well'].astype(str)])
+    return ~rows_index.isin(flagged_index)
+
+def load_qc_flags(qc_flags):
+    """Przyjmuje DataFrame flag lub ścieżkę do well_flags.csv (None – brak QC)."""
+    if qc_flags is None or isinstance(qc_flags, pd.DataFrame):
+        return qc_flags
+    if os.path.isfile(qc_flags):
+        return pd.read_csv(qc_flags, encoding="latin1")
+    return None
+
+def qc_file(input_file, saturation_level=None, z_threshold=3.5, outlier_fraction=0.2, nan_fraction=0.2):
+    """Etap potoku: QC pliku long, zapis do qc/well_flags.csv obok input_file."""
+    input_dir = os.path.dirname(input_file)
+    qc_folder = os.path.join(input_dir, "qc")
+    os.makedirs(qc_folder, exist_ok=True)
+    df = read_long_csv(input_file)
+    flags = flag_wells(df, z_threshold=z_threshold, outlier_fraction=outlier_fraction,
+                       saturation_level=saturation_level, nan_fraction=nan_fraction)
+    flags_path = os.path.join(qc_folder, "well_flags.csv")
+    write_csv(flags, flags_path, index=False)
+    n_flagged = int(flags["Flagged"].sum())
+    print(f"QC: oznaczono {n_flagged} z {len(flags)} dołków (pomiar × dołek). Flagi zapisano do: {flags_path}")
+    return flags
+
+def benchmark_qc(n_wells=384, n_cycles=1000, n_samples=96, repeats=3, seed=0):
+    """Mierzy przepustowość flag_wells na syntetycznej płytce (2 pomiary)."""
+    rng = np.random.default_rng(seed)
+    wells = np.array([f"W{i}" for i in range(n_wells)])
+    samples = np.array([f"S{i % n_samples}" for i in range(n_wells)])
+    kinetics = np.arange(1, n_cycles + 1)
+    frames = []
+    for meas in ("Meas A", "Meas B"):
+        values = rng.normal(1000, 30, (n_cycles, n_wells))
+        values[:, :4] += 500  # kilka odstających dołków
+        frames.append(pd.DataFrame({
+            "Measurement": meas,
+            "Kinetics": np.repeat(kinetics, n_wells),
+            "Well": np.tile(wells, n_cycles),
+            "Sample": np.tile(samples, n_cycles),
+            "Value": values.ravel(),
+        }))
+    df = pd.concat(frames, ignore_index=True)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        flags = flag_wells(df, saturation_level=1e6)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"QC: {n_wells} dołków × {n_cycles} cykli × 2 pomiary ({len(df)} wierszy) – "
+          f"najlepszy czas {best:.3f} s ({len(df) / best / 1e6:.2f} mln wierszy/s), "
+          f"oznaczono {int(flags['Flagged'].sum())} dołków")
+    return best
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_qc()
+        sys.exit(0)
+    input_file = input("Podaj ścieżkę do pliku long (CSV): ").strip()
+    saturation_input = input("Podaj poziom nasycenia detektora (puste = brak): ").strip()
+    qc_file(input_file, float(saturation_input) if saturation_input else None)
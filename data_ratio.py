@@ -5,66 +5,62 @@ Plik: data_ratio.py
 
 Cel:
   Dla danych z pliku long_merged.csv (surowe dane przed blank correction)
-  dla każdej kombinacji (Sample, Kinetics, Time_min) oblicza stosunek:
+  dla każdego dołka i cyklu oblicza stosunek:
     Ratio = (Value dla pomiaru LICZNIKOWEGO) / (Value dla pomiaru MIANOWNIKOWEGO)
-  Na podstawie ilorazów obliczana jest średnia (Ratio_mean), odchylenie standardowe (Ratio_std) i liczba par.
+  (metryka m("licznik") / m("mianownik") silnika wyrażeń metrics.py – iloraz dwóch warstw kostki
+  pomiar × cykl × dołek, plate_cube.py, ten sam dołek w obu pomiarach).
+  Dla każdej kombinacji (Sample, Kinetics, Time_min) obliczana jest średnia ilorazów (Ratio_mean),
+  odchylenie standardowe (Ratio_std) i liczba dołków (Count).
+Opcjonalnie (qc_flags) wyklucza dołki oznaczone w kontroli jakości (data_qc.py).
 Wynik zapisuje się do pliku ratio_summary.csv.
+Dane wczytywane są ze wspólnym schematem typów (data_schema.py).
 Folder wynikowy nazywa się dynamicznie – na podstawie pierwszej definicji stosunku z listy.
 Nie generujemy wykresów.
 """
 
 import os
-import pandas as pd
 import numpy as np
+from data_schema import read_long_csv, apply_schema
+from data_qc import load_qc_flags, qc_mask
+from plate_cube import PlateCube
+from metrics import MetricEngine
+from async_writer import write_csv
 
-def calculate_ratio(long_merged_file, measurement_interval=20, ratio_mapping=None):
+def calculate_ratio(long_merged_file, measurement_interval=20, ratio_mapping=None, qc_flags=None):
     print("[DEBUG] Wczytywanie danych z:", long_merged_file)
-    df = pd.read_csv(long_merged_file, encoding="latin1")
+    df = read_long_csv(long_merged_file)
     if 'Value' not in df.columns:
         raise KeyError("Brak kolumny 'Value'. Użyj pliku long_merged.csv.")
-    df['Value'] = pd.to_numeric(df['Value'], errors='coerce')
-    df['Kinetics'] = pd.to_numeric(df['Kinetics'], errors='coerce')
-    if 'Time_min' not in df.columns:
-        df['Time_min'] = (df['Kinetics'] - 1) * measurement_interval
+    # Dołki oznaczone w QC (data_qc.py) nie biorą udziału w średnich – maskowanie zamiast filtrowania
+    flags = load_qc_flags(qc_flags)
+    if flags is not None:
+        df['Value'] = df['Value'].where(qc_mask(df, flags))
     if ratio_mapping is None or len(ratio_mapping)==0:
         ratio_mapping = [{"numerator": "Meas A", "denominator": "Meas B"}]
     # Używamy pierwszej definicji ratio do nazwy folderu
     mapping0 = ratio_mapping[0]
-    df_num = df[df['Measurement'] == mapping0["numerator"]].copy()
-    df_den = df[df['Measurement'] == mapping0["denominator"]].copy()
-    if df_num.empty or df_den.empty:
+    cube = PlateCube.from_long(df)
+    if mapping0["numerator"] not in cube.measurements or mapping0["denominator"] not in cube.measurements:
         raise ValueError("Brak danych dla wybranego stosunku.")
-    df_num = df_num[['Sample','Kinetics','Time_min','Value']].rename(columns={'Value': 'Num'})
-    df_den = df_den[['Sample','Kinetics','Time_min','Value']].rename(columns={'Value': 'Den'})
-    merged = pd.merge(df_num, df_den, on=['Sample','Kinetics','Time_min'], how='inner')
-    ratio_records = []
-    grouped = merged.groupby(['Sample','Kinetics','Time_min'])
-    for (sample, kinetics, time_min), group in grouped:
-        ratios = [row['Num']/row['Den'] for _, row in group.iterrows() if row['Den'] != 0]
-        if not ratios:
-            continue
-        ratio_mean = np.mean(ratios)
-        ratio_std = np.std(ratios, ddof=1) if len(ratios)>1 else 0
-        count = len(ratios)
-        ratio_records.append({
-            "Sample": sample,
-            "Kinetics": kinetics,
-            "Time_min": time_min,
-            "Ratio_mean": ratio_mean,
-            "Ratio_std": ratio_std,
-            "Count": count
-        })
-    if ratio_records:
-        ratio_df = pd.DataFrame(ratio_records)
-    else:
+    name = f"{mapping0['numerator']}/{mapping0['denominator']}"
+    engine = MetricEngine(cube, {name: f"m({mapping0['numerator']!r}) / m({mapping0['denominator']!r})"})
+    ratio_cube = engine.layer(name)
+    stats = ratio_cube.replicate_stats(include_blank=True)
+    # Grupy bez żadnego poprawnego ilorazu są pomijane; pojedynczy iloraz -> Ratio_std = 0
+    stats["present"] = stats["n"] > 0
+    stats["std"] = np.where(stats["n"] == 1, 0.0, stats["std"])
+    ratio_df = ratio_cube.stats_frame(stats, measurement_interval,
+                                      {'mean': 'Ratio_mean', 'std': 'Ratio_std', 'n': 'Count'})
+    if ratio_df.empty:
         print("[DEBUG] Brak danych do obliczenia ratio.")
         return None
+    ratio_df = apply_schema(ratio_df[['Sample', 'Kinetics', 'Time_min', 'Ratio_mean', 'Ratio_std', 'Count']])
     mapping_str = f"{mapping0.get('numerator')}_to_{mapping0.get('denominator')}_ratio"
     input_dir = os.path.dirname(long_merged_file)
     ratio_folder = os.path.join(input_dir, mapping_str)
     os.makedirs(ratio_folder, exist_ok=True)
     ratio_summary_path = os.path.join(ratio_folder, "ratio_summary.csv")
-    ratio_df.to_csv(ratio_summary_path, index=False)
+    write_csv(ratio_df, ratio_summary_path, index=False)
     print("[DEBUG] Ratio summary zapisano do:", ratio_summary_path)
     return ratio_df
 
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: data_resample.py
+
+Przepróbkowanie (resampling) serii czasowych z wielu analiz na wspólną siatkę czasu.
+Analizy wykonywane z różnym interwałem (np. 3, 6 i 10 min) mają niezgodne wartości Time_min,
+przez co porównania, ilorazy i różnice między analizami nie są możliwe punkt do punktu.
+Wszystkie serie (analizy × próby) są interpolowane jedną operacją wsadową na macierzach
+(serie × punkty czasowe, uzupełnione NaN) – metodą liniową lub PCHIP (monotoniczna interpolacja
+Hermite'a, bez przestrzeliwania). Poza zakresem danej serii wynik to NaN (brak ekstrapolacji).
+Wyniki są zapamiętywane w ResampleCache per (analiza, siatka, metoda).
+"""
+
+import numpy as np
+import pandas as pd
+
+def make_common_grid(time_arrays, step=None):
+    """
+    Wspólna siatka czasu dla wielu serii: zakres to część wspólna zakresów,
+    krok – domyślnie największy (najrzadszy) z interwałów poszczególnych serii.
+    """
+    arrays = [np.unique(np.asarray(t, dtype=float)[~np.isnan(np.asarray(t, dtype=float))]) for t in time_arrays]
+    arrays = [t for t in arrays if len(t) > 0]
+    if not arrays:
+        return np.array([])
+    start = max(t[0] for t in arrays)
+    end = min(t[-1] for t in arrays)
+    if step is None:
+        steps = [np.median(np.diff(t)) for t in arrays if len(t) > 1]
+        step = max(steps) if steps else 1.0
+    if end < start:
+        return np.array([])
+    return start + step * np.arange(int(np.floor((end - start) / step + 1e-9)) + 1)
+
+def grid_key(grid):
+    """Klucz siatki do cache (początek, koniec, liczba punktów)."""
+    grid = np.asarray(grid, dtype=float)
+    if len(grid) == 0:
+        return (0.0, 0.0, 0)
+    return (round(float(grid[0]), 9), round(float(grid[-1]), 9), len(grid))
+
+def _pchip_slopes(xs, ys, h, delta, lengths):
+    """Pochodne w węzłach wg Fritscha–Carlsona (jak scipy.interpolate.PchipInterpolator)."""
+    n, t = xs.shape
+    rows = np.arange(n)
+    d = np.full((n, t), np.nan)
+    if t >= 3:
+        h0, h1 = h[:, :-1], h[:, 1:]
+        m0, m1 = delta[:, :-1], delta[:, 1:]
+        w1 = 2 * h1 + h0
+        w2 = h1 + 2 * h0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            interior = (w1 + w2) / (w1 / m0 + w2 / m1)
+        interior = np.where((np.sign(m0) != np.sign(m1)) | (m0 == 0) | (m1 == 0), 0.0, interior)
+        d[:, 1:-1] = interior
+
+    def edge(h0, h1, m0, m1):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            de = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+        de = np.where(np.sign(de) != np.sign(m0), 0.0, de)
+        return np.where((np.sign(m0) != np.sign(m1)) & (np.abs(de) > np.abs(3 * m0)), 3 * m0, de)
+
+    last = np.maximum(lengths - 1, 0)
+    two = lengths == 2
+    many = lengths >= 3
+    seg_last = np.maximum(last - 1, 0)
+    seg_prev = np.maximum(last - 2, 0)
+    # Początek serii
+    start = np.where(many, edge(h[:, 0], h[:, min(1, h.shape[1] - 1)], delta[:, 0],
+                                delta[:, min(1, h.shape[1] - 1)]), delta[:, 0])
+    # Koniec serii
+    hl, hp = h[rows, seg_last], h[rows, seg_prev]
+    ml, mp = delta[rows, seg_last], delta[rows, seg_prev]
+    end = np.where(many, edge(hl, hp, ml, mp), ml)
+    ok = many | two
+    d[ok, 0] = start[ok]
+    d[rows[ok], last[ok]] = end[ok]
+    return d
+
+def resample_series(x, y, grid, method="linear"):
+    """
+    x, y – macierze (N, T) czasów i wartości; NaN oznacza brak punktu (np. uzupełnienie krótszej serii).
+    grid – wektor (G,) wspólnych czasów.
+    Zwraca macierz (N, G) wartości interpolowanych metodą "linear" lub "pchip".
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    grid = np.asarray(grid, dtype=float)
+    n, t = x.shape
+    if n == 0 or t == 0 or len(grid) == 0:
+        return np.full((n, len(grid)), np.nan)
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    # Poprawne punkty na początek każdego wiersza, posortowane po czasie
+    order = np.argsort(np.where(valid, x, np.inf), axis=1, kind="stable")
+    xs = np.take_along_axis(x, order, axis=1)
+    ys = np.take_along_axis(y, order, axis=1)
+    lengths = valid.sum(axis=1)
+    cols = np.arange(t)
+    in_row = cols[None, :] < lengths[:, None]
+    xs = np.where(in_row, xs, np.nan)
+    ys = np.where(in_row, ys, np.nan)
+
+    # Wyszukiwanie przedziałów dla wszystkich wierszy naraz: każdy wiersz przesunięty o stały offset
+    lo = min(np.nanmin(xs), grid[0])
+    width = max(np.nanmax(xs), grid[-1]) - lo + 1.0
+    rows = np.arange(n)
+    keys = np.where(in_row, xs - lo, width) + rows[:, None] * (width + 1.0)
+    queries = (grid[None, :] - lo) + rows[:, None] * (width + 1.0)
+    pos = np.searchsorted(keys.ravel(), queries.ravel(), side="right").reshape(n, len(grid)) - rows[:, None] * t
+    i1 = np.clip(pos, 1, np.maximum(lengths - 1, 1)[:, None])
+    i0 = i1 - 1
+    x0 = np.take_along_axis(xs, i0, axis=1)
+    x1 = np.take_along_axis(xs, i1, axis=1)
+    y0 = np.take_along_axis(ys, i0, axis=1)
+    y1 = np.take_along_axis(ys, i1, axis=1)
+    h = x1 - x0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = (grid[None, :] - x0) / h
+    if method == "pchip":
+        hh = np.diff(xs, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = np.diff(ys, axis=1) / hh
+        d = _pchip_slopes(xs, ys, hh, delta, lengths) if t > 1 else np.full((n, t), np.nan)
+        d0 = np.take_along_axis(d, i0, axis=1)
+        d1 = np.take_along_axis(d, i1, axis=1)
+        s2, s3 = s * s, s * s * s
+        out = ((2 * s3 - 3 * s2 + 1) * y0 + (s3 - 2 * s2 + s) * h * d0
+               + (-2 * s3 + 3 * s2) * y1 + (s3 - s2) * h * d1)
+    else:
+        out = y0 + s * (y1 - y0)
+    first = xs[:, 0][:, None]
+    last = np.take_along_axis(xs, np.maximum(lengths - 1, 0)[:, None], axis=1)
+    inside = (grid[None, :] >= first) & (grid[None, :] <= last) & (lengths[:, None] >= 2)
+    # Punkt siatki dokładnie na węźle – wartość węzła (także dla serii jednopunktowych)
+    on_node = (grid[None, :] == x0) | (grid[None, :] == x1)
+    out = np.where(grid[None, :] == x1, y1, np.where(grid[None, :] == x0, y0, out))
+    return np.where(inside | on_node, out, np.nan)
+
+class ResampleCache:
+    """Wyniki przepróbkowania per (klucz analizy, klucz siatki, metoda, kolumny)."""
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, value):
+        self._entries[key] = value
+
+    def clear(self):
+        self._entries.clear()
+
+def resample_runs(runs, value_columns, grid=None, method="linear", cache=None):
+    """
+    runs – słownik {klucz_analizy: DataFrame z kolumnami Sample, Time_min oraz value_columns}.
+    Zwraca (DataFrame long: Run, Sample, Time_min, value_columns... na wspólnej siatce, siatka).
+    Serie wszystkich analiz i prób, których nie ma w cache, interpolowane są jednym wywołaniem.
+    """
+    if grid is None:
+        grid = make_common_grid([df["Time_min"].to_numpy() for df in runs.values()])
+    grid = np.asarray(grid, dtype=float)
+    gkey = grid_key(grid)
+    results = {}
+    pending = []
+    for run_key, df in runs.items():
+        entry = cache.get((run_key, gkey, method, tuple(value_columns))) if cache is not None else None
+        if entry is not None:
+            results[run_key] = entry
+        else:
+            pending.append(run_key)
+    if pending:
+        # Jedna macierz (analizy × próby) × punkty czasowe dla wszystkich brakujących analiz
+        wides = {}
+        for run_key in pending:
+            df = runs[run_key]
+            wides[run_key] = {col: df.pivot_table(index="Sample", columns="Time_min", values=col, aggfunc="mean")
+                              for col in value_columns}
+        max_t = max((w[value_columns[0]].shape[1] for w in wides.values()), default=0)
+        row_labels = []
+        xs, ys = [], {col: [] for col in value_columns}
+        for run_key in pending:
+            base = wides[run_key][value_columns[0]]
+            times = base.columns.to_numpy(dtype=float)
+            pad = max_t - len(times)
+            x_block = np.tile(np.pad(times, (0, pad), constant_values=np.nan), (len(base.index), 1))
+            xs.append(x_block)
+            for col in value_columns:
+                vals = wides[run_key][col].reindex(index=base.index, columns=base.columns).to_numpy(dtype=float)
+                ys[col].append(np.pad(vals, ((0, 0), (0, pad)), constant_values=np.nan))
+            row_labels.extend((run_key, sample) for sample in base.index)
+        x_all = np.vstack(xs) if xs else np.empty((0, max_t))
+        resampled = {col: resample_series(x_all, np.vstack(ys[col]) if ys[col] else np.empty((0, max_t)),
+                                          grid, method)
+                     for col in value_columns}
+        start = 0
+        for run_key in pending:
+            samples = list(wides[run_key][value_columns[0]].index)
+            stop = start + len(samples)
+            entry = (samples, {col: resampled[col][start:stop] for col in value_columns})
+            results[run_key] = entry
+            if cache is not None:
+                cache.put((run_key, gkey, method, tuple(value_columns)), entry)
+            start = stop
+    frames = []
+    for run_key in runs:
+        samples, matrices = results[run_key]
+        frame = pd.DataFrame({
+            "Run": [run_key] * (len(samples) * len(grid)),
+            "Sample": np.repeat(np.asarray(samples, dtype=object), len(grid)),
+            "Time_min": np.tile(grid, len(samples)),
+        })
+        for col in value_columns:
+            frame[col] = matrices[col].ravel()
+        frames.append(frame)
+    result = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["Run", "Sample", "Time_min"])
+    return result, grid
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: data_schema.py
+
+Wspólny schemat typów danych dla tabel long (long_measA/B.csv, long_merged.csv)
+oraz tabel podsumowań (blank_corrected_summary.csv, ratio_summary.csv):
+  - kolumny etykiet (Measurement, Sample, Well, Row) – category (kilka unikalnych wartości
+    zamiast setek tysięcy powtórzonych napisów),
+  - Kinetics, Column – int16 (int32 dla dłuższych serii),
+  - n, Count – int32,
+  - kolumny wartości (Value, Corrected, ...) – float64, opcjonalnie float32 (set_value_dtype).
+Schemat jest nakładany przy wczytywaniu (read_long_csv) i ponownie na tabelach wynikowych
+(apply_schema), dzięki czemu typy są zachowane przez blank_correct_file, analyze_long_file
+i calculate_ratio. Grupowanie po kolumnach category wymaga observed=True.
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+from async_writer import wait_for
+
+CATEGORY_COLUMNS = ["Measurement", "Sample", "Well", "Row"]
+SMALL_INT_COLUMNS = ["Kinetics", "Column"]
+COUNT_COLUMNS = ["n", "Count", "count"]
+VALUE_COLUMNS = ["Value", "Corrected", "Sample_avg", "Sample_std", "Blank_avg", "Sample_sum", "Sample_M2",
+                 "Corrected_M2", "Corrected_std", "Ratio_mean", "Ratio_std", "mean", "std", "sum", "M2"]
+
+_value_dtype = np.float64
+
+def set_value_dtype(dtype):
+    """Ustawia typ kolumn wartości: np.float64 (domyślnie) lub np.float32 (połowa pamięci)."""
+    global _value_dtype
+    _value_dtype = np.dtype(dtype).type
+
+def get_value_dtype():
+    return _value_dtype
+
+def _compact_int(series, count=False):
+    values = pd.to_numeric(series, errors="coerce")
+    if values.isna().any():
+        return values  # braki – zostaje float, bez nadpisywania NaN
+    if len(values) == 0:
+        return values.astype(np.int32 if count else np.int16)
+    lo, hi = values.min(), values.max()
+    if not count and np.iinfo(np.int16).min <= lo and hi <= np.iinfo(np.int16).max:
+        return values.astype(np.int16)
+    return values.astype(np.int32 if np.iinfo(np.int32).min <= lo and hi <= np.iinfo(np.int32).max else np.int64)
+
+def time_minutes(kinetics, measurement_interval):
+    """Time_min = (Kinetics - 1) * interwał, liczone w float64 (int16 przepełniłby się dla długich serii)."""
+    return (kinetics.astype(np.float64) - 1) * measurement_interval
+
+def apply_schema(df, value_dtype=None):
+    """Nakłada schemat na kolumny obecne w df (w miejscu) i zwraca df."""
+    value_dtype = value_dtype or _value_dtype
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].cat.remove_unused_categories()
+            else:
+                df[col] = df[col].astype("category")
+    for col in SMALL_INT_COLUMNS:
+        if col in df.columns:
+            df[col] = _compact_int(df[col])
+    for col in COUNT_COLUMNS:
+        if col in df.columns:
+            df[col] = _compact_int(df[col], count=True)
+    for col in VALUE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(value_dtype)
+    return df
+
+def read_long_csv(path, value_dtype=None, **kwargs):
+    """pd.read_csv z kolumnami etykiet wczytywanymi od razu jako category i schematem typów."""
+    wait_for(path)
+    header = pd.read_csv(path, encoding="latin1", nrows=0).columns
+    dtypes = {col: "category" for col in CATEGORY_COLUMNS if col in header}
+    df = pd.read_csv(path, encoding="latin1", dtype=dtypes, **kwargs)
+    return apply_schema(df, value_dtype)
+
+def memory_report(before, after, label=""):
+    """Porównanie zajętości pamięci (deep) dwóch wersji tabeli – per kolumna i łącznie, w MB."""
+    mb = 1024 * 1024
+    rows = []
+    for col in after.columns:
+        b = before[col].memory_usage(index=False, deep=True) / mb if col in before.columns else np.nan
+        a = after[col].memory_usage(index=False, deep=True) / mb
+        rows.append((col, str(before[col].dtype) if col in before.columns else "", str(after[col].dtype), b, a))
+    report = pd.DataFrame(rows, columns=["Column", "dtype_before", "dtype_after", "MB_before", "MB_after"])
+    total_before = before.memory_usage(index=True, deep=True).sum() / mb
+    total_after = after.memory_usage(index=True, deep=True).sum() / mb
+    print(f"Pamięć {label}: {total_before:.2f} MB -> {total_after:.2f} MB "
+          f"({total_after / total_before * 100 if total_before else 0:.0f}%), {len(after)} wierszy")
+    return report
+
+def report_file_memory(path, value_dtype=None):
+    """Wczytuje plik z domyślnymi typami i ze schematem, drukuje raport zajętości pamięci."""
+    before = pd.read_csv(path, encoding="latin1")
+    after = read_long_csv(path, value_dtype)
+    report = memory_report(before, after, label=path)
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    return report
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Użycie: python data_schema.py PLIK.csv [--float32]")
+        sys.exit(1)
+    report_file_memory(sys.argv[1], np.float32 if "--float32" in sys.argv else None)
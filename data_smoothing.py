@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: data_smoothing.py
+
+Wygładzanie krzywych kinetycznych i ich pochodne (szybkości) dla wszystkich dołków naraz.
+Kostka pomiar × cykl × dołek (plate_cube.py) jest traktowana jako jedna tablica serii czasowych
+(pomiary × dołki) i przetwarzana jedną operacją wzdłuż osi cykli:
+  - "savgol" – filtr Savitzky'ego–Golaya (okno window, wielomian polyorder): mnożenie okien
+               (sliding_window_view) przez wektor wag; na brzegach wartość dopasowanego wielomianu
+               pierwszego/ostatniego okna; pochodna – wagami pochodnej tego samego wielomianu,
+  - "median" – mediana ruchoma (okno window, brzegi uzupełniane wartością skrajną),
+  - "ema"    – wygładzanie wykładnicze (alpha); pętla po cyklach, każdy krok dla wszystkich serii naraz,
+  dla "median" i "ema" szybkość to np.gradient wygładzonej krzywej (dla serii z jednym cyklem – zero).
+Brakujące odczyty (NaN, np. dołki wykluczone w QC) są przed wygładzaniem uzupełniane sąsiednią wartością,
+a w wyniku ponownie ustawiane na NaN. Szybkość jest w jednostkach wartości na minutę.
+Etap potoku (smooth_file) zapisuje statystyki replikatów wygładzonych krzywych i szybkości dla każdej próby
+do smoothing/smoothed_summary.csv – selektor wykresów przełącza dane / wygładzone / szybkość bez przeliczania.
+"""
+
+import os
+import sys
+import time
+from math import factorial
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from data_qc import load_qc_flags, qc_mask
+from data_schema import read_long_csv, apply_schema
+from plate_cube import PlateCube
+from async_writer import write_csv
+
+METHODS = ["savgol", "median", "ema"]
+DEFAULTS = {"method": "savgol", "window": 7, "polyorder": 2, "alpha": 0.3}
+SUMMARY_COLUMNS = {'mean': 'Smoothed_mean', 'std': 'Smoothed_std', 'n': 'n', 'corrected': 'Smoothed_corrected',
+                   'rate_mean': 'Rate_mean', 'rate_std': 'Rate_std', 'rate_corrected': 'Rate_corrected'}
+
+def fill_gaps(series):
+    """Serie (N, K) bez NaN: braki uzupełniane poprzednią wartością, początkowe – pierwszą poprawną."""
+    valid = ~np.isnan(series)
+    if valid.all():
+        return series
+    rows = np.arange(series.shape[0])[:, None]
+    idx = np.where(valid, np.arange(series.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    filled = series[rows, idx]
+    # Braki przed pierwszym odczytem – od końca (pierwsza poprawna wartość)
+    idx = np.where(~np.isnan(filled), np.arange(series.shape[1]), series.shape[1] - 1)
+    idx = np.minimum.accumulate(idx[:, ::-1], axis=1)[:, ::-1]
+    return filled[rows, idx]
+
+def savgol_weights(window, polyorder, deriv=0, at=0):
+    """Wagi okna (window,) dające wartość (deriv=0) lub pochodną wielomianu dopasowanego w punkcie at (od środka okna)."""
+    half = window // 2
+    offsets = np.arange(window) - half
+    projection = np.linalg.pinv(np.vander(offsets, polyorder + 1, increasing=True))
+    row = np.array([factorial(k) / factorial(k - deriv) * float(at) ** (k - deriv) if k >= deriv else 0.0
+                    for k in range(polyorder + 1)])
+    return row @ projection
+
+def _gradient(series, delta):
+    """np.gradient wzdłuż osi cykli; seria z jednym odczytem (np. eksport punktu końcowego) ma szybkość 0."""
+    if series.shape[1] < 2:
+        return np.zeros_like(series)
+    return np.gradient(series, delta, axis=1)
+
+def _fit_window(window, polyorder, length):
+    """Największe nieparzyste okno <= length i > polyorder (None, gdy seria jest za krótka)."""
+    window = min(window, length if length % 2 else length - 1)
+    return window if window > polyorder else None
+
+def savgol(series, window, polyorder, deriv=0, delta=1.0):
+    """Filtr Savitzky'ego–Golaya dla serii (N, K) wzdłuż osi 1."""
+    window = _fit_window(window, polyorder, series.shape[1])
+    if window is None:
+        return series.copy() if deriv == 0 else _gradient(series, delta)
+    half = window // 2
+    out = np.empty_like(series)
+    out[:, half:series.shape[1] - half] = sliding_window_view(series, window, axis=1) @ savgol_weights(window, polyorder, deriv)
+    left = np.array([savgol_weights(window, polyorder, deriv, at) for at in range(-half, 0)])
+    right = np.array([savgol_weights(window, polyorder, deriv, at) for at in range(1, half + 1)])
+    out[:, :half] = series[:, :window] @ left.T
+    out[:, series.shape[1] - half:] = series[:, -window:] @ right.T
+    return out / delta ** deriv
+
+def moving_median(series, window):
+    half = window // 2
+    padded = np.pad(series, ((0, 0), (half, half)), mode="edge")
+    return np.median(sliding_window_view(padded, 2 * half + 1, axis=1), axis=2)
+
+def ema(series, alpha):
+    out = np.empty_like(series)
+    out[:, 0] = series[:, 0]
+    for k in range(1, series.shape[1]):
+        out[:, k] = alpha * series[:, k] + (1 - alpha) * out[:, k - 1]
+    return out
+
+def smooth_series(series, delta, method="savgol", window=7, polyorder=2, alpha=0.3):
+    """(wygładzone, szybkość) dla serii (N, K) o kroku czasu delta; NaN na pozycjach brakujących odczytów."""
+    if method not in METHODS:
+        raise ValueError(f"Nieznana metoda wygładzania '{method}' (dostępne: {', '.join(METHODS)})")
+    missing = np.isnan(series)
+    filled = fill_gaps(series)
+    if method == "savgol":
+        smoothed = savgol(filled, window, polyorder)
+        rate = savgol(filled, window, polyorder, deriv=1, delta=delta)
+    else:
+        smoothed = moving_median(filled, window) if method == "median" else ema(filled, alpha)
+        rate = _gradient(smoothed, delta)
+    smoothed[missing] = np.nan
+    rate[missing] = np.nan
+    return smoothed, rate
+
+def smooth_cube(cube, measurement_interval, **options):
+    """Kostki (wygładzone, szybkość) – wszystkie pomiary i dołki jako jedna tablica serii (pomiar·dołek, cykl)."""
+    n_meas, n_cycles, n_wells = cube.shape
+    series = cube.values.transpose(0, 2, 1).reshape(-1, n_cycles)
+    time_min = cube.time_min(measurement_interval)
+    delta = float(np.median(np.diff(time_min))) if n_cycles > 1 else 1.0
+    smoothed, rate = smooth_series(series, delta or 1.0, **options)
+    back = lambda a: a.reshape(n_meas, n_wells, n_cycles).transpose(0, 2, 1)
+    return cube.with_values(back(smoothed)), cube.with_values(back(rate))
+
+def smoothed_stats(cube, measurement_interval, **options):
+    """Statystyki replikatów wygładzonych krzywych i szybkości (z BLANK) + wersje skorygowane o średnią BLANK."""
+    smoothed, rate = smooth_cube(cube, measurement_interval, **options)
+    stats = smoothed.replicate_stats(include_blank=True)
+    rate_stats = rate.replicate_stats(include_blank=True)
+    stats["rate_mean"] = rate_stats["mean"]
+    stats["rate_std"] = rate_stats["std"]
+    stats["corrected"] = stats["mean"] - np.nan_to_num(smoothed.blank_mean(), nan=0.0)[:, :, None]
+    stats["rate_corrected"] = stats["rate_mean"] - np.nan_to_num(rate.blank_mean(), nan=0.0)[:, :, None]
+    return stats
+
+def smooth_file(long_merged_file, measurement_interval, smoothing=None, qc_flags=None):
+    """Etap potoku: wygładzanie (config 'smoothing') -> smoothing/smoothed_summary.csv."""
+    options = dict(DEFAULTS, **(smoothing or {}))
+    df = read_long_csv(long_merged_file)
+    flags = load_qc_flags(qc_flags)
+    if flags is not None:
+        df['Value'] = df['Value'].where(qc_mask(df, flags))
+    cube = PlateCube.from_long(df)
+    stats = smoothed_stats(cube, measurement_interval, **options)
+    result = apply_schema(cube.stats_frame(stats, measurement_interval, SUMMARY_COLUMNS))
+    folder = os.path.join(os.path.dirname(long_merged_file), "smoothing")
+    os.makedirs(folder, exist_ok=True)
+    out_path = os.path.join(folder, "smoothed_summary.csv")
+    write_csv(result, out_path, index=False)
+    print(f"Wygładzanie ({options['method']}) i szybkości zapisano do: {out_path}")
+    return result
+
+def benchmark_smoothing(n_wells=384, n_cycles=1000, window=11, polyorder=3, repeats=3, seed=0):
+    """Wszystkie serie jedną operacją vs pętla po seriach (ten sam filtr); zgodność z dopasowaniem np.polyfit."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_cycles, dtype=float)
+    series = 1000 + 0.5 * t + 20 * np.sin(t / 50) + rng.normal(0, 10, (2 * n_wells, n_cycles))
+
+    def batched():
+        return smooth_series(series, 1.0, window=window, polyorder=polyorder)
+
+    def per_well():
+        return [smooth_series(series[i:i + 1], 1.0, window=window, polyorder=polyorder) for i in range(len(series))]
+
+    for label, func in (("jedna operacja (wszystkie serie)", batched), ("pętla po seriach", per_well)):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        print(f"{label}: {min(timings):.4f} s ({series.shape[0]} serii × {n_cycles} cykli, okno {window})")
+    for method in METHODS:
+        start = time.perf_counter()
+        smooth_series(series, 1.0, method=method, window=window, polyorder=polyorder)
+        print(f"  {method} (wartości + szybkość): {time.perf_counter() - start:.4f} s")
+    # Kontrola: wartość i pochodna w środku i na brzegu = wielomian dopasowany np.polyfit do okna
+    smoothed, rate = savgol(series, window, polyorder), savgol(series, window, polyorder, deriv=1)
+    errors = []
+    for pos in (0, 2, n_cycles // 2, n_cycles - 1):
+        start = min(max(pos - window // 2, 0), n_cycles - window)
+        poly = np.polyfit(t[start:start + window], series[0, start:start + window], polyorder)
+        errors += [abs(np.polyval(poly, t[pos]) - smoothed[0, pos]),
+                   abs(np.polyval(np.polyder(poly), t[pos]) - rate[0, pos])]
+    print(f"Maks. różnica względem np.polyfit: {max(errors):.2e}")
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_smoothing()
+        sys.exit(0)
+    input_file = input("Podaj ścieżkę do pliku long (CSV): ").strip()
+    try:
+        measurement_interval = float(input("Podaj interwał pomiaru (min, domyślnie 20): ").strip() or 20)
+    except:
+        measurement_interval = 20
+    method = input(f"Metoda ({', '.join(METHODS)}; domyślnie savgol): ").strip() or "savgol"
+    smooth_file(input_file, measurement_interval, {"method": method})
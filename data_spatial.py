@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: data_spatial.py
+
+Normalizacja przestrzenna płytek – usuwanie efektów pozycji (parowanie na brzegach, gradienty wierszy
+i kolumn w długich pomiarach w 37 °C), których nie usuwa odjęcie jednej średniej BLANK na cykl.
+Wartości kostki pomiar × cykl × dołek (plate_cube.py) układane są w siatkę płytki
+(…, wiersz, kolumna) i dla każdej płytki, pomiaru i cyklu naraz dopasowywany jest model
+    wartość = ogólna + efekt_wiersza + efekt_kolumny + reszta
+metodą median polish Tukeya (naprzemienne odejmowanie median wierszy i kolumn – operacje nanmedian
+wzdłuż osi siatki, bez pętli po płytkach i cyklach). Metody:
+  - "median_polish" – wartość skorygowana = wartość − efekt_wiersza − efekt_kolumny (poziom płytki zostaje),
+  - "bscore"        – B-score: reszta / (1.4826 · MAD reszt płytki w danym cyklu) – wartość bez jednostek.
+Model zakłada, że większość dołków w wierszu/kolumnie nie różni się biologicznie (np. próby rozłożone
+na płytce, a nie całe wiersze jednej próby) – w przeciwnym razie efekt próby zostałby usunięty jako efekt wiersza.
+Wiele płytek normalizowanych jest jednym przebiegiem (normalize_plates): siatki płytek są łączone w tablicę
+(płytka, pomiar, cykl, wiersz, kolumna), krótsze serie uzupełniane NaN.
+Etap potoku (spatial_file) zapisuje spatial/spatial_summary.csv (kolumny jak blank_corrected_summary.csv,
+dla "bscore" bez korekty BLANK) oraz spatial/spatial_effects.csv (efekty wierszy i kolumn w każdym cyklu).
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from data_qc import load_qc_flags, qc_mask
+from data_schema import read_long_csv, apply_schema
+from plate_cube import PlateCube, well_positions, row_label
+from async_writer import write_csv
+
+METHODS = ["median_polish", "bscore"]
+MAD_SCALE = 1.4826
+
+def _grid_positions(wells):
+    """Pozycje dołków (plate_cube.well_positions) i kształt siatki; ValueError dla nierozpoznanej nazwy dołka."""
+    rows, cols, (n_rows, n_cols) = well_positions(wells)
+    unknown = np.flatnonzero(rows < 0)
+    if len(unknown):
+        raise ValueError(f"Nie można ustalić pozycji dołka '{wells[unknown[0]]}'")
+    return rows, cols, n_rows, n_cols
+
+def _nanmedian(values, axis, empty=0.0):
+    """
+    Mediana z pominięciem NaN wzdłuż osi – jedno sortowanie (NaN trafiają na koniec) i wybór środkowych
+    elementów według liczby poprawnych wartości (np.nanmedian jest dla wielu krótkich osi wielokrotnie wolniejsze).
+    Osie bez poprawnych wartości -> empty.
+    """
+    ordered = np.sort(np.moveaxis(values, axis, -1), axis=-1)
+    n = (~np.isnan(ordered)).sum(axis=-1)
+    lo = np.take_along_axis(ordered, np.maximum((n - 1) // 2, 0)[..., None], axis=-1)[..., 0]
+    hi = np.take_along_axis(ordered, np.minimum(n // 2, ordered.shape[-1] - 1)[..., None], axis=-1)[..., 0]
+    return np.where(n > 0, (lo + hi) / 2, empty)
+
+def median_polish(grid, max_iter=10, tol=1e-9):
+    """
+    Median polish Tukeya dla siatek (..., wiersze, kolumny) – wszystkie wymiary wiodące naraz.
+    Zwraca (ogólna (...), efekty wierszy (..., R), efekty kolumn (..., C), reszty jak grid).
+    """
+    residual = np.array(grid, dtype=float, copy=True)
+    overall = np.zeros(grid.shape[:-2])
+    row = np.zeros(grid.shape[:-1])
+    col = np.zeros(grid.shape[:-2] + grid.shape[-1:])
+    for _ in range(max_iter):
+        row_median = _nanmedian(residual, axis=-1)
+        residual -= row_median[..., None]
+        row += row_median
+        shift = _nanmedian(col, axis=-1)
+        col -= shift[..., None]
+        overall += shift
+        col_median = _nanmedian(residual, axis=-2)
+        residual -= col_median[..., None, :]
+        col += col_median
+        shift = _nanmedian(row, axis=-1)
+        row -= shift[..., None]
+        overall += shift
+        if max(np.abs(row_median).max(initial=0.0), np.abs(col_median).max(initial=0.0)) < tol:
+            break
+    return overall, row, col, residual
+
+def normalize_grid(grid, method="median_polish"):
+    """Siatki znormalizowane wybraną metodą oraz efekty (overall, row, col) – dla dowolnych wymiarów wiodących."""
+    if method not in METHODS:
+        raise ValueError(f"Nieznana metoda normalizacji '{method}' (dostępne: {', '.join(METHODS)})")
+    overall, row, col, residual = median_polish(grid)
+    if method == "median_polish":
+        normalized = grid - row[..., :, None] - col[..., None, :]
+    else:
+        flat = residual.reshape(residual.shape[:-2] + (-1,))
+        mad = _nanmedian(np.abs(flat - _nanmedian(flat, -1, np.nan)[..., None]), -1, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            normalized = residual / (MAD_SCALE * np.where(mad > 0, mad, np.nan))[..., None, None]
+    return normalized, {"overall": overall, "row": row, "col": col}
+
+def normalize_plates(cubes, method="median_polish"):
+    """
+    Normalizacja wielu płytek jednym przebiegiem: siatki (płytka, pomiar, cykl, wiersz, kolumna);
+    pomiary – suma pomiarów płytek, brakujące pomiary / cykle / dołki to NaN.
+    Zwraca listę (kostka znormalizowana, efekty {overall, row, col} tej płytki).
+    """
+    measurements = list(dict.fromkeys(m for cube in cubes for m in cube.measurements))
+    positions = [_grid_positions(cube.wells) for cube in cubes]
+    n_rows = max(p[2] for p in positions)
+    n_cols = max(p[3] for p in positions)
+    n_cycles = max(cube.shape[1] for cube in cubes)
+    grid = np.full((len(cubes), len(measurements), n_cycles, n_rows, n_cols), np.nan)
+    for i, (cube, (rows, cols, _, _)) in enumerate(zip(cubes, positions)):
+        meas = [measurements.index(m) for m in cube.measurements]
+        values = np.where(cube.present, cube.values, np.nan)
+        grid[i, np.array(meas)[:, None, None], np.arange(cube.shape[1])[None, :, None], rows, cols] = values
+    normalized, effects = normalize_grid(grid, method)
+    results = []
+    for i, (cube, (rows, cols, _, _)) in enumerate(zip(cubes, positions)):
+        meas = [measurements.index(m) for m in cube.measurements]
+        n_k = cube.shape[1]
+        values = normalized[i, meas, :n_k][..., rows, cols]
+        plate_effects = {key: effects[key][i, meas, :n_k] for key in effects}
+        results.append((cube.with_values(np.where(cube.present, values, np.nan)), plate_effects))
+    return results
+
+def effects_frame(cube, effects, measurement_interval):
+    """Tabela efektów: Measurement, Kinetics, Time_min, Effect (Row/Column), Position (A…/1…), Value."""
+    frames = []
+    time_min = cube.time_min(measurement_interval)
+    for key, label, name in (("row", "Row", row_label), ("col", "Column", lambda c: str(c + 1))):
+        values = effects[key]
+        names = [name(i) for i in range(values.shape[-1])]
+        m, k, p = np.indices(values.shape).reshape(3, -1)
+        frames.append(pd.DataFrame({
+            "Measurement": np.asarray(cube.measurements, dtype=object)[m],
+            "Kinetics": cube.kinetics[k],
+            "Time_min": time_min[k],
+            "Effect": label,
+            "Position": np.asarray(names, dtype=object)[p],
+            "Value": values.ravel(),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def spatial_summary(cube, measurement_interval, method):
+    """Podsumowanie prób jak blank_corrected_summary.csv; dla B-score statystyki bez korekty BLANK."""
+    if method == "bscore":
+        stats = cube.replicate_stats(include_blank=False)
+        stats["blank"] = np.zeros_like(stats["mean"])
+        stats["corrected"] = stats["mean"]
+    else:
+        stats = cube.blank_corrected()
+    frame = cube.stats_frame(stats, measurement_interval, {
+        'mean': 'Sample_avg', 'std': 'Sample_std', 'n': 'n', 'blank': 'Blank_avg', 'corrected': 'Corrected',
+        'sum': 'Sample_sum', 'm2': 'Sample_M2'})
+    return apply_schema(frame[['Sample', 'Kinetics', 'Time_min', 'Sample_avg', 'Sample_std', 'n',
+                               'Blank_avg', 'Corrected', 'Measurement', 'Sample_sum', 'Sample_M2']])
+
+def _load_cube(long_file, qc_flags=None):
+    df = read_long_csv(long_file)
+    flags = load_qc_flags(qc_flags)
+    if flags is not None:
+        df['Value'] = df['Value'].where(qc_mask(df, flags))
+    return PlateCube.from_long(df)
+
+def _write_results(results_dir, cube, effects, measurement_interval, method):
+    folder = os.path.join(results_dir, "spatial")
+    os.makedirs(folder, exist_ok=True)
+    summary_path = os.path.join(folder, "spatial_summary.csv")
+    write_csv(spatial_summary(cube, measurement_interval, method), summary_path, index=False)
+    write_csv(effects_frame(cube, effects, measurement_interval), os.path.join(folder, "spatial_effects.csv"), index=False)
+    return summary_path
+
+def spatial_file(long_merged_file, measurement_interval, method="median_polish", qc_flags=None):
+    """Etap potoku: normalizacja przestrzenna płytki (config 'spatial_method') -> folder spatial/."""
+    cube = _load_cube(long_merged_file, qc_flags)
+    (normalized, effects), = normalize_plates([cube], method)
+    summary_path = _write_results(os.path.dirname(long_merged_file), normalized, effects, measurement_interval, method)
+    edge = np.abs(effects["row"][..., [0, -1]]).mean() if effects["row"].size else 0.0
+    print(f"Normalizacja przestrzenna ({method}) zapisana do: {summary_path} "
+          f"(średni |efekt| wierszy skrajnych: {edge:.3g})")
+    return normalized
+
+def spatial_folders(folders, method="median_polish"):
+    """Normalizacja wielu analiz (folderów wynikowych) jednym przebiegiem – wyniki w spatial/ każdego folderu."""
+    from plot_data_store import get_measurement_interval
+    files = []
+    for folder in folders:
+        long_file = os.path.join(folder, "long_merged.csv")
+        files.append(long_file if os.path.isfile(long_file) else os.path.join(folder, "long_measA.csv"))
+    cubes = [_load_cube(path, os.path.join(folder, "qc", "well_flags.csv")) for path, folder in zip(files, folders)]
+    for folder, (normalized, effects) in zip(folders, normalize_plates(cubes, method)):
+        print("Zapisano:", _write_results(folder, normalized, effects, get_measurement_interval(folder), method))
+
+def benchmark_spatial(n_plates=50, n_cycles=100, repeats=3, seed=0):
+    """Median polish dla n_plates płytek 96-dołkowych × 2 pomiary × n_cycles: jedna tablica vs pętla po płytkach i cyklach."""
+    rng = np.random.default_rng(seed)
+    row_bias = np.linspace(-1, 1, 8) ** 2 * 40  # brzegi płytki (parowanie)
+    col_bias = np.linspace(0, 30, 12)           # gradient kolumn
+    grid = (1000 + row_bias[:, None] + col_bias[None, :]
+            + rng.normal(0, 10, (n_plates, 2, n_cycles, 8, 12)))
+
+    def batched():
+        return normalize_grid(grid)[0]
+
+    def looped():
+        out = np.empty_like(grid)
+        for idx in np.ndindex(grid.shape[:-2]):
+            out[idx] = normalize_grid(grid[idx])[0]
+        return out
+
+    results = {}
+    for label, func in (("jedna tablica", batched), ("pętla po płytkach i cyklach", looped)):
+        timings = []
+        for _ in range(1 if label != "jedna tablica" else repeats):
+            start = time.perf_counter()
+            results[label] = func()
+            timings.append(time.perf_counter() - start)
+        print(f"{label}: {min(timings):.3f} s ({n_plates} płytek × 2 pomiary × {n_cycles} cykli)")
+    same = np.allclose(results["jedna tablica"], results["pętla po płytkach i cyklach"])
+    residual_bias = np.abs(results["jedna tablica"].mean(axis=(0, 1, 2)) - results["jedna tablica"].mean()).max()
+    raw_bias = np.abs(grid.mean(axis=(0, 1, 2)) - grid.mean()).max()
+    print(f"Wyniki zgodne: {'tak' if same else 'NIE'}; maks. odchylenie pozycji od średniej: "
+          f"{raw_bias:.1f} przed, {residual_bias:.2f} po normalizacji")
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_spatial()
+        sys.exit(0)
+    method = "bscore" if "--bscore" in sys.argv else "median_polish"
+    folders = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not folders:
+        folders = [input("Podaj folder wyników ([nazwa_pliku]_results): ").strip()]
+    spatial_folders(folders, method)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: experiment_db.py
+
+Lokalna, wbudowana baza eksperymentów (SQLite) do porównywania wielu analiz.
+Każdy przetworzony folder wynikowy ([nazwa_pliku]_results) jest wczytywany do bazy tylko raz
+(ponownie – jedynie gdy zmienią się jego pliki). Tabele:
+  - runs        – jeden wiersz na analizę (nazwa, ścieżka, sygnatura plików, interwał),
+  - blank_stats – blank_corrected_summary.csv (Sample_avg, Sample_std, n, Blank_avg, Corrected),
+  - raw_stats   – średnia/std/liczność surowych wartości z long_merged.csv,
+obie z kluczem (run_id, measurement, sample, kinetics) oraz indeksem (sample, measurement, time_min).
+Selektor wykresów i narzędzia wsadowe pobierają tylko potrzebne wycinki, np.
+"wszystkie analizy z próbą X, Meas A, pierwsze 300 min", bez ponownego parsowania CSV.
+Wczytywanie (ingest_run) może być wywoływane z wielu wątków: pliki CSV są parsowane równolegle,
+a blokada obejmuje tylko zapis do bazy.
+"""
+
+import os
+import sys
+import sqlite3
+import threading
+from datetime import datetime
+import pandas as pd
+
+from plot_data_store import (get_measurement_interval, ratio_from_blank_corrected, load_metric_data,
+                             load_smoothed_data, SMOOTHABLE_MODES)
+from data_schema import read_long_csv, time_minutes
+from group_stats import group_agg
+
+DEFAULT_DB_NAME = "experiments.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL UNIQUE,
+    signature TEXT NOT NULL,
+    measurement_interval REAL,
+    ingested_at TEXT
+);
+CREATE TABLE IF NOT EXISTS blank_stats (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    measurement TEXT NOT NULL,
+    sample TEXT NOT NULL,
+    kinetics INTEGER NOT NULL,
+    time_min REAL,
+    sample_avg REAL,
+    sample_std REAL,
+    n INTEGER,
+    blank_avg REAL,
+    corrected REAL,
+    PRIMARY KEY (run_id, measurement, sample, kinetics)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_blank_sample ON blank_stats (sample, measurement, time_min);
+CREATE TABLE IF NOT EXISTS raw_stats (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    measurement TEXT NOT NULL,
+    sample TEXT NOT NULL,
+    kinetics INTEGER NOT NULL,
+    time_min REAL,
+    value_mean REAL,
+    value_std REAL,
+    n INTEGER,
+    PRIMARY KEY (run_id, measurement, sample, kinetics)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_raw_sample ON raw_stats (sample, measurement, time_min);
+"""
+
+# Nazwy kolumn w bazie -> nazwy kolumn używane w plikach CSV / selektorze
+BLANK_COLUMNS = {"sample": "Sample", "kinetics": "Kinetics", "time_min": "Time_min", "sample_avg": "Sample_avg",
+                 "sample_std": "Sample_std", "n": "n", "blank_avg": "Blank_avg", "corrected": "Corrected",
+                 "measurement": "Measurement"}
+RAW_COLUMNS = {"sample": "Sample", "kinetics": "Kinetics", "time_min": "Time_min", "value_mean": "Value_mean",
+               "value_std": "Value_std", "n": "n", "measurement": "Measurement"}
+
+def default_db_path(base_dir):
+    """Baza leży obok folderów wynikowych (w folderze nadrzędnym base_dir)."""
+    return os.path.join(os.path.dirname(os.path.abspath(base_dir)), DEFAULT_DB_NAME)
+
+def _run_files(results_dir):
+    blank_file = os.path.join(results_dir, "blank_corrected_analysis", "blank_corrected_summary.csv")
+    raw_file = os.path.join(results_dir, "long_merged.csv")
+    if not os.path.isfile(raw_file):
+        raw_file = os.path.join(results_dir, "long_measA.csv")
+    return blank_file, raw_file
+
+def find_result_folders(folder):
+    """
+    Foldery wynikowe w folderze: sam folder, jeżeli zawiera wyniki analizy,
+    w przeciwnym razie jego podfoldery z wynikami (posortowane po nazwie).
+    """
+    def is_results(path):
+        return any(os.path.isfile(f) for f in _run_files(path))
+    if is_results(folder):
+        return [folder]
+    children = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+    return [child for child in children if os.path.isdir(child) and is_results(child)]
+
+def _signature(paths):
+    parts = []
+    for path in paths:
+        if os.path.isfile(path):
+            st = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{st.st_mtime_ns}:{st.st_size}")
+    return "|".join(parts)
+
+class ExperimentDB:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def ingest_run(self, results_dir, run_name=None, force=False):
+        """
+        Wczytuje folder wynikowy do bazy i zwraca run_id.
+        Jeżeli analiza jest już w bazie z tą samą sygnaturą plików – nic nie jest wczytywane.
+        """
+        results_dir = os.path.abspath(results_dir)
+        run_name = run_name or os.path.basename(os.path.normpath(results_dir))
+        blank_file, raw_file = _run_files(results_dir)
+        if not os.path.isfile(blank_file) and not os.path.isfile(raw_file):
+            raise FileNotFoundError(f"Brak plików wynikowych w folderze: {results_dir}")
+        signature = _signature([blank_file, raw_file])
+        with self._connect() as conn:
+            row = conn.execute("SELECT run_id, signature FROM runs WHERE path = ?", (results_dir,)).fetchone()
+        if row is not None and row[1] == signature and not force:
+            return row[0]
+        # Parsowanie CSV poza blokadą – kilka analiz może być przygotowywanych jednocześnie
+        interval = get_measurement_interval(results_dir)
+        blank_rows = raw_rows = None
+        if os.path.isfile(blank_file):
+            df = pd.read_csv(blank_file, encoding="latin1")
+            blank_rows = df[["Measurement", "Sample", "Kinetics", "Time_min",
+                             "Sample_avg", "Sample_std", "n", "Blank_avg", "Corrected"]]
+        if os.path.isfile(raw_file):
+            df = read_long_csv(raw_file)
+            if "Time_min" not in df.columns:
+                df['Time_min'] = time_minutes(df['Kinetics'], interval)
+            stats = group_agg(df, ['Measurement', 'Sample', 'Kinetics', 'Time_min'], 'Value', ('mean', 'std', 'count'))
+            raw_rows = stats[["Measurement", "Sample", "Kinetics", "Time_min", "mean", "std", "count"]]
+        with self._lock, self._connect() as conn:
+            # Ponowne sprawdzenie pod blokadą – ten sam folder mógł zostać wczytany przez inny wątek
+            row = conn.execute("SELECT run_id, signature FROM runs WHERE path = ?", (results_dir,)).fetchone()
+            if row is not None and row[1] == signature and not force:
+                return row[0]
+            if row is not None:
+                conn.execute("DELETE FROM runs WHERE run_id = ?", (row[0],))
+            # Foldery o tej samej nazwie z różnych miejsc dostają kolejne numery (name jest UNIQUE)
+            base_name, number = run_name, 2
+            while conn.execute("SELECT 1 FROM runs WHERE name = ?", (run_name,)).fetchone():
+                run_name, number = f"{base_name}_{number}", number + 1
+            cur = conn.execute(
+                "INSERT INTO runs (name, path, signature, measurement_interval, ingested_at) VALUES (?, ?, ?, ?, ?)",
+                (run_name, results_dir, signature, interval, datetime.now().isoformat(timespec="seconds")))
+            run_id = cur.lastrowid
+            if blank_rows is not None:
+                rows = blank_rows.astype(object).where(blank_rows.notna(), None)
+                conn.executemany("INSERT INTO blank_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 ((run_id,) + r for r in rows.itertuples(index=False, name=None)))
+            if raw_rows is not None:
+                rows = raw_rows.astype(object).where(raw_rows.notna(), None)
+                conn.executemany("INSERT INTO raw_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 ((run_id,) + r for r in rows.itertuples(index=False, name=None)))
+        print(f"[DEBUG] Wczytano analizę '{run_name}' do bazy {self.db_path} (run_id={run_id})")
+        return run_id
+
+    def list_runs(self):
+        with self._connect() as conn:
+            return pd.read_sql_query("SELECT * FROM runs ORDER BY run_id", conn)
+
+    def remove_run(self, run_id):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def _query(self, table, columns, samples=None, measurement=None, runs=None, time_min=None, time_max=None):
+        where = []
+        params = []
+        if runs is not None:
+            runs = list(runs)
+            where.append(f"t.run_id IN ({','.join('?' * len(runs))})")
+            params.extend(runs)
+        if samples is not None:
+            samples = list(samples)
+            where.append(f"t.sample IN ({','.join('?' * len(samples))})")
+            params.extend(samples)
+        if measurement is not None:
+            where.append("t.measurement = ?")
+            params.append(measurement)
+        if time_min is not None:
+            where.append("t.time_min >= ?")
+            params.append(time_min)
+        if time_max is not None:
+            where.append("t.time_min <= ?")
+            params.append(time_max)
+        select = ", ".join(f"t.{col}" for col in columns)
+        sql = f"SELECT r.name AS Run, t.run_id AS run_id, {select} FROM {table} t JOIN runs r ON r.run_id = t.run_id"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY t.run_id, t.measurement, t.sample, t.kinetics"
+        with self._connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        return df.rename(columns=BLANK_COLUMNS if table == "blank_stats" else RAW_COLUMNS)
+
+    def query_blank_corrected(self, **filters):
+        """Wycinek blank_corrected_summary (filtry: samples, measurement, runs, time_min, time_max)."""
+        return self._query("blank_stats", list(BLANK_COLUMNS), **filters)
+
+    def query_raw(self, **filters):
+        """Wycinek statystyk surowych wartości (filtry jak w query_blank_corrected)."""
+        return self._query("raw_stats", list(RAW_COLUMNS), **filters)
+
+    def query_mode(self, mode, measurement="Meas A", curve=None, **filters):
+        """Zwraca dane w postaci zgodnej z plot_data_store.load_mode_data (z dodatkową kolumną Run)."""
+        if curve is not None and mode in SMOOTHABLE_MODES:
+            return self._query_run_files(
+                lambda path: load_smoothed_data(path, mode, measurement, curve, filters.get("samples")), filters.get("runs"))
+        if mode == "F/OD Ratio":
+            df_bc = self.query_blank_corrected(**filters)
+            if df_bc.empty:
+                return df_bc
+            parts = [ratio_from_blank_corrected(group).assign(Run=run)
+                     for run, group in df_bc.groupby("Run", sort=False)]
+            return pd.concat(parts, ignore_index=True)
+        if mode == "Blank Corrected":
+            return self.query_blank_corrected(measurement=measurement, **filters)
+        if mode == "Raw Measurements":
+            return self.query_raw(measurement=measurement, **filters)
+        if mode == "Metrics":
+            return self._query_run_files(
+                lambda path: load_metric_data(path, measurement, filters.get("samples")), filters.get("runs"))
+        return None
+
+    def _query_run_files(self, load, runs=None):
+        """
+        Dane wczytywane z plików folderów analiz z bazy – dla wyników nieprzechowywanych w tabelach
+        (metryki, krzywe wygładzone); analizy bez pliku są pomijane.
+        """
+        sql = "SELECT run_id, name, path FROM runs"
+        params = []
+        if runs is not None:
+            runs = list(runs)
+            sql += f" WHERE run_id IN ({','.join('?' * len(runs))})"
+            params = runs
+        with self._connect() as conn:
+            rows = conn.execute(sql + " ORDER BY run_id", params).fetchall()
+        parts = []
+        for run_id, name, path in rows:
+            try:
+                parts.append(load(path).assign(Run=name, run_id=run_id))
+            except FileNotFoundError:
+                continue
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+    def runs_with_sample(self, sample):
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute(
+                "SELECT DISTINCT r.name FROM blank_stats t JOIN runs r ON r.run_id = t.run_id "
+                "WHERE t.sample = ? ORDER BY r.name", (sample,))]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Użycie: python experiment_db.py BAZA.sqlite FOLDER_WYNIKÓW [FOLDER_WYNIKÓW ...]")
+        sys.exit(1)
+    db = ExperimentDB(sys.argv[1])
+    for folder in sys.argv[2:]:
+        db.ingest_run(folder)
+    print(db.list_runs())
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: figure_export.py
+
+Eksport wykresów bez GUI (backend Agg) dla wielu płytek naraz.
+Dla każdej płytki (folderu [nazwa_pliku]_results) renderowany jest komplet wykresów:
+każdy tryb (F/OD Ratio, Blank Corrected, Raw Measurements) × każdy pomiar × każda grupa prób
+(domyślnie: każda próba osobno oraz wszystkie próby razem), w formatach PNG/SVG/PDF.
+Praca dzielona jest na pulę procesów; każdy proces przygotowuje dane danej płytki
+(prepare_plot_store) tylko raz i używa ich dla wszystkich swoich wykresów.
+Opcje wykresu (słupki błędów, trendline, kolory, etykiety osi, tytuł) są wspólne dla całego eksportu.
+"""
+
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from plot_data_store import MODE_COLUMNS, prepare_plot_store, fit_trendline
+
+DEFAULT_OPTIONS = {
+    "errorbars": True,
+    "capsize": 5,
+    "trendline": None,          # None, "Liniowy" lub "Wielomianowy (2nd stopnia)"
+    "colors": {},               # {próba: kolor}
+    "x_label": "Czas (min)",
+    "y_label": None,            # None – domyślna etykieta trybu
+    "title": "",                # pusty – tytuł generowany z trybu, pomiaru i grupy
+    "x_max": None,
+    "figsize": (8, 6),
+    "dpi": 100,
+}
+
+# Dane płytek przygotowane w danym procesie: {base_dir: store}
+_STORE_CACHE = {}
+
+def _slug(text):
+    return re.sub(r"[^0-9A-Za-z]+", "_", str(text)).strip("_")
+
+def _get_store(base_dir):
+    if base_dir not in _STORE_CACHE:
+        _STORE_CACHE[base_dir] = prepare_plot_store(base_dir)
+    return _STORE_CACHE[base_dir]
+
+def _worker_init():
+    import matplotlib
+    matplotlib.use("Agg")
+
+def plan_figures(store, sample_groups=None):
+    """
+    Zwraca (deterministyczną) listę specyfikacji wykresów dla jednej płytki:
+    [(tryb, pomiar, nazwa_grupy, [próby]), ...].
+    sample_groups – słownik {nazwa_grupy: [próby]}; None oznacza każdą próbę osobno + "wszystkie".
+    """
+    specs = []
+    for (mode, meas) in sorted(store.keys(), key=lambda k: (k[0], k[1] or "")):
+        samples = sorted(store[(mode, meas)]["Sample"].astype(str).unique())
+        if sample_groups is None:
+            groups = [(s, [s]) for s in samples] + [("wszystkie", samples)]
+        else:
+            groups = [(name, [s for s in members if s in samples]) for name, members in sorted(sample_groups.items())]
+        for name, members in groups:
+            if members:
+                specs.append((mode, meas, name, members))
+    return specs
+
+def render_figure(df, mode, meas, group_name, samples, options, out_paths):
+    """Rysuje jeden wykres (Figure + FigureCanvasAgg, bez pyplot) i zapisuje go do wszystkich out_paths."""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    import matplotlib as mpl
+
+    y_col, err_col, default_label = MODE_COLUMNS[mode]
+    fig = Figure(figsize=options["figsize"], dpi=options["dpi"])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.set_xlabel(options["x_label"])
+    ax.set_ylabel(options["y_label"] or default_label)
+    title = options["title"] or " – ".join(part for part in (mode, meas, group_name) if part)
+    ax.set_title(title)
+    ax.grid(True)
+    colors = mpl.rcParams['axes.prop_cycle'].by_key()['color']
+    for i, sample in enumerate(samples):
+        df_sample = df[df["Sample"].astype(str) == sample].sort_values("Time_min")
+        if options["x_max"] is not None:
+            df_sample = df_sample[df_sample["Time_min"] <= options["x_max"]]
+        if df_sample.empty:
+            continue
+        color = options["colors"].get(sample, colors[i % len(colors)])
+        x = df_sample["Time_min"].values
+        y = df_sample[y_col].values
+        yerr = df_sample[err_col].values if options["errorbars"] and err_col in df_sample.columns else None
+        ax.errorbar(x, y, yerr=yerr, fmt='-o', capsize=options["capsize"], label=sample, color=color)
+        if options["trendline"] and len(df_sample) >= 2:
+            trend = fit_trendline(x, y, options["trendline"])
+            if trend is not None:
+                trend_func, eq_text = trend
+                x_fit = np.linspace(x.min(), x.max(), 100)
+                ax.plot(x_fit, trend_func(x_fit), '--', color=color)
+                ax.text(x_fit.max(), trend_func(x_fit.max()), eq_text, color=color,
+                        verticalalignment='bottom', horizontalalignment='right', backgroundcolor='white')
+    ax.legend()
+    for path in out_paths:
+        fig.savefig(path)
+
+def _render_part(base_dir, out_dir, formats, options, sample_groups, part, n_parts):
+    """Renderuje co n_parts-ty wykres płytki (zaczynając od part). Zwraca (liczba wykresów, błędy)."""
+    store = _get_store(base_dir)
+    plate_dir = os.path.join(out_dir, os.path.basename(os.path.normpath(base_dir)))
+    os.makedirs(plate_dir, exist_ok=True)
+    count = 0
+    errors = []
+    for mode, meas, group_name, samples in plan_figures(store, sample_groups)[part::n_parts]:
+        stem = "_".join(_slug(p) for p in (mode, meas, group_name) if p)
+        out_paths = [os.path.join(plate_dir, f"{stem}.{fmt}") for fmt in formats]
+        try:
+            render_figure(store[(mode, meas)], mode, meas, group_name, samples, options, out_paths)
+            count += 1
+        except Exception as e:
+            errors.append(f"{base_dir}: {stem}: {e}")
+    return count, errors
+
+def export_figures(base_dirs, out_dir, formats=("png",), options=None, sample_groups=None, workers=None):
+    """
+    Eksportuje komplet wykresów dla każdego folderu z base_dirs do out_dir/<nazwa_folderu>/.
+    workers – liczba procesów (domyślnie liczba rdzeni); 1 oznacza pracę w bieżącym procesie.
+    Zwraca słownik: figures, seconds, figures_per_second, errors.
+    """
+    opts = dict(DEFAULT_OPTIONS)
+    opts.update(options or {})
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    total = 0
+    errors = []
+    if workers == 1:
+        _worker_init()
+        for base_dir in base_dirs:
+            count, errs = _render_part(base_dir, out_dir, formats, opts, sample_groups, 0, 1)
+            total += count
+            errors.extend(errs)
+    else:
+        # Każda płytka dzielona na `workers` części – proces ładuje dane płytki raz na swoją część
+        with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as pool:
+            futures = [pool.submit(_render_part, base_dir, out_dir, formats, opts, sample_groups, part, workers)
+                       for base_dir in base_dirs for part in range(workers)]
+            for future in as_completed(futures):
+                count, errs = future.result()
+                total += count
+                errors.extend(errs)
+    seconds = time.perf_counter() - start
+    for err in errors:
+        print("[DEBUG] Błąd eksportu:", err)
+    stats = {"figures": total, "seconds": seconds,
+             "figures_per_second": total / seconds if seconds > 0 else 0.0, "errors": errors}
+    print(f"Wyeksportowano {total} wykresów w {seconds:.2f} s ({stats['figures_per_second']:.1f} wykr./s)")
+    return stats
+
+def benchmark_export(base_dirs, out_dir, formats=("png",), worker_counts=None):
+    """Porównuje przepustowość eksportu (wykresy/s) dla różnych liczb procesów."""
+    worker_counts = worker_counts or sorted({1, os.cpu_count() or 1})
+    results = {}
+    for workers in worker_counts:
+        _STORE_CACHE.clear()
+        stats = export_figures(base_dirs, out_dir, formats=formats, workers=workers)
+        results[workers] = stats["figures_per_second"]
+        print(f"Procesy: {workers} – {stats['figures_per_second']:.1f} wykr./s")
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Użycie: python figure_export.py FOLDER_DOCELOWY FOLDER_WYNIKÓW [FOLDER_WYNIKÓW ...] [--benchmark]")
+        sys.exit(1)
+    args = [a for a in sys.argv[1:] if a != "--benchmark"]
+    if "--benchmark" in sys.argv:
+        benchmark_export(args[1:], args[0])
+    else:
+        export_figures(args[1:], args[0], formats=("png", "svg", "pdf"))
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: group_stats.py
+
+Wspólne jądro agregacji grupowej (zamiast osobnych groupby(...).agg([...]) w poszczególnych etapach).
+Klucze grup (np. Measurement, Sample, Kinetics, Time_min) są raz zamieniane na kody całkowite:
+  - każda kolumna – kody kategorii (category), przesunięcie o minimum (małe liczby całkowite)
+    lub pd.factorize (pozostałe),
+  - kody kolumn łączone w jeden kod (indeks mieszany), zagęszczany przez bincount obecności
+    (lub haszowany pd.factorize, gdy przestrzeń kluczy jest dużo większa od liczby wierszy).
+Statystyki wszystkich grup liczone są jednym przebiegiem po tablicy:
+  - count, sum, mean – np.bincount z wagami,
+  - std (ddof=1, jak w pandas) – drugi przebieg: suma kwadratów odchyleń od średniej grupy (M2),
+  - min, max, median – segmenty tablicy posortowanej po (grupa, wartość): początek, koniec i środek segmentu.
+Wartości NaN są pomijane (jak w pandas), wiersze z brakującym kluczem nie należą do żadnej grupy.
+Kolejność grup jak w groupby(sort=True) – lub kolejność pierwszego wystąpienia dla sort=False.
+"""
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+STATS = ["count", "sum", "mean", "std", "M2", "min", "max", "median"]
+
+def column_codes(col, sort=True):
+    """Kody całkowite kolumny (−1 = brak) i rozmiar przestrzeni kodów – bez haszowania dla category i małych liczb całkowitych."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy(dtype=np.int64), len(col.cat.categories)
+    if pd.api.types.is_integer_dtype(col.dtype) and len(col):
+        values = col.to_numpy(dtype=np.int64)
+        lo, hi = values.min(), values.max()
+        if hi - lo < 4 * len(values) + (1 << 16):
+            return values - lo, int(hi - lo) + 1
+    codes, uniques = pd.factorize(col, sort=sort)
+    return codes, len(uniques)
+
+def key_columns(df, keys):
+    """Kolumny kluczy z tekstem zamienionym raz na category – kilka indeksów grup na tych samych kolumnach nie haszuje ich ponownie."""
+    return pd.DataFrame({k: df[k] if isinstance(df[k].dtype, pd.CategoricalDtype) or df[k].dtype.kind in "iufb"
+                         else df[k].astype("category") for k in keys}, index=df.index)
+
+class GroupIndex:
+    """Kody grup dla kolumn kluczy: codes (−1 = brak klucza), n_groups, first (pierwszy wiersz każdej grupy)."""
+    def __init__(self, columns, sort=True):
+        columns = [col if isinstance(col, pd.Series) else pd.Series(col) for col in columns]
+        self.columns = columns
+        n_rows = len(columns[0]) if columns else 0
+        combined = np.zeros(n_rows, dtype=np.int64)
+        valid = np.ones(n_rows, dtype=bool)
+        space = 1
+        col_codes = []
+        for col in columns:
+            codes, size = column_codes(col, sort)
+            valid &= codes >= 0
+            col_codes.append((codes, size))
+            space *= max(size, 1)
+        if space < 2 ** 62:
+            for codes, size in col_codes:
+                combined = combined * size + codes
+        else:
+            combined = np.unique(np.column_stack([c for c, _ in col_codes]), axis=0, return_inverse=True)[1].ravel()
+        combined = combined[valid]
+        if space <= max(4 * n_rows, 1 << 16):
+            # Gęsta przestrzeń kluczy: numeracja obecnych kluczy przez bincount, bez sortowania
+            present = np.bincount(combined, minlength=space) > 0
+            dense = np.cumsum(present) - 1
+            group = dense[combined]
+            n_groups = int(present.sum())
+        else:
+            # Rzadka przestrzeń (np. Kinetics i zależny od niego Time_min): haszowanie kodów, sortowane są tylko unikaty
+            group, uniques = pd.factorize(combined, sort=True)
+            n_groups = len(uniques)
+        rows = np.flatnonzero(valid)
+        first = np.empty(n_groups, dtype=np.int64)
+        first[group[::-1]] = rows[::-1]  # przy powtórzonych indeksach wygrywa ostatni zapis – czyli pierwszy wiersz
+        if not sort and n_groups:
+            # Kolejność pierwszego wystąpienia (jak groupby(sort=False))
+            order = np.argsort(first, kind="stable")
+            rank = np.empty(n_groups, dtype=np.int64)
+            rank[order] = np.arange(n_groups)
+            group = rank[group]
+            first = first[order]
+        self.codes = np.full(n_rows, -1, dtype=np.int64)
+        self.codes[rows] = group
+        self.n_groups = n_groups
+        self.first = first
+
+    @classmethod
+    def from_frame(cls, df, keys, sort=True):
+        return cls([df[k] for k in keys], sort=sort)
+
+    def keys_frame(self, names=None):
+        """Wartości kluczy każdej grupy (typy kolumn zachowane, np. category)."""
+        names = names or [col.name for col in self.columns]
+        return pd.DataFrame({name: col.iloc[self.first].reset_index(drop=True)
+                             for name, col in zip(names, self.columns)})
+
+    @staticmethod
+    def _segments(codes, vals):
+        """Wartości posortowane po (grupa, wartość) oraz początki segmentów grup."""
+        # Zamiast lexsort (dwa sortowania stabilne): ranga wartości i jeden sort unikalnego klucza (kod << bity) | ranga
+        n = len(vals)
+        shift = max(n, 1).bit_length()
+        order = np.argsort(vals)
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+        key = np.sort((codes << shift) | rank)
+        codes, vals = key >> shift, vals[order][key & ((1 << shift) - 1)]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.int64)
+        return codes, vals, starts
+
+    def reduce(self, values, stats=("mean", "std", "count")):
+        """Słownik {statystyka: tablica długości n_groups} dla wartości wiersza (NaN pomijane)."""
+        stats = list(stats)
+        unknown = set(stats) - set(STATS)
+        if unknown:
+            raise ValueError(f"Nieznane statystyki: {sorted(unknown)}")
+        if isinstance(values, np.ndarray) and values.dtype.kind == "f":
+            values = values.astype(float, copy=False)
+        else:
+            values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+        ok = (self.codes >= 0) & ~np.isnan(values)
+        codes, vals = self.codes[ok], values[ok]
+        n = self.n_groups
+        out = {}
+        if {"count", "mean", "std", "M2"} & set(stats):
+            out["count"] = np.bincount(codes, minlength=n)
+        if {"sum", "mean", "std", "M2"} & set(stats):
+            out["sum"] = np.bincount(codes, weights=vals, minlength=n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if {"mean", "std", "M2"} & set(stats):
+                count = out["count"]
+                out["mean"] = mean = np.where(count > 0, out["sum"] / np.maximum(count, 1), np.nan)
+            if {"std", "M2"} & set(stats):
+                # Dwa przebiegi (odchylenia od średniej grupy) – stabilne numerycznie, ddof=1 jak w pandas
+                m2 = np.bincount(codes, weights=(vals - mean[codes]) ** 2, minlength=n)
+                out["M2"] = np.where(count > 0, m2, np.nan)
+                out["std"] = np.where(count > 1, np.sqrt(m2 / np.maximum(count - 1, 1)), np.nan)
+        if {"min", "max", "median"} & set(stats):
+            seg_codes, seg_vals, starts = self._segments(codes, vals)
+            groups = seg_codes[starts]
+            for name in ("min", "max", "median"):
+                out[name] = np.full(n, np.nan)
+            if len(starts):
+                ends = np.r_[starts[1:], len(seg_vals)] - 1
+                out["min"][groups] = seg_vals[starts]
+                out["max"][groups] = seg_vals[ends]
+                lo = starts + (ends - starts) // 2
+                hi = starts + (ends - starts + 1) // 2
+                out["median"][groups] = (seg_vals[lo] + seg_vals[hi]) / 2
+        return {name: out[name] for name in stats}
+
+    def transform(self, values, stat="mean"):
+        """Statystyka grupy rozpisana z powrotem na wiersze (jak groupby(...).transform); NaN dla wierszy bez grupy."""
+        per_group = self.reduce(values, (stat,))[stat].astype(float)
+        return np.where(self.codes >= 0, per_group[np.maximum(self.codes, 0)], np.nan)
+
+def group_agg(df, keys, value_column, stats=("mean", "std", "count"), sort=True, names=None):
+    """
+    Odpowiednik df.groupby(keys, observed=True)[value_column].agg(stats).reset_index():
+    kolumny kluczy + kolumny statystyk (names – opcjonalne nazwy kolumn wynikowych).
+    """
+    index = GroupIndex.from_frame(df, keys, sort=sort)
+    result = index.keys_frame()
+    reduced = index.reduce(df[value_column], stats)
+    for stat in stats:
+        result[(names or {}).get(stat, stat)] = reduced[stat]
+    return result
+
+def verify_against_pandas(n_rows=200_000, seed=0):
+    """Porównanie z pandas groupby (count, sum, mean, std ddof=1, min, max, median) na danych z NaN i kluczami category."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Measurement": pd.Categorical(rng.choice(["Meas A", "Meas B"], n_rows)),
+        "Sample": pd.Categorical(rng.choice([f"S{i}" for i in range(40)] + ["BLANK"], n_rows)),
+        "Kinetics": rng.integers(1, 200, n_rows).astype(np.int16),
+        "Value": rng.normal(1000, 50, n_rows),
+    })
+    df.loc[rng.random(n_rows) < 0.02, "Value"] = np.nan
+    keys = ["Measurement", "Sample", "Kinetics"]
+    stats = ["count", "sum", "mean", "std", "min", "max", "median"]
+    expected = df.groupby(keys, observed=True)["Value"].agg(stats).reset_index()
+    for sort in (True, False):
+        ours = group_agg(df, keys, "Value", stats, sort=sort)
+        reference = expected if sort else df.groupby(keys, observed=True, sort=False)["Value"].agg(stats).reset_index()
+        for key in keys:
+            assert (ours[key].astype(str).to_numpy() == reference[key].astype(str).to_numpy()).all(), key
+        for stat in stats:
+            assert np.allclose(ours[stat].to_numpy(dtype=float), reference[stat].to_numpy(dtype=float),
+                               rtol=1e-9, atol=1e-9, equal_nan=True), stat
+    # Grupy jednoelementowe: std = NaN (ddof=1)
+    single = group_agg(pd.DataFrame({"k": ["a", "b", "b"], "v": [1.0, 2.0, 4.0]}), ["k"], "v", ("std",))
+    assert np.isnan(single["std"][0]) and np.isclose(single["std"][1], np.sqrt(2.0))
+    print(f"Zgodność z pandas groupby: OK ({len(expected)} grup, {n_rows} wierszy)")
+
+def benchmark_group_stats(n_rows=1_000_000, repeats=3, seed=0):
+    """Czas agregacji mean/std/count po (Measurement, Sample, Kinetics, Time_min): jądro vs pandas groupby."""
+    rng = np.random.default_rng(seed)
+    kinetics = rng.integers(1, 1001, n_rows).astype(np.int16)
+    df = pd.DataFrame({
+        "Measurement": pd.Categorical(rng.choice(["Meas A", "Meas B"], n_rows)),
+        "Sample": pd.Categorical(rng.choice([f"S{i}" for i in range(96)], n_rows)),
+        "Kinetics": kinetics,
+        "Time_min": (kinetics.astype(float) - 1) * 20,
+        "Value": rng.normal(1000, 50, n_rows),
+    })
+    keys = ["Measurement", "Sample", "Kinetics", "Time_min"]
+
+    def robust_z_kernel():
+        # Jeden indeks grup dla mediany, MAD i liczności (jak w data_qc.flag_wells)
+        index = GroupIndex.from_frame(df, keys[:3], sort=False)
+        deviation = df["Value"].to_numpy() - index.transform(df["Value"], "median")
+        return deviation, index.transform(np.abs(deviation), "median"), index.transform(df["Value"], "count")
+
+    def robust_z_pandas():
+        grouped = df["Value"].groupby([df[k] for k in keys[:3]], sort=False, observed=True)
+        deviation = df["Value"] - grouped.transform("median")
+        mad = deviation.abs().groupby([df[k] for k in keys[:3]], sort=False, observed=True).transform("median")
+        return deviation, mad, grouped.transform("count")
+
+    runs = (("mean/std/count – group_stats", lambda: group_agg(df, keys, "Value")),
+            ("mean/std/count – pandas groupby",
+             lambda: df.groupby(keys, observed=True)["Value"].agg(["mean", "std", "count"]).reset_index()),
+            ("mediana/MAD/count (QC) – group_stats", robust_z_kernel),
+            ("mediana/MAD/count (QC) – pandas groupby", robust_z_pandas))
+    for label, func in runs:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        print(f"{label}: {min(timings):.3f} s ({n_rows} wierszy)")
+
+if __name__ == "__main__":
+    verify_against_pandas()
+    if "--benchmark" in sys.argv:
+        benchmark_group_stats()
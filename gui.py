@@ -4,19 +4,28 @@
 Plik: gui.py
 
 Interfejs graficzny do przygotowania danych (przypisań dołków) oraz generowania plików long.
+Samo parsowanie eksportu (parse_enspire_file) wykonuje main.py jako etap potoku (pipeline_graph.py) –
+pomijany, gdy plik i przypisanie dołków nie zmieniły się od poprzedniego uruchomienia.
 Zakładki:
   1. "Próby i Przypisz" – wczytanie pliku (domyślnie interwał=0), przypisywanie dołków,
      informacja o konieczności przypisania BLANK (domyślnie pierwsza próba) z przyciskiem do zignorowania,
      skróty klawiszowe (Shift+A/E/Z/N) widoczne przy odpowiednich przyciskach oraz przycisk "Dalej =>".
   2. "Mapping i Stosunki" – przypisywanie opisów do wykrytych pomiarów (np. "Fluorescencja, OD, Luminescencja"),
-     dodawanie definicji stosunków (ratio) oraz przycisk "Potwierdź" umieszczony na dole tej zakładki.
+     dodawanie definicji stosunków (ratio), opcje analizy (normalizacja przestrzenna, metryki pochodne, wygładzanie, liczba losowań bootstrap,
+     wartości float32, wymuszenie przeliczenia etapów) oraz przycisk "Potwierdź"
+     umieszczony na dole tej zakładki.
      
 Wszystkie ustawienia są zapisywane do pliku config.txt (w folderze wynikowym), z którego może korzystać interactive_plot_selector.
 """
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
-import re, os, csv, io, hashlib, colorsys
+import os, csv, colorsys
+from plate_assignment import PlateAssignment
+from readers import detect_reader, scan_plate_file, integral_values
+from async_writer import write_csv
+from data_spatial import METHODS as SPATIAL_METHODS
+from data_smoothing import METHODS as SMOOTHING_METHODS, DEFAULTS as SMOOTHING_DEFAULTS
 
 def get_color_from_sample(name):
     """
@@ -31,171 +40,46 @@ def get_color_from_sample(name):
     return '#{:02x}{:02x}{:02x}'.format(int(r*255), int(g*255), int(b*255))
 
 def parse_platemap(file_path):
-    assignments = {}
+    """Mapa płytki {"A1": "próba", ...} z pliku (sekcja "Platemap:" eksportu EnSpire) – przez rejestr czytników."""
     try:
-        with open(file_path, "r", encoding="latin1") as f:
-            lines = f.readlines()
-        print("[DEBUG] Wczytano", len(lines), "linii z pliku platemap.")
-        start_idx = None
-        for i, line in enumerate(lines):
-            if "Platemap:" in line:
-                start_idx = i
-                break
-        if start_idx is None:
-            print("[DEBUG] Sekcja 'Platemap:' nie została znaleziona.")
-            return assignments
-        header_idx = None
-        for i in range(start_idx, len(lines)):
-            if re.match(r"^,(\s*\S+\s*,)+", lines[i]):
-                header_idx = i
-                break
-        if header_idx is None:
-            print("[DEBUG] Nie znaleziono linii nagłówkowej platemapu.")
-            return assignments
-        row_labels = ['A','B','C','D','E','F','G','H']
-        for i in range(header_idx+1, header_idx+1+len(row_labels)):
-            if i >= len(lines):
-                break
-            parts = lines[i].strip().split(',')
-            if not parts:
-                continue
-            row = parts[0].strip()
-            if row not in row_labels:
-                continue
-            for j, cell in enumerate(parts[1:], start=1):
-                sample = cell.strip()
-                if sample:
-                    well = f"{row}{j}"
-                    assignments[well] = sample
+        assignments = scan_plate_file(file_path)["platemap"]
         print("[DEBUG] Parsowanie platemapu zakończone. Znaleziono:", assignments)
         return assignments
     except Exception as e:
         print("Błąd parsowania platemapu:", e)
-        return assignments
+        return {}
 
 def parse_enspire_file(file_path, output_folder, sample_mapping=None):
+    # Format pliku rozpoznawany po pierwszych kilku KB (readers.py), odczyt przez wybrany czytnik
     try:
-        with open(file_path, "r", encoding="latin1") as f:
-            lines = f.readlines()
-        print("[DEBUG] Wczytano", len(lines), "linii z pliku EnSpire.")
+        reader = detect_reader(file_path)
+        df_long = reader.read(file_path)
+        print(f"[DEBUG] Wczytano {len(df_long)} odczytów (format {reader.name}).")
     except Exception as e:
         print("Błąd wczytania pliku EnSpire:", e)
         return None
-    data_measA = []
-    data_measB = []
-    current_kinetics = None
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        if line.startswith("Plate information"):
-            print("[DEBUG] Znaleziono 'Plate information' na linii", i)
-            i += 1
-            if i < len(lines):
-                _ = lines[i].strip()
-            i += 1
-            if i < len(lines):
-                plate_info_line = lines[i].strip()
-                plate_data = next(csv.reader(io.StringIO(plate_info_line), delimiter=',')) 
-                if len(plate_data) >= 12:
-                    current_kinetics = plate_data[11].strip()
-                    print("[DEBUG] Ustalono Kinetics =", current_kinetics)
-            i += 1
-            continue
-        if line.startswith("Results for Meas A"):
-            print("[DEBUG] Znaleziono 'Results for Meas A' na linii", i)
-            i += 1
-            if i >= len(lines):
-                break
-            header_line = lines[i].strip()
-            header = next(csv.reader(io.StringIO(header_line), delimiter=',')) 
-            header = [h.strip() for h in header if h.strip() != ""]
-            print("[DEBUG] Nagłówek Results for Meas A:", header)
-            i += 1
-            while i < len(lines) and lines[i].strip() != "":
-                row_line = lines[i].strip()
-                if ',' not in row_line:
-                    break
-                row = next(csv.reader(io.StringIO(row_line), delimiter=',')) 
-                row = [x.strip() for x in row if x.strip() != ""]
-                if row:
-                    row_letter = row[0]
-                    for j, col in enumerate(header):
-                        value = row[j+1] if j+1 < len(row) else ""
-                        if value == "":
-                            continue
-                        try:
-                            col_num = int(col)
-                        except:
-                            col_num = col
-                        well = f"{row_letter}{col_num}"
-                        data_measA.append({
-                            "Measurement": "Meas A",
-                            "Kinetics": current_kinetics,
-                            "Row": row_letter,
-                            "Column": col,
-                            "Well": well,
-                            "Value": value
-                        })
-                i += 1
-            continue
-        if line.startswith("Results for Meas B"):
-            print("[DEBUG] Znaleziono 'Results for Meas B' na linii", i)
-            i += 1
-            if i >= len(lines):
-                break
-            header_line = lines[i].strip()
-            header = next(csv.reader(io.StringIO(header_line), delimiter=',')) 
-            header = [h.strip() for h in header if h.strip() != ""]
-            print("[DEBUG] Nagłówek Results for Meas B:", header)
-            i += 1
-            while i < len(lines) and lines[i].strip() != "":
-                row_line = lines[i].strip()
-                if ',' not in row_line:
-                    break
-                row = next(csv.reader(io.StringIO(row_line), delimiter=',')) 
-                row = [x.strip() for x in row if x.strip() != ""]
-                if row:
-                    row_letter = row[0]
-                    for j, col in enumerate(header):
-                        value = row[j+1] if j+1 < len(row) else ""
-                        if value == "":
-                            continue
-                        try:
-                            col_num = int(col)
-                        except:
-                            col_num = col
-                        well = f"{row_letter}{col_num}"
-                        data_measB.append({
-                            "Measurement": "Meas B",
-                            "Kinetics": current_kinetics,
-                            "Row": row_letter,
-                            "Column": col,
-                            "Well": well,
-                            "Value": value
-                        })
-                i += 1
-            continue
-        i += 1
-
-    import pandas as pd
-    df_measA = pd.DataFrame(data_measA)
-    df_measB = pd.DataFrame(data_measB)
+    df_measA = df_long[df_long["Measurement"] == "Meas A"].reset_index(drop=True)
+    df_measB = df_long[df_long["Measurement"] == "Meas B"].reset_index(drop=True)
+    df_measA["Value"] = integral_values(df_measA["Value"])
+    df_measB["Value"] = integral_values(df_measB["Value"])
     print("[DEBUG] Liczba rekordów Meas A:", len(df_measA))
     print("[DEBUG] Liczba rekordów Meas B:", len(df_measB))
-    df_measA["Value"] = pd.to_numeric(df_measA["Value"], errors="coerce")
-    df_measB["Value"] = pd.to_numeric(df_measB["Value"], errors="coerce")
     if sample_mapping is None:
         sample_mapping = parse_platemap(file_path)
-    print("[DEBUG] Używana mapa próbek:", sample_mapping)
+    assignment = sample_mapping if isinstance(sample_mapping, PlateAssignment) \
+        else PlateAssignment.from_mapping(sample_mapping)
+    print("[DEBUG] Używana mapa próbek:", assignment.wells_by_sample())
     for df in [df_measA, df_measB]:
-        df["Sample"] = df["Well"].map(sample_mapping)
+        # Przypisanie prób = jedno take na tablicy kodów (indeks dołka -> kod próby)
+        df["Sample"] = assignment.apply(assignment.well_indices(df["Row"], df["Column"]))
         df.dropna(subset=["Sample"], inplace=True)
     base_name = os.path.splitext(os.path.basename(file_path))[0]
     os.makedirs(output_folder, exist_ok=True)
     fluor_path = os.path.join(output_folder, "long_measA.csv")
     od_path = os.path.join(output_folder, "long_measB.csv")
-    df_measA.to_csv(fluor_path, index=False)
-    df_measB.to_csv(od_path, index=False)
+    # Zapis atomowy, w potoku w tle (async_writer.py) – Meas B jest zlecany, gdy Meas A jeszcze się zapisuje
+    write_csv(df_measA, fluor_path, index=False)
+    write_csv(df_measB, od_path, index=False)
     print("[DEBUG] Pliki long zapisano w folderze:", output_folder)
     return fluor_path
 
@@ -274,7 +158,7 @@ class SingleWindowGUI:
 
         tk.Button(self.top_frame, text="Dalej =>", command=lambda: self.notebook.select(self.tab_mapping)).grid(row=2, column=2, padx=5)
 
-        self.well_assignments = {f"{r}{c}": None for r in ['A','B','C','D','E','F','G','H'] for c in range(1,13)}
+        self.well_assignments = PlateAssignment(n_rows=8, n_cols=12)
         self.prepopulated = {}
         self.sample_names = ["BLANK"]  # BLANK jako pierwsza próba
         self.options = ["BLANK"]
@@ -349,10 +233,48 @@ class SingleWindowGUI:
         self.ratio_frame.pack(fill=tk.X, padx=10, pady=5)
         self.btn_add_ratio = tk.Button(self.ratio_frame, text="Dodaj stosunek", command=self.add_ratio_row)
         self.btn_add_ratio.pack(side=tk.BOTTOM, pady=5)
+        self.create_options_frame()
         confirm_frame = tk.Frame(self.tab_mapping)
         confirm_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
         tk.Button(confirm_frame, text="Potwierdź", command=self.confirm).pack(side=tk.RIGHT, padx=5)
 
+    def create_options_frame(self):
+        # Opcje etapów potoku w main.py (trafiają do config i config.txt)
+        self.options_frame = tk.LabelFrame(self.tab_mapping, text="Opcje analizy")
+        self.options_frame.pack(fill=tk.X, padx=10, pady=5)
+        tk.Label(self.options_frame, text="Normalizacja przestrzenna:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+        self.spatial_var = tk.StringVar(value="brak")
+        ttk.Combobox(self.options_frame, textvariable=self.spatial_var, state="readonly",
+                     values=["brak"] + SPATIAL_METHODS).grid(row=0, column=1, sticky="w", padx=5, pady=2)
+        tk.Label(self.options_frame, text="(wymaga prób rozłożonych po płytce, nie całymi wierszami)").grid(
+            row=0, column=2, sticky="w", padx=5, pady=2)
+        self.force_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.options_frame, text="Przelicz wszystkie etapy (ignoruj pipeline_manifest.json)",
+                       variable=self.force_var).grid(row=1, column=0, columnspan=3, sticky="w", padx=5, pady=2)
+        tk.Label(self.options_frame, text="Metryki (nazwa = wyrażenie, np. F/OD = corrected(MeasA) / corrected(MeasB);\n"
+                                          "po jednej w wierszu, puste – ilorazy z definicji stosunków):",
+                 justify=tk.LEFT).grid(row=2, column=0, columnspan=3, sticky="w", padx=5, pady=2)
+        self.metrics_text = tk.Text(self.options_frame, height=3, width=80)
+        self.metrics_text.grid(row=3, column=0, columnspan=3, sticky="w", padx=5, pady=2)
+        tk.Label(self.options_frame, text="Wygładzanie krzywych:").grid(row=4, column=0, sticky="w", padx=5, pady=2)
+        smoothing_frame = tk.Frame(self.options_frame)
+        smoothing_frame.grid(row=4, column=1, columnspan=2, sticky="w", padx=5, pady=2)
+        self.smoothing_vars = {key: tk.StringVar(value=str(val)) for key, val in SMOOTHING_DEFAULTS.items()}
+        ttk.Combobox(smoothing_frame, textvariable=self.smoothing_vars["method"], state="readonly",
+                     values=SMOOTHING_METHODS, width=8).pack(side=tk.LEFT, padx=2)
+        for key, label in [("window", "okno:"), ("polyorder", "stopień (savgol):"), ("alpha", "alfa (ema):")]:
+            tk.Label(smoothing_frame, text=label).pack(side=tk.LEFT, padx=2)
+            tk.Entry(smoothing_frame, textvariable=self.smoothing_vars[key], width=6, bg="white").pack(side=tk.LEFT, padx=2)
+        tk.Label(self.options_frame, text="Losowania bootstrap:").grid(row=5, column=0, sticky="w", padx=5, pady=2)
+        self.bootstrap_var = tk.StringVar(value="2000")
+        tk.Entry(self.options_frame, textvariable=self.bootstrap_var, width=8, bg="white").grid(
+            row=5, column=1, sticky="w", padx=5, pady=2)
+        tk.Label(self.options_frame, text="(0 wyłącza przedziały ufności bootstrap)").grid(
+            row=5, column=2, sticky="w", padx=5, pady=2)
+        self.float32_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.options_frame, text="Wartości jako float32 (o połowę mniej pamięci, ~7 cyfr znaczących)",
+                       variable=self.float32_var).grid(row=6, column=0, columnspan=3, sticky="w", padx=5, pady=2)
+
     def add_ratio_row(self):
         frame = tk.Frame(self.ratio_frame)
         frame.pack(fill=tk.X, padx=5, pady=2)
@@ -415,10 +337,15 @@ class SingleWindowGUI:
             tk.Button(self.top_frame, text="Zignoruj dodanie BLANK", command=self.ignore_blank).grid(row=3, column=2, padx=5)
 
 
-        self.prepopulated = parse_platemap(file_path)
+        # Jeden odczyt pliku dla mapy płytki i listy pomiarów (readers.py)
+        try:
+            scanned = scan_plate_file(file_path)
+        except Exception as e:
+            messagebox.showerror("Błąd", str(e))
+            return
+        self.prepopulated = scanned["platemap"]
         print("[DEBUG] Prepopulated mapa:", self.prepopulated)
-        for well in self.well_assignments.keys():
-            self.well_assignments[well] = self.prepopulated.get(well, None)
+        self.well_assignments = PlateAssignment.from_mapping(self.prepopulated)
         self.sample_names = sorted(list({v for v in self.prepopulated.values() if v}))
         if "BLANK" not in self.sample_names:
             self.sample_names.insert(0, "BLANK")
@@ -430,11 +357,7 @@ class SingleWindowGUI:
         self.refresh_sample_list()
         self.draw_cells()
 
-        with open(file_path, "r", encoding="latin1") as f:
-            content = f.read()
-        import re
-        measurements = re.findall(r"Results for (Meas [A-Z])", content)
-        measurements = sorted(set(measurements))
+        measurements = scanned["measurements"]
         if measurements:
             for widget in self.mapping_frame.winfo_children():
                 widget.destroy()
@@ -489,6 +412,14 @@ class SingleWindowGUI:
                 self.well_buttons[well] = btn
         self.highlight_wells()
 
+    def assign_row(self, row_letter):
+        self.well_assignments.set_row(row_letter, self.current_assignment.get())
+        self.draw_cells()
+
+    def assign_column(self, column):
+        self.well_assignments.set_column(column, self.current_assignment.get())
+        self.draw_cells()
+
     def on_button_press(self, event, well):
         self.dragging = True
         current_sample = self.well_assignments.get(well)
@@ -579,11 +510,7 @@ class SingleWindowGUI:
         new_name = dialog.new_name
         if new_name and new_name != old_name:
             self.sample_names[idx] = new_name
-            for well, assign in self.well_assignments.items():
-                if assign == old_name:
-                    self.well_assignments[well] = new_name
-                    if well in self.well_buttons:
-                        self.well_buttons[well].configure(bg=get_color_from_sample(new_name))
+            self.well_assignments.rename(old_name, new_name)
             self.refresh_sample_list()
             self.draw_cells()
 
@@ -597,11 +524,7 @@ class SingleWindowGUI:
             for sample in samples_to_remove:
                 if sample in self.sample_names:
                     self.sample_names.remove(sample)
-                for well, assign in self.well_assignments.items():
-                    if assign == sample:
-                        self.well_assignments[well] = None
-                        if well in self.well_buttons:
-                            self.well_buttons[well].configure(bg="white")
+                self.well_assignments.remove(sample)
             self.refresh_sample_list()
             self.draw_cells()
 
@@ -637,14 +560,10 @@ class SingleWindowGUI:
             messagebox.showerror("Błąd", "Interwał pomiarów musi być dodatnią liczbą!")
             return
 
-        sample_assignments = {sample: [] for sample in self.sample_names}
-        blank_wells = []
-        for well, assignment in self.well_assignments.items():
-            if assignment:
-                if assignment == "BLANK":
-                    blank_wells.append(well)
-                else:
-                    sample_assignments[assignment].append(well)
+        wells_by_sample = self.well_assignments.wells_by_sample()
+        blank_wells = wells_by_sample.pop("BLANK", [])
+        sample_assignments = {sample: [] for sample in self.sample_names if sample != "BLANK"}
+        sample_assignments.update(wells_by_sample)
         self.config['file_path'] = self.file_path_var.get().strip()
         self.config['measurement_interval'] = interval
         self.config['sample_assignments'] = sample_assignments
@@ -665,6 +584,39 @@ class SingleWindowGUI:
                 "denominator": row["denominator"].get()
             })
         self.config['ratio_mapping'] = ratio_mappings
+        spatial_method = self.spatial_var.get()
+        self.config['spatial_method'] = spatial_method if spatial_method in SPATIAL_METHODS else None
+        self.config['force_recompute'] = self.force_var.get()
+        metrics = {}
+        for line in self.metrics_text.get("1.0", tk.END).splitlines():
+            if not line.strip():
+                continue
+            name, sep, expression = line.partition("=")
+            if not sep or not name.strip() or not expression.strip():
+                messagebox.showerror("Błąd", f"Niepoprawna definicja metryki (oczekiwano: nazwa = wyrażenie):\n{line}")
+                return
+            metrics[name.strip()] = expression.strip()
+        self.config['metrics'] = metrics
+        try:
+            smoothing = {"method": self.smoothing_vars["method"].get(),
+                         "window": int(self.smoothing_vars["window"].get()),
+                         "polyorder": int(self.smoothing_vars["polyorder"].get()),
+                         "alpha": float(self.smoothing_vars["alpha"].get())}
+            if smoothing["window"] < 1 or smoothing["polyorder"] < 0 or not 0 < smoothing["alpha"] <= 1:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Błąd", "Wygładzanie: okno i stopień muszą być liczbami całkowitymi (okno >= 1), alfa w przedziale (0, 1]!")
+            return
+        self.config['smoothing'] = smoothing
+        try:
+            bootstrap_resamples = int(self.bootstrap_var.get())
+            if bootstrap_resamples < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Błąd", "Liczba losowań bootstrap musi być nieujemną liczbą całkowitą!")
+            return
+        self.config['bootstrap_resamples'] = bootstrap_resamples
+        self.config['float32_values'] = self.float32_var.get()
 
         input_file = self.config['file_path']
         if not input_file:
@@ -681,7 +633,8 @@ class SingleWindowGUI:
             for well in sorted(self.well_assignments.keys()):
                 writer.writerow([well, self.well_assignments[well] if self.well_assignments[well] else ""])
 
-        parse_enspire_file(self.config['file_path'], output_folder, sample_mapping=self.well_assignments)
+        # Pliki long tworzy etap "parse" w main.py (pomijany przy niezmienionym pliku i przypisaniu)
+        self.config['well_assignments'] = self.well_assignments
         long_measA_path = os.path.join(output_folder, "long_measA.csv")
         self.config['long_file'] = long_measA_path
 
@@ -696,10 +649,19 @@ class SingleWindowGUI:
                 for i, rm in enumerate(self.config['ratio_mapping']):
                     f.write(f"ratio_{i+1}_numerator = {rm.get('numerator')}\n")
                     f.write(f"ratio_{i+1}_denominator = {rm.get('denominator')}\n")
+                f.write(f"spatial_method = {self.config['spatial_method'] or ''}\n")
+                f.write(f"force_recompute = {self.config['force_recompute']}\n")
+                for key, val in self.config['smoothing'].items():
+                    f.write(f"smoothing_{key} = {val}\n")
+                f.write(f"bootstrap_resamples = {self.config['bootstrap_resamples']}\n")
+                f.write(f"float32_values = {self.config['float32_values']}\n")
+                for i, (name, expression) in enumerate(self.config['metrics'].items()):
+                    f.write(f"metric_{i+1}_name = {name}\n")
+                    f.write(f"metric_{i+1}_expression = {expression}\n")
         except Exception as e:
             messagebox.showerror("Błąd", f"Nie udało się zapisać config.txt: {e}")
 
-        messagebox.showinfo("Informacja", f"Wyniki zapisane w folderze:\n{output_folder}")
+        messagebox.showinfo("Informacja", f"Wyniki zostaną zapisane w folderze:\n{output_folder}")
         self.master.destroy()
 
 def launch_gui():
@@ -714,3 +676,6 @@ if __name__ == '__main__':
     config = launch_gui()
     print("Plik:", config.get('file_path'))
     print("Interwał pomiarów:", config.get('measurement_interval'))
+    if config.get('long_file'):
+        parse_enspire_file(config['file_path'], os.path.dirname(config['long_file']),
+                           sample_mapping=config.get('well_assignments'))
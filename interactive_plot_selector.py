@@ -7,23 +7,46 @@
 Plik: interactive_plot_selector.py
 
 Interaktywny interfejs umożliwiający wyświetlenie wykresów:
-  - Raw Measurements, Blank Corrected oraz F/OD Ratio
+  - Raw Measurements, Blank Corrected, F/OD Ratio oraz Metrics (metryki pochodne z metrics.py)
   (dane po obróbce, wynikającej z wcześniejszych analiz).
   
 Funkcjonalności:
   - Globalne przypisanie kolorów do prób – dodawanie/odejmowanie danych nie zmienia przypisanych kolorów.
   - Nazwy pomiarów wyświetlane są zgodnie z mappingiem nadanym przez użytkownika (przez gui.py).
   - Suwak "Maksimum X" ustawia zakres osi X (maksymalna wartość ustawiona na podstawie maks. Time_min z danych).
+  - Długie serie są decymowane (LTTB lub min/max, plot_decimation.py) do rozdzielczości osi w pikselach.
+  - Opcja "Wspólna siatka czasu" interpoluje analizy o różnych interwałach na wspólne punkty czasu.
+  - Opcja "Średnia z puli analiz" łączy replikaty tej samej próby ze wszystkich dodanych analiz
+    (średnia ± std z połączonych dołków, wzór Chana na statystykach n/średnia/std – data_pooling.py).
+  - "Dodaj dane z kolejnej analizy" przyjmuje wiele folderów naraz (folder nadrzędny -> lista analiz);
+    analizy są wczytywane równolegle w puli wątków, a lista prób i wykres odświeżają się po każdej
+    wczytanej analizie. Sufiks prób to nazwa folderu (przy powtórzeniu z kolejnym numerem).
+  - Cofnij / Ponów dodanie danych – dziennik operacji: wpis zawiera tylko nazwy dodanych analiz i zakres
+    wierszy. Dane są zawsze dopisywane na końcu, więc cofnięcie to wycinek iloc[:start] (widok bez kopii,
+    copy-on-write), a ponowienie przywraca zachowaną ramkę – bez kopii całych danych dla każdego kroku.
+  - Lista prób (sample_browser.py) wyświetla tylko widoczne wiersze, ma wyszukiwanie w trakcie pisania
+    i grupowanie po próbie bazowej lub analizie; seria zmian zaznaczenia daje jedno przerysowanie wykresu.
+  - "Mapa płytki" otwiera mapę cieplną płytki bieżącej analizy z suwakiem po cyklach (plate_heatmap.py).
   - Pozwala wyświetlać trendline (tylko liniowy i wielomianowy 2nd stopnia) oraz edytować opcje wykresu.
 """
 
 import os
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox, filedialog, colorchooser, simpledialog
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from plot_decimation import DecimationPyramid
+from plot_data_store import (MODE_OPTIONS, MODE_COLUMNS, get_measurement_interval, get_ratio_mapping, load_mode_data,
+                             fit_trendline, metric_names, CURVE_OPTIONS, SMOOTHABLE_MODES)
+from figure_export import export_figures
+from plate_heatmap import open_plate_heatmap
+from sample_browser import SampleBrowser
+from experiment_db import ExperimentDB, default_db_path, find_result_folders
+from data_resample import ResampleCache, resample_runs
+from data_pooling import pool_plot_data
 
 class DraggableText:
     def __init__(self, text):
@@ -60,6 +83,31 @@ class DraggableText:
         self.text.figure.canvas.mpl_disconnect(self.cidrelease)
         self.text.figure.canvas.mpl_disconnect(self.cidmotion)
 
+def folder_suffix(folder, used):
+    """Sufiks prób z nazwy folderu ("_nazwa"); gdy już użyty – "_nazwa_2", "_nazwa_3", ..."""
+    base = f"_{os.path.basename(os.path.normpath(folder))}"
+    suffix, number = base, 2
+    while suffix in used:
+        suffix, number = f"{base}_{number}", number + 1
+    return suffix
+
+def load_run_data(db, folder, mode, measurement, suffix, curve=None):
+    """
+    Wczytanie jednej analizy w wątku roboczym: zapis do bazy eksperymentów i przygotowanie danych trybu
+    z sufiksem prób. Funkcja nie odwołuje się do Tk – wynik przejmuje wątek GUI (poll_loads).
+    """
+    run_id = db.ingest_run(folder)
+    df_new = db.query_mode(mode, measurement, curve=curve, runs=[run_id])
+    if df_new is None or df_new.empty:
+        return None
+    if mode == "F/OD Ratio":
+        df_new = df_new[["Run", "Sample", "Time_min", "Ratio"]].copy()
+    else:
+        df_new = df_new.drop(columns=["run_id"])
+    df_new['Base_sample'] = df_new['Sample'].astype(str)
+    df_new['Sample'] = df_new['Base_sample'] + suffix
+    return df_new
+
 class InteractivePlotSelector(tk.Toplevel):
     def __init__(self, master, base_dir, config=None):
         super().__init__(master)
@@ -67,16 +115,43 @@ class InteractivePlotSelector(tk.Toplevel):
         self.base_dir = base_dir
         self.config = config if config is not None else {}
         self.data = None
-        self.data_history = []  
+        # Dziennik dodawania analiz: wpisy {"runs", "start", "stop"} (cofanie) i (wpis, pełne dane) (ponawianie)
+        self.op_log = []
+        self.redo_log = []
         self.samples = []
         self.trendlines = {}  
         self.draggable_texts = []
         self.equation_font_size = 10
         # Globalna mapa kolorów – nie jest resetowana przy dodawaniu danych
         self.custom_colors = self.config.get("custom_colors", {}) 
+        # Decymacja długich serii: "lttb" lub "minmax"; cache serii i piramid per (tryb, próba)
+        self.decimation_method = self.config.get("decimation_method", "lttb")
+        self.series_cache = {}
+        self.series_source = None
+        # Wspólna siatka czasu dla analiz o różnych interwałach (data_resample.py)
+        self.resample_var = tk.BooleanVar(value=False)
+        self.resample_method = self.config.get("resample_method", "linear")
+        self.resample_cache = ResampleCache()
+        self.resampled_view = None
+        # Średnia z puli analiz (data_pooling.py); widok liczony raz na (dane, tryb)
+        self.pool_var = tk.BooleanVar(value=False)
+        self.pooled_view = None
+        self.pooled_key = None
+        self.pooled_source = None
+        # Przedziały ufności bootstrap (data_bootstrap.py) zamiast ± std: "bca" lub "percentile"
+        self.ci_var = tk.BooleanVar(value=False)
+        self.ci_method = self.config.get("ci_method", "bca")
+        self.experiment_db = None
+        # Równoległe wczytywanie analiz (add_data); wyniki przejmowane w wątku Tk przez after()
+        self.load_workers = self.config.get("load_workers", min(8, (os.cpu_count() or 1) + 4))
+        self.load_executor = None
+        self.pending_loads = []
+        self.load_generation = 0
+        self.load_errors = []
+        self.load_status_var = tk.StringVar(value="")
 
         self.mode_var = tk.StringVar(value="F/OD Ratio")
-        self.mode_options = ["F/OD Ratio", "Blank Corrected", "Raw Measurements"]
+        self.mode_options = list(MODE_OPTIONS)
 
         self.measurement_var = tk.StringVar(value="Meas A")
         self.measurement_options = ["Meas A", "Meas B"]
@@ -85,19 +160,38 @@ class InteractivePlotSelector(tk.Toplevel):
         self.trend_type_options = ["Liniowy", "Wielomianowy (2nd stopnia)"]
 
         self.show_data_var = tk.BooleanVar(value=True)
+        # Dane / krzywe wygładzone / szybkości z smoothing/smoothed_summary.csv (data_smoothing.py)
+        self.curve_var = tk.StringVar(value="Dane")
 
         self.create_widgets()
         self.load_data()
         self.plot_data()
 
     def get_selected_samples(self):
-        indices = self.sample_listbox.curselection()
-        return [self.sample_listbox.get(i) for i in indices]
+        return self.sample_browser.get_selected()
 
     def reselect_samples(self, selected_samples):
-        for idx, sample in enumerate(self.samples):
-            if sample in selected_samples:
-                self.sample_listbox.selection_set(idx)
+        self.sample_browser.set_selected(selected_samples)
+
+    def plotted_samples(self):
+        """Zaznaczone próby, a gdy nic nie zaznaczono – wszystkie widoczne (po filtrze listy)."""
+        return self.get_selected_samples() or self.sample_browser.visible_items()
+
+    def sample_groups(self):
+        """{próba: (próba bazowa, analiza)} do grupowania listy prób po prefiksie lub sufiksie."""
+        if self.data is None or not {"Base_sample", "Run"}.issubset(self.data.columns) or self.pool_var.get():
+            return None
+        names = self.data[["Sample", "Base_sample", "Run"]].drop_duplicates("Sample")
+        groups = {}
+        for sample, base, run in zip(names["Sample"].astype(str), names["Base_sample"], names["Run"].astype(str)):
+            suffix = sample[len(base):] if sample.startswith(base) and len(sample) > len(base) else f"({run})"
+            groups[sample] = (base, suffix)
+        return groups
+
+    def refresh_sample_list(self):
+        """Odświeża listę prób (zaznaczenie zachowywane po nazwach)."""
+        self.samples = self.current_samples() if self.data is not None and "Sample" in self.data.columns else []
+        self.sample_browser.set_items(self.samples, self.sample_groups())
 
     def create_widgets(self):
         top_frame = tk.Frame(self)
@@ -119,6 +213,17 @@ class InteractivePlotSelector(tk.Toplevel):
         self.trend_type_combo.pack(side=tk.LEFT, padx=5)
         self.show_data_check = tk.Checkbutton(top_frame, text="Pokaż dane", variable=self.show_data_var, command=self.plot_data)
         self.show_data_check.pack(side=tk.LEFT, padx=5)
+        self.resample_check = tk.Checkbutton(top_frame, text="Wspólna siatka czasu", variable=self.resample_var, command=self.plot_data)
+        self.resample_check.pack(side=tk.LEFT, padx=5)
+        self.pool_check = tk.Checkbutton(top_frame, text="Średnia z puli analiz", variable=self.pool_var, command=self.on_pool_toggle)
+        self.pool_check.pack(side=tk.LEFT, padx=5)
+        self.ci_check = tk.Checkbutton(top_frame, text="Przedziały ufności (bootstrap)", variable=self.ci_var, command=self.plot_data)
+        self.ci_check.pack(side=tk.LEFT, padx=5)
+        tk.Label(top_frame, text="Krzywa:").pack(side=tk.LEFT, padx=5)
+        self.curve_combo = ttk.Combobox(top_frame, textvariable=self.curve_var, values=list(CURVE_OPTIONS),
+                                        state="readonly", width=14)
+        self.curve_combo.pack(side=tk.LEFT, padx=5)
+        self.curve_combo.bind("<<ComboboxSelected>>", lambda e: self.on_mode_change())
         self.btn_select_all = tk.Button(top_frame, text="Zaznacz wszystkie", command=self.select_all_samples)
         self.btn_select_all.pack(side=tk.LEFT, padx=5)
         self.btn_deselect_all = tk.Button(top_frame, text="Odznacz wszystkie", command=self.deselect_all_samples)
@@ -127,18 +232,21 @@ class InteractivePlotSelector(tk.Toplevel):
         self.btn_add_data.pack(side=tk.LEFT, padx=5)
         self.btn_undo = tk.Button(top_frame, text="Cofnij dodanie danych", command=self.undo_add_data)
         self.btn_undo.pack(side=tk.LEFT, padx=5)
+        self.btn_redo = tk.Button(top_frame, text="Ponów dodanie danych", command=self.redo_add_data)
+        self.btn_redo.pack(side=tk.LEFT, padx=5)
         self.btn_reverse_names = tk.Button(top_frame, text="Odwróć nazwy", command=self.reverse_names)
         self.btn_reverse_names.pack(side=tk.LEFT, padx=5)
 
         left_frame = tk.Frame(self)
         left_frame.pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=5)
         tk.Label(left_frame, text="Wybierz próbki (podwójny klik zmienia kolor):").pack()
-        self.sample_listbox = tk.Listbox(left_frame, selectmode=tk.MULTIPLE, height=15, exportselection=False)
-        self.sample_listbox.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
-        self.sample_listbox.bind("<<ListboxSelect>>", lambda event: self.plot_data())
-        self.sample_listbox.bind("<Double-Button-1>", self.change_color_for_sample)
+        self.sample_browser = SampleBrowser(left_frame, on_change=self.plot_data,
+                                            on_activate=self.change_color_for_sample, height=15,
+                                            debounce_ms=self.config.get("selection_debounce_ms", 150))
+        self.sample_browser.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
         self.btn_rename_sample = tk.Button(left_frame, text="Zmień nazwę próby", command=self.rename_sample)
         self.btn_rename_sample.pack(pady=5)
+        tk.Label(left_frame, textvariable=self.load_status_var).pack()
 
         self.trend_control_frame = tk.Frame(self)
         self.trend_control_frame.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
@@ -166,6 +274,10 @@ class InteractivePlotSelector(tk.Toplevel):
         self.btn_update_plot.grid(row=0, column=6, padx=5)
         self.btn_save_plot = tk.Button(self.plot_options_frame, text="Zapisz wykres", command=self.save_plot)
         self.btn_save_plot.grid(row=0, column=7, padx=5)
+        self.btn_export_all = tk.Button(self.plot_options_frame, text="Eksportuj wszystkie wykresy", command=self.export_all_plots)
+        self.btn_export_all.grid(row=0, column=8, padx=5)
+        self.btn_plate_map = tk.Button(self.plot_options_frame, text="Mapa płytki", command=self.open_plate_map)
+        self.btn_plate_map.grid(row=0, column=9, padx=5)
         tk.Label(self.plot_options_frame, text="Maksimum X:").grid(row=1, column=0, sticky="e")
         self.x_max_scale = tk.Scale(self.plot_options_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.update_x_range)
         self.x_max_scale.grid(row=1, column=1, padx=5)
@@ -184,29 +296,28 @@ class InteractivePlotSelector(tk.Toplevel):
             messagebox.showerror("Błąd", f"Błędna wartość zakresu: {e}")
 
     def select_all_samples(self):
-        self.sample_listbox.select_set(0, tk.END)
-        self.plot_data()
+        self.sample_browser.select_all()
 
     def deselect_all_samples(self):
-        self.sample_listbox.selection_clear(0, tk.END)
-        self.plot_data()
+        self.sample_browser.clear_selection()
 
     def rename_sample(self):
-        selection = self.sample_listbox.curselection()
+        selection = self.get_selected_samples()
         if not selection:
             messagebox.showinfo("Info", "Wybierz próbkę do zmiany nazwy.")
             return
-        index = selection[0]
-        old_name = self.sample_listbox.get(index)
+        old_name = selection[0]
         new_name = simpledialog.askstring("Zmień nazwę próby", f"Podaj nową nazwę dla próby '{old_name}':")
         if new_name and new_name.strip():
             self.data.loc[self.data["Sample"] == old_name, "Sample"] = new_name.strip()
+            self.redo_log.clear()  # zachowane ramki do ponowienia mają stare nazwy
+            if self.pool_var.get() and "Base_sample" in self.data.columns:
+                self.data.loc[self.data["Base_sample"] == old_name, "Base_sample"] = new_name.strip()
+            self.invalidate_views()
             if old_name in self.custom_colors:
                 self.custom_colors[new_name.strip()] = self.custom_colors.pop(old_name)
-            self.samples = sorted(self.data["Sample"].unique())
-            self.sample_listbox.delete(0, tk.END)
-            for sample in self.samples:
-                self.sample_listbox.insert(tk.END, sample)
+            self.sample_browser.rename(old_name, new_name.strip())
+            self.refresh_sample_list()
             self.plot_data()
 
     def reverse_names(self):
@@ -225,261 +336,245 @@ class InteractivePlotSelector(tk.Toplevel):
                     return str(sub.iloc[0]["Well"])
                 return name
             self.data["Sample"] = self.data["Sample"].apply(reverse_name)
-            self.samples = sorted(self.data["Sample"].unique())
-            self.sample_listbox.delete(0, tk.END)
-            for sample in self.samples:
-                self.sample_listbox.insert(tk.END, sample)
-            new_selected = [reverse_name(s) for s in old_selected]
-            for sample in new_selected:
-                try:
-                    idx = self.samples.index(sample)
-                    self.sample_listbox.selection_set(idx)
-                except ValueError:
-                    pass
+            self.redo_log.clear()
+            self.invalidate_views()
+            self.refresh_sample_list()
+            self.reselect_samples([reverse_name(s) for s in old_selected])
             self.plot_data()
         except Exception as e:
             messagebox.showerror("Błąd", f"Nie udało się odwrócić nazw: {e}")
 
     def add_data(self):
-        folder = filedialog.askdirectory(title="Wybierz folder z analizą")
-        if not folder:
-            return
-        mode = self.mode_var.get()
         try:
-            if mode == "F/OD Ratio":
-                file_path = os.path.join(folder, "blank_corrected_analysis", "blank_corrected_summary.csv")
-                if not os.path.isfile(file_path):
-                    raise FileNotFoundError(f"Brak pliku: {file_path}")
-                df_bc = pd.read_csv(file_path, encoding="latin1")
-                df_A = df_bc[df_bc["Measurement"]=="Meas A"].copy()
-                df_B = df_bc[df_bc["Measurement"]=="Meas B"].copy()
-                if df_A.empty or df_B.empty:
-                    raise ValueError("Brak danych dla obu pomiarów w analizie.")
-                df_A = df_A.rename(columns={"Corrected": "Corrected_A"})
-                df_B = df_B.rename(columns={"Corrected": "Corrected_B"})
-                df_merged = pd.merge(df_A, df_B, on=["Sample", "Kinetics", "Time_min"], suffixes=("_A", "_B"))
-                df_merged["Ratio"] = df_merged["Corrected_A"] / df_merged["Corrected_B"]
-                df_new = df_merged[["Sample", "Time_min", "Ratio"]].copy()
-            elif mode == "Blank Corrected":
-                file_path = os.path.join(folder, "blank_corrected_analysis", "blank_corrected_summary.csv")
-                if not os.path.isfile(file_path):
-                    raise FileNotFoundError(f"Brak pliku: {file_path}")
-                df_new = pd.read_csv(file_path, encoding="latin1")
-                required = {"Sample", "Time_min", "Corrected", "Measurement"}
-                if not required.issubset(df_new.columns):
-                    raise ValueError("Plik blank_corrected_summary.csv nie zawiera wymaganych kolumn.")
-                meas_choice = self.measurement_var.get()
-                df_new = df_new[df_new["Measurement"] == meas_choice]
-            elif mode == "Raw Measurements":
-                file_path = os.path.join(self.base_dir, "long_merged.csv")
-                if not os.path.isfile(file_path):
-                    file_path = os.path.join(self.base_dir, "long_measA.csv")
-                if not os.path.isfile(file_path):
-                    raise FileNotFoundError(f"Brak pliku raw: {file_path}")
-                df_new = pd.read_csv(file_path, encoding="latin1")
-                if "Time_min" not in df_new.columns:
-                    interval = self.get_measurement_interval()
-                    df_new['Kinetics'] = pd.to_numeric(df_new['Kinetics'], errors="coerce")
-                    df_new['Time_min'] = (df_new['Kinetics'] - 1) * interval
-                required = {"Sample", "Time_min", "Value", "Measurement"}
-                if not required.issubset(df_new.columns):
-                    raise ValueError("Plik raw nie zawiera wymaganych kolumn.")
-                meas_choice = self.measurement_var.get()
-                df_new = df_new[df_new["Measurement"] == meas_choice]
-                grouped = df_new.groupby(['Sample','Time_min'])['Value'].agg(['mean','std']).reset_index()
-                grouped.rename(columns={"mean": "Value_mean", "std": "Value_std"}, inplace=True)
-                df_new = grouped
-            else:
-                return
-
-            if self.data is not None:
-                self.data_history.append(self.data.copy())
-            else:
-                self.data_history.append(pd.DataFrame())
-
-            default_suffix = f"_{os.path.basename(folder)}"
-            custom = simpledialog.askstring("Sufiks", f"Podaj sufiks dla wszystkich prób z folderu {os.path.basename(folder)} (pozostaw puste, by użyć domyślnego '{default_suffix}'):")            
-            suffix = f"_{custom.strip()}" if custom and custom.strip() != "" else default_suffix
-            df_new['Sample'] = df_new['Sample'].astype(str) + suffix
-
-            if self.data is None:
-                self.data = df_new
-            else:
-                self.data = pd.concat([self.data, df_new], ignore_index=True)
-            if "Sample" in self.data.columns:
-                self.samples = sorted(self.data["Sample"].unique())
-                self.sample_listbox.delete(0, tk.END)
-                for sample in self.samples:
-                    self.sample_listbox.insert(tk.END, sample)
-            self.plot_data()
+            folders = self.ask_result_folders()
         except Exception as e:
             messagebox.showerror("Błąd", str(e))
+            return
+        if folders:
+            self.start_loading(folders)
+
+    def ask_result_folders(self):
+        """
+        Wybór analiz do dodania: wskazany folder z wynikami albo folder nadrzędny –
+        wtedy wyświetlana jest lista znalezionych analiz (domyślnie zaznaczone wszystkie).
+        """
+        parent = filedialog.askdirectory(title="Wybierz folder z analizą lub folder z wieloma analizami")
+        if not parent:
+            return []
+        found = find_result_folders(parent)
+        if not found:
+            messagebox.showinfo("Info", f"Nie znaleziono wyników analiz w folderze {parent}.")
+            return []
+        if len(found) == 1:
+            return found
+        dialog = tk.Toplevel(self)
+        dialog.title("Wybierz analizy do dodania")
+        dialog.transient(self)
+        listbox = tk.Listbox(dialog, selectmode=tk.EXTENDED, width=60, height=min(len(found), 20), exportselection=False)
+        for folder in found:
+            listbox.insert(tk.END, os.path.basename(folder))
+        listbox.selection_set(0, tk.END)
+        listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        chosen = []
+        def confirm():
+            chosen.extend(found[i] for i in listbox.curselection())
+            dialog.destroy()
+        tk.Button(dialog, text="Dodaj wybrane", command=confirm).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Button(dialog, text="Anuluj", command=dialog.destroy).pack(side=tk.RIGHT, padx=5, pady=5)
+        dialog.grab_set()
+        self.wait_window(dialog)
+        return chosen
+
+    def used_suffixes(self):
+        """Sufiksy prób już obecnych w danych oraz w trwających wczytaniach."""
+        used = {suffix for _, _, suffix, _ in self.pending_loads}
+        if self.data is not None and "Base_sample" in self.data.columns:
+            pairs = self.data[["Sample", "Base_sample"]].astype(str).drop_duplicates()
+            used.update(s[len(b):] for s, b in pairs.itertuples(index=False) if s != b and s.startswith(b))
+        return used
+
+    def start_loading(self, folders):
+        """Zleca wczytanie folderów puli wątków; całe dodanie to jeden krok cofania."""
+        if self.load_executor is None:
+            self.load_executor = ThreadPoolExecutor(max_workers=self.load_workers, thread_name_prefix="add_data")
+        if not self.pending_loads:
+            # Foldery dodane w trakcie wczytywania dołączają do bieżącego kroku cofania
+            rows = 0 if self.data is None else len(self.data)
+            self.op_log.append({"runs": [], "start": rows, "stop": rows})
+            self.redo_log.clear()
+            self.load_errors = []
+        mode = self.mode_var.get()
+        measurement = self.measurement_var.get()
+        db = self.get_experiment_db()
+        used = self.used_suffixes()
+        for folder in folders:
+            suffix = folder_suffix(folder, used)
+            used.add(suffix)
+            future = self.load_executor.submit(load_run_data, db, folder, mode, measurement, suffix, self.current_curve())
+            self.pending_loads.append((self.load_generation, folder, suffix, future))
+        self.update_load_status()
+        self.after(100, self.poll_loads)
+
+    def poll_loads(self):
+        """Przejmuje zakończone wczytania (wątek Tk) i odświeża listę prób oraz wykres raz na porcję wyników."""
+        done = [item for item in self.pending_loads if item[3].done()]
+        if done:
+            self.pending_loads = [item for item in self.pending_loads if item not in done]
+            frames = []
+            for generation, folder, _, future in done:
+                if generation != self.load_generation or future.cancelled():
+                    continue
+                try:
+                    df_new = future.result()
+                except Exception as e:
+                    self.load_errors.append(f"{os.path.basename(os.path.normpath(folder))}: {e}")
+                    continue
+                if df_new is not None:
+                    frames.append(df_new)
+            if frames:
+                self.data = pd.concat(([] if self.data is None else [self.data]) + frames, ignore_index=True)
+                if self.op_log:
+                    self.op_log[-1]["runs"].extend(str(frame["Run"].iloc[0]) for frame in frames)
+                    self.op_log[-1]["stop"] = len(self.data)
+                self.refresh_sample_list()
+                self.plot_data()
+        self.update_load_status()
+        if self.pending_loads:
+            self.after(100, self.poll_loads)
+            return
+        if self.op_log and not self.op_log[-1]["runs"]:
+            self.op_log.pop()  # żadna analiza z tej porcji nie została wczytana
+        if done and self.load_errors:
+            messagebox.showerror("Błąd", "Nie udało się wczytać:\n" + "\n".join(self.load_errors))
+            self.load_errors = []
+
+    def cancel_loads(self):
+        """Porzuca trwające wczytania (np. po zmianie trybu lub cofnięciu) – ich wyniki są ignorowane."""
+        for _, _, _, future in self.pending_loads:
+            future.cancel()
+        self.pending_loads = []
+        self.load_generation += 1
+        self.update_load_status()
+
+    def update_load_status(self):
+        pending = sum(1 for item in self.pending_loads if item[0] == self.load_generation)
+        self.load_status_var.set(f"Wczytywanie analiz: pozostało {pending}" if pending else "")
+
+    def get_experiment_db(self):
+        if self.experiment_db is None:
+            db_path = self.config.get("experiment_db") or default_db_path(self.base_dir)
+            self.experiment_db = ExperimentDB(db_path)
+        return self.experiment_db
 
     def undo_add_data(self):
-        if not self.data_history:
+        if not self.op_log:
             messagebox.showinfo("Info", "Brak operacji do cofnięcia.")
             return
-        self.data = self.data_history.pop()
-        if "Sample" in self.data.columns:
-            self.samples = sorted(self.data["Sample"].unique())
-            self.sample_listbox.delete(0, tk.END)
-            for sample in self.samples:
-                self.sample_listbox.insert(tk.END, sample)
-        else:
-            self.samples = []
-        self.plot_data()
+        self.cancel_loads()
+        op = self.op_log.pop()
+        # Dodane wiersze są na końcu – wycinek jest widokiem, pełna ramka zostaje do ponowienia
+        full = self.data
+        self.data = full.iloc[:op["start"]] if full is not None else None
+        self.redo_log.append((op, full))
+        self.refresh_after_history_change()
         messagebox.showinfo("Info", "Ostatnie dodanie danych zostało cofnięte.")
 
+    def redo_add_data(self):
+        if not self.redo_log:
+            messagebox.showinfo("Info", "Brak operacji do ponowienia.")
+            return
+        op, full = self.redo_log.pop()
+        self.data = full
+        self.op_log.append(op)
+        self.refresh_after_history_change()
+        messagebox.showinfo("Info", "Ponowiono dodanie danych: " + ", ".join(op["runs"]))
+
+    def refresh_after_history_change(self):
+        self.refresh_sample_list()
+        self.plot_data()
+
     def on_mode_change(self):
-        old_selected = self.get_selected_samples()
         if self.mode_var.get() == "F/OD Ratio":
             self.measurement_frame.pack_forget()
         else:
             self.measurement_frame.pack(side=tk.LEFT, padx=5)
+        # W trybie Metrics lista "pomiarów" to nazwy metryk z metrics/metrics_summary.csv
+        options = metric_names(self.base_dir) if self.mode_var.get() == "Metrics" else self.measurement_options
+        self.measurement_combo.config(values=options)
+        if options and self.measurement_var.get() not in options:
+            self.measurement_var.set(options[0])
         self.load_data()
-        self.reselect_samples(old_selected)
         self.plot_data()
 
     def get_measurement_interval(self):
-        config_path = os.path.join(self.base_dir, "config.txt")
-        interval = 20
-        if os.path.isfile(config_path):
-            try:
-                with open(config_path, "r") as f:
-                    for line in f:
-                        if "measurement_interval" in line:
-                            interval = float(line.split("=")[1].strip())
-                            break
-            except Exception:
-                interval = 20
-        return interval
+        return get_measurement_interval(self.base_dir)
+
+    def current_curve(self):
+        """Prefiks kolumn krzywej wygładzonej ("Smoothed" / "Rate") lub None – dane bez wygładzania."""
+        return CURVE_OPTIONS.get(self.curve_var.get()) if self.mode_var.get() in SMOOTHABLE_MODES else None
+
+    def axis_label(self, mode):
+        label = MODE_COLUMNS[mode][2]
+        curve = self.current_curve()
+        return f"{label} / min" if curve == "Rate" else f"{label} (wygładzone)" if curve else label
 
     def load_data(self):
+        self.cancel_loads()
+        # Nowe dane bazowe – wpisy dziennika dotyczą poprzednich danych
+        self.op_log.clear()
+        self.redo_log.clear()
         mode = self.mode_var.get()
         try:
-            if mode == "F/OD Ratio":
-                bc_file = os.path.join(self.base_dir, "blank_corrected_analysis", "blank_corrected_summary.csv")
-                if not os.path.isfile(bc_file):
-                    raise FileNotFoundError(f"Brak pliku: {bc_file}")
-                df_bc = pd.read_csv(bc_file, encoding="latin1")
-                df_A = df_bc[df_bc["Measurement"]=="Meas A"].copy()
-                df_B = df_bc[df_bc["Measurement"]=="Meas B"].copy()
-                if df_A.empty or df_B.empty:
-                    raise ValueError("Brak danych dla obu pomiarów w pliku blank_corrected_summary.csv.")
-                df_A = df_A.rename(columns={"Corrected": "Corrected_A"})
-                df_B = df_B.rename(columns={"Corrected": "Corrected_B"})
-                df_merged = pd.merge(df_A, df_B, on=["Sample", "Kinetics", "Time_min"], suffixes=("_A", "_B"))
-                df_merged["Ratio"] = df_merged["Corrected_A"] / df_merged["Corrected_B"]
-                ratio_file = os.path.join(self.base_dir, "Fluorescence_to_OD_ratio", "ratio_summary.csv")
-                if os.path.isfile(ratio_file):
-                    df_ratio = pd.read_csv(ratio_file, encoding="latin1")
-                    df_final = pd.merge(df_merged, df_ratio[["Sample", "Time_min", "Ratio_std"]], on=["Sample", "Time_min"], how="left")
-                else:
-                    df_final = df_merged
-                self.data = df_final
-                self.y_label_entry.delete(0, tk.END)
-                self.y_label_entry.insert(0, "F/OD Ratio")
-            elif mode == "Blank Corrected":
-                file_path = os.path.join(self.base_dir, "blank_corrected_analysis", "blank_corrected_summary.csv")
-                if not os.path.isfile(file_path):
-                    raise FileNotFoundError(f"Brak pliku: {file_path}")
-                df = pd.read_csv(file_path, encoding="latin1")
-                required = {"Sample", "Time_min", "Corrected", "Measurement"}
-                if not required.issubset(df.columns):
-                    raise ValueError("Plik blank_corrected_summary.csv nie zawiera wymaganych kolumn.")
-                meas_choice = self.measurement_var.get()
-                df = df[df["Measurement"] == meas_choice]
-                self.data = df
-                self.y_label_entry.delete(0, tk.END)
-                self.y_label_entry.insert(0, "Corrected Value")
-            elif mode == "Raw Measurements":
-                file_path = os.path.join(self.base_dir, "long_merged.csv")
-                if not os.path.isfile(file_path):
-                    file_path = os.path.join(self.base_dir, "long_measA.csv")
-                if not os.path.isfile(file_path):
-                    raise FileNotFoundError(f"Brak pliku raw: {file_path}")
-                df = pd.read_csv(file_path, encoding="latin1")
-                if "Time_min" not in df.columns:
-                    interval = self.get_measurement_interval()
-                    df['Kinetics'] = pd.to_numeric(df['Kinetics'], errors="coerce")
-                    df['Time_min'] = (df['Kinetics'] - 1) * interval
-                required = {"Sample", "Time_min", "Value", "Measurement"}
-                if not required.issubset(df.columns):
-                    raise ValueError("Plik raw nie zawiera wymaganych kolumn.")
-                meas_choice = self.measurement_var.get()
-                df = df[df["Measurement"] == meas_choice]
-                grouped = df.groupby(['Sample','Time_min'])['Value'].agg(['mean','std']).reset_index()
-                grouped.rename(columns={"mean": "Value_mean", "std": "Value_std"}, inplace=True)
-                self.data = grouped
+            self.data = load_mode_data(self.base_dir, mode, self.measurement_var.get(),
+                                       self.get_measurement_interval(), curve=self.current_curve())
+            if self.data is not None:
+                self.data = self.data.assign(Run=os.path.basename(os.path.normpath(self.base_dir)),
+                                             Base_sample=self.data["Sample"].astype(str))
                 self.y_label_entry.delete(0, tk.END)
-                self.y_label_entry.insert(0, "Value")
-            else:
-                self.data = None
+                self.y_label_entry.insert(0, self.axis_label(mode))
         except Exception as e:
             messagebox.showerror("Błąd", str(e))
             self.data = None
             return
 
+        self.refresh_sample_list()
         if self.data is not None and "Sample" in self.data.columns:
-            self.samples = sorted(self.data["Sample"].unique())
-            self.sample_listbox.delete(0, tk.END)
-            for sample in self.samples:
-                self.sample_listbox.insert(tk.END, sample)
             max_time = self.data["Time_min"].max()
             self.x_max_scale.config(to=max_time)
             self.x_max_scale.set(max_time)
-        else:
-            self.samples = []
 
     def plot_data(self):
         if self.data is None:
             return
         self.ax.clear()
         mode = self.mode_var.get()
-        if mode == "F/OD Ratio":
-            self.ax.set_ylabel("F/OD Ratio")
-        elif mode == "Blank Corrected":
-            self.ax.set_ylabel("Corrected Value")
-        elif mode == "Raw Measurements":
-            self.ax.set_ylabel("Value")
+        if mode in MODE_COLUMNS:
+            self.ax.set_ylabel(self.axis_label(mode))
         self.ax.set_xlabel("Czas (min)")
         self.ax.grid(True)
         self.trendlines.clear()
         self.draggable_texts = []
         x_max = self.x_max_scale.get()
-        selected_indices = self.sample_listbox.curselection()
-        if not selected_indices:
-            selected_samples = self.samples
-        else:
-            selected_samples = [self.sample_listbox.get(i) for i in selected_indices]
+        selected_samples = self.plotted_samples()
         self.sample_lines = {}
         colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
         color_map = {sample: self.custom_colors.get(sample, colors[i % len(colors)]) for i, sample in enumerate(selected_samples)}
+        if self.series_source is not self.data:
+            self.invalidate_views()
+            self.series_source = self.data
+        max_points = self.get_point_budget()
         for sample in selected_samples:
-            df_sample = self.data[self.data["Sample"] == sample].copy()
-            df_sample = df_sample.sort_values("Time_min")
-            df_sample = df_sample[df_sample["Time_min"] <= x_max]
-            if df_sample.empty:
+            series = self.get_sample_series(sample, mode)
+            if series is None:
+                continue
+            x, y, yerr, pyramid = series
+            # Piramida decymacji – wybór poziomu zamiast ponownego liczenia przy zmianie zakresu X
+            idx = pyramid.select(x_max, max_points)
+            if len(idx) == 0:
                 continue
-            x = df_sample["Time_min"].values
             if self.show_data_var.get():
-                if mode == "F/OD Ratio":
-                    y = df_sample["Ratio"].values
-                    yerr = df_sample["Ratio_std"].values if "Ratio_std" in df_sample.columns else None
-                    line, caps, bars = self.ax.errorbar(x, y, yerr=yerr, fmt='-o', capsize=5,
-                                                         label=sample, color=color_map[sample])
-                elif mode == "Blank Corrected":
-                    y = df_sample["Corrected"].values
-                    yerr = df_sample["Sample_std"].values if "Sample_std" in df_sample.columns else None
-                    line, caps, bars = self.ax.errorbar(x, y, yerr=yerr, fmt='-o', capsize=5,
-                                                         label=sample, color=color_map[sample])
-                elif mode == "Raw Measurements":
-                    y = df_sample["Value_mean"].values
-                    yerr = df_sample["Value_std"].values
-                    line, caps, bars = self.ax.errorbar(x, y, yerr=yerr, fmt='-o', capsize=5,
-                                                         label=sample, color=color_map[sample])
-                else:
-                    continue
+                line, caps, bars = self.ax.errorbar(x[idx], y[idx], yerr=None if yerr is None else yerr[..., idx],
+                                                     fmt='-o', capsize=5, label=sample, color=color_map[sample])
             else:
                 line = None
             if line is not None:
@@ -487,15 +582,108 @@ class InteractivePlotSelector(tk.Toplevel):
         self.ax.legend()
         self.canvas.draw()
 
+    def get_sample_series(self, sample, mode):
+        """
+        Zwraca (x, y, yerr, piramida decymacji) dla próby w danym trybie.
+        yerr to ± std albo – przy włączonych przedziałach bootstrap – tablica (2, N) odległości
+        do dolnej i górnej granicy przedziału. Wynik jest zapamiętywany do czasu zmiany danych.
+        """
+        resampled = self.resample_var.get()
+        pooled = self.pool_var.get()
+        ci = self.ci_var.get()
+        key = (mode, sample, resampled, pooled, ci)
+        if key in self.series_cache:
+            return self.series_cache[key]
+        if mode not in MODE_COLUMNS:
+            return None
+        y_col, err_col, _ = MODE_COLUMNS[mode]
+        view = self.get_pooled_view(mode) if pooled else None
+        if view is None:
+            view = self.get_plot_view(mode) if resampled else self.data
+        df_sample = view[view["Sample"] == sample].sort_values("Time_min")
+        if df_sample.empty:
+            series = None
+        else:
+            x = df_sample["Time_min"].to_numpy(dtype=float)
+            y = df_sample[y_col].to_numpy(dtype=float)
+            yerr = df_sample[err_col].to_numpy(dtype=float) if err_col in df_sample.columns else None
+            bounds = ("BCa_low", "BCa_high") if self.ci_method == "bca" else ("CI_low", "CI_high")
+            if ci and all(col in df_sample.columns for col in bounds):
+                low = df_sample[bounds[0]].to_numpy(dtype=float)
+                high = df_sample[bounds[1]].to_numpy(dtype=float)
+                # Brak przedziału (np. n = 1) -> bez słupka błędu w tym punkcie
+                yerr = np.nan_to_num(np.vstack([y - low, high - y]).clip(min=0), nan=0.0)
+            series = (x, y, yerr, DecimationPyramid(x, y, method=self.decimation_method))
+        self.series_cache[key] = series
+        return series
+
+    def invalidate_views(self):
+        self.series_cache.clear()
+        self.resampled_view = None
+        self.pooled_view = None
+        self.pooled_key = None
+        self.pooled_source = None
+
+    def get_pooled_view(self, mode):
+        """
+        Średnia ± std z puli wszystkich analiz dla każdej próby bazowej (nazwa bez sufiksu analizy).
+        Zwraca None, gdy dane trybu nie zawierają liczności n (np. F/OD Ratio).
+        """
+        if self.data is None or mode not in MODE_COLUMNS:
+            return None
+        if self.pooled_source is not self.data or self.pooled_key != mode:
+            y_col, err_col, _ = MODE_COLUMNS[mode]
+            self.pooled_view = pool_plot_data(self.data, y_col, err_col)
+            self.pooled_source = self.data
+            self.pooled_key = mode
+        return self.pooled_view
+
+    def current_samples(self):
+        """Lista prób do wyświetlenia – z widoku puli, gdy jest włączony i dostępny."""
+        view = self.get_pooled_view(self.mode_var.get()) if self.pool_var.get() else None
+        source = self.data if view is None else view
+        return sorted(source["Sample"].unique())
+
+    def on_pool_toggle(self):
+        if self.data is None:
+            return
+        if self.pool_var.get() and self.get_pooled_view(self.mode_var.get()) is None:
+            messagebox.showinfo("Info", "Średnia z puli analiz jest dostępna dla trybów Blank Corrected i Raw Measurements.")
+            self.pool_var.set(False)
+        self.refresh_sample_list()
+        self.series_cache.clear()
+        self.plot_data()
+
+    def get_plot_view(self, mode):
+        """
+        Dane przepróbkowane na wspólną siatkę czasu (gdy wczytano więcej niż jedną analizę).
+        Interpolacja wszystkich analiz × prób odbywa się jednym wywołaniem; wyniki per analiza są w cache.
+        """
+        if "Run" not in self.data.columns or self.data["Run"].nunique() < 2 or mode not in MODE_COLUMNS:
+            return self.data
+        if self.resampled_view is None:
+            y_col, err_col, _ = MODE_COLUMNS[mode]
+            cols = [c for c in (y_col, err_col) if c in self.data.columns]
+            runs = {}
+            for run, block in self.data.groupby("Run", sort=False):
+                block = block[["Sample", "Time_min"] + cols]
+                content = int(pd.util.hash_pandas_object(block, index=False).sum())
+                runs[(run, mode, content)] = block
+            resampled, _ = resample_runs(runs, cols, method=self.resample_method, cache=self.resample_cache)
+            resampled["Run"] = resampled["Run"].map(lambda key: key[0])
+            self.resampled_view = resampled
+        return self.resampled_view
+
+    def get_point_budget(self):
+        """Liczba punktów na serię odpowiadająca szerokości osi w pikselach."""
+        width = int(self.ax.get_window_extent().width) or 800
+        return 2 * width if self.decimation_method == "minmax" else width
+
     def show_trendline(self):
         if self.data is None:
             return
         mode = self.mode_var.get()
-        selected = self.sample_listbox.curselection()
-        if not selected:
-            selected_samples = self.samples
-        else:
-            selected_samples = [self.sample_listbox.get(i) for i in selected]
+        selected_samples = self.plotted_samples()
         self.font_size_scale.pack(side=tk.LEFT, padx=5)
         x_max = self.x_max_scale.get()
         for sample in selected_samples:
@@ -504,26 +692,14 @@ class InteractivePlotSelector(tk.Toplevel):
             df_sample = df_sample[df_sample["Time_min"] <= x_max]
             if df_sample.empty or len(df_sample) < 2:
                 continue
-            x = df_sample["Time_min"].values
-            if mode == "F/OD Ratio":
-                y = df_sample["Ratio"].values
-            elif mode == "Blank Corrected":
-                y = df_sample["Corrected"].values
-            elif mode == "Raw Measurements":
-                y = df_sample["Value_mean"].values
-            else:
+            if mode not in MODE_COLUMNS:
                 continue
-            trend_type = self.trend_type_var.get()
-            if trend_type == "Liniowy":
-                coeffs = np.polyfit(x, y, 1)
-                trend_func = np.poly1d(coeffs)
-                eq_text = f"y = {coeffs[0]:.2f}x + {coeffs[1]:.2f}"
-            elif trend_type == "Wielomianowy (2nd stopnia)":
-                coeffs = np.polyfit(x, y, 2)
-                trend_func = np.poly1d(coeffs)
-                eq_text = f"y = {coeffs[0]:.2f}x² + {coeffs[1]:.2f}x + {coeffs[2]:.2f}"
-            else:
+            x = df_sample["Time_min"].values
+            y = df_sample[MODE_COLUMNS[mode][0]].values
+            trend = fit_trendline(x, y, self.trend_type_var.get())
+            if trend is None:
                 continue
+            trend_func, eq_text = trend
 
             x_fit = np.linspace(x.min(), x.max(), 100)
             y_fit = trend_func(x_fit)
@@ -548,11 +724,10 @@ class InteractivePlotSelector(tk.Toplevel):
         self.canvas.draw()
 
     def hide_trendline(self):
-        selected = self.sample_listbox.curselection()
-        if not selected:
+        selected_samples = self.get_selected_samples()
+        if not selected_samples:
             messagebox.showinfo("Info", "Wybierz próbki, dla których chcesz ukryć trendline.")
             return
-        selected_samples = [self.sample_listbox.get(i) for i in selected]
         for sample in selected_samples:
             if sample in self.trendlines:
                 for trend_line, text_obj in self.trendlines[sample]:
@@ -586,16 +761,38 @@ class InteractivePlotSelector(tk.Toplevel):
             self.fig.savefig(file_path)
             messagebox.showinfo("Informacja", f"Wykres zapisano do:\n{file_path}")
 
-    def change_color_for_sample(self, event):
-        index = self.sample_listbox.nearest(event.y)
-        if index is None:
-            return "break"
-        sample = self.sample_listbox.get(index)
+    def export_all_plots(self):
+        """Eksport (bez GUI, w puli procesów) wykresów każdej próby dla każdego trybu i pomiaru."""
+        out_dir = filedialog.askdirectory(title="Wybierz folder docelowy eksportu")
+        if not out_dir:
+            return
+        options = {
+            "trendline": self.trend_type_var.get() if self.trendlines else None,
+            "colors": dict(self.custom_colors),
+            "x_label": self.x_label_entry.get(),
+            "title": self.title_entry.get(),
+        }
+        try:
+            stats = export_figures([self.base_dir], out_dir, formats=("png",), options=options)
+        except Exception as e:
+            messagebox.showerror("Błąd", f"Eksport nie powiódł się: {e}")
+            return
+        messagebox.showinfo("Informacja", f"Zapisano {stats['figures']} wykresów "
+                                          f"({stats['figures_per_second']:.1f} wykr./s) do:\n{out_dir}")
+
+    def open_plate_map(self):
+        """Mapa cieplna płytki bieżącej analizy (surowe / po korekcie BLANK / iloraz) z suwakiem po cyklach."""
+        try:
+            open_plate_heatmap(self, self.base_dir, self.get_measurement_interval(),
+                               ratio_mapping=get_ratio_mapping(self.base_dir))
+        except Exception as e:
+            messagebox.showerror("Błąd", f"Nie udało się otworzyć mapy płytki: {e}")
+
+    def change_color_for_sample(self, sample):
         color = colorchooser.askcolor()[1]
         if color:
             self.custom_colors[sample] = color
             self.plot_data()
-        return "break"
 
 def launch_plot_selector(base_dir, config=None):
     root = tk.Tk()
@@ -4,67 +4,217 @@
 Plik: main.py
 
 Integracja procesu:
-  1. Uruchamia GUI (launch_gui z gui.py), które generuje pliki long (m.in. long_measA.csv oraz long_measB.csv)
-     oraz zapisuje interwał pomiaru w konfiguracji.
-  2. Scala oba pliki long w jeden plik (long_merged.csv).
+  1. Uruchamia GUI (launch_gui z gui.py), w którym użytkownik wskazuje plik i przypisuje dołki;
+     następnie eksport EnSpire jest parsowany do plików long (long_measA.csv oraz long_measB.csv).
+  2. Scala oba pliki long w jeden plik (long_merged.csv) – ze wspólnym schematem typów (data_schema.py)
+     i raportem zajętości pamięci przed/po; config 'float32_values' (opcja w GUI) włącza float32 dla wartości.
+  2a. Kontrola jakości dołków (qc_file z data_qc.py) – flagi w qc/well_flags.csv.
   3. Uruchamia analizę blank correction (blank_correct_file z data_blank_corrected.py)
-     – wynik zapisuje się jako blank_corrected_summary.csv.
+     – wynik zapisuje się jako blank_corrected_summary.csv (dołki oznaczone w QC są pomijane).
+  3a. Oblicza cechy kinetyczne (extract_kinetic_features z data_features.py) – AUC, maks. nachylenie,
+     czas osiągnięcia progu, wartość końcowa/maksymalna – wynik w kinetic_features/kinetic_features.csv.
+  3b. Normalizacja przestrzenna płytki (spatial_file z data_spatial.py, config 'spatial_method' z opcji analizy w GUI:
+     median_polish / bscore; domyślnie wyłączona – model wymaga prób rozłożonych po płytce) – efekty wierszy/kolumn
+     (brzegi, gradienty) dla każdego pomiaru i cyklu; wyniki w spatial/spatial_summary.csv i spatial_effects.csv.
   4. Uruchamia analizę danych (analyze_long_file z data_analysis.py) na pliku blank_corrected_summary.csv.
-  5. Uruchamia analizę ratio (calculate_ratio z data_ratio.py) dla pliku long_merged.csv.
+  5. Uruchamia analizę ratio (calculate_ratio z data_ratio.py) dla pliku long_merged.csv oraz metryki pochodne
+     (metrics_file z metrics.py) – wyrażenia nad pomiarami z config 'metrics' ({nazwa: wyrażenie}, opcje analizy w GUI; domyślnie
+     ilorazy z ratio_mapping) – wynik w metrics/metrics_summary.csv.
+  5a. Wygładza krzywe wszystkich dołków i liczy szybkości (smooth_file z data_smoothing.py, config 'smoothing'
+     z opcji analizy w GUI: method savgol/median/ema, window, polyorder, alpha) – wynik w smoothing/smoothed_summary.csv
+     (dla eksportu z jednym odczytem szybkość wynosi 0).
+  5b. Przedziały ufności bootstrap (bootstrap_file z data_bootstrap.py) dla Corrected i ilorazu
+     – wynik w bootstrap/bootstrap_ci.csv (config 'bootstrap_resamples' z opcji analizy w GUI, 0 wyłącza etap).
+  5c. Zapisuje wyniki jako zbiory z partycjami po pomiarze (partitioned_store.py, folder dataset/)
+     – wykresy wczytują tylko wybrany pomiar i potrzebne kolumny; przebudowa tylko po zmianie plików źródłowych.
+  5d. Zapisuje analizę do lokalnej bazy eksperymentów (experiment_db.py, SQLite).
+  5e. Buduje samodzielny raport HTML (build_report z report_html.py, config 'html_report', domyślnie włączony)
+     – mapa płytki, mapy cieplne, krzywe prób, korekta BLANK, ilorazy i flagi QC w report/report.html;
+     wykresy renderowane są ponownie tylko wtedy, gdy zmieniły się ich dane.
+Zapis plików wynikowych etapów odbywa się w tle (async_writer.py, config 'async_writes', domyślnie włączony):
+kolejny etap liczy, gdy poprzedni jeszcze zapisuje; Pipeline.finish czeka na zapisy i zgłasza błędy.
   6. Umożliwia uruchomienie interfejsu interaktywnego wyboru wykresów, który pobiera dane (np. zagregowane
      statystyki) i generuje jeden wykres kompozytowy z wieloma liniami (średnia ± std) dla wybranych próbek.
+Etapy 1–5b wykonywane są przyrostowo (pipeline_graph.py): etap jest pomijany, jeśli jego pliki wejściowe
+(skróty SHA-256), parametry konfiguracji i kod nie zmieniły się od poprzedniego uruchomienia.
+Informacja o etapach przeliczonych i użytych ponownie zapisywana jest w pipeline_manifest.json
+(opcja GUI / config 'force_recompute' albo flaga --force wymusza przeliczenie wszystkiego).
 """
 
 import os
+import sys
 import pandas as pd
-from gui import launch_gui
+from gui import launch_gui, parse_enspire_file
 from data_blank_corrected import blank_correct_file
 from data_analysis import analyze_long_file
 from data_ratio import calculate_ratio
+from data_features import extract_kinetic_features
+from data_qc import qc_file
+from data_bootstrap import bootstrap_file
+from metrics import metrics_file
+from data_smoothing import smooth_file
+from data_spatial import spatial_file
+from data_schema import apply_schema, memory_report, set_value_dtype
+import numpy as np
+from experiment_db import ExperimentDB, default_db_path
+from partitioned_store import build_results_datasets
+from pipeline_graph import Pipeline
+from async_writer import AsyncWriter, set_writer, write_csv, wait_for
+from report_html import build_report
 from interactive_plot_selector import launch_plot_selector  # Upewnij się, że plik ma tę nazwę
 
-def main():
+def merge_long_files(long_file_A, long_file_B, merged_file):
+    """Scala long_measA.csv i long_measB.csv we wspólnym schemacie typów (z raportem pamięci)."""
+    print("Scalam pliki long_measA.csv oraz long_measB.csv...")
+    df_A = pd.read_csv(long_file_A, encoding="latin1")
+    df_B = pd.read_csv(long_file_B, encoding="latin1")
+    merged_raw = pd.concat([df_A, df_B], ignore_index=True)
+    merged_df = apply_schema(merged_raw.copy())
+    memory_report(merged_raw, merged_df, label="long_merged")
+    del merged_raw
+    write_csv(merged_df, merged_file, index=False)
+    print("Scalony plik zapisano jako:", merged_file)
+
+def main(force=False):
     print("Uruchamiam GUI – przygotuj dane...")
-    config = launch_gui()  # Zwraca config zawierający 'long_file' (ścieżka do long_measA.csv) oraz 'measurement_interval'
+    config = launch_gui()  # Zwraca config zawierający 'file_path', 'long_file' (ścieżka do long_measA.csv), przypisania dołków oraz 'measurement_interval'
     
     long_file_A = config.get('long_file', "")
-    if not long_file_A or not os.path.isfile(long_file_A):
-        print("Brak wygenerowanego pliku long_measA.csv. Koniec programu.")
+    if not long_file_A or not config.get('file_path'):
+        print("Nie potwierdzono danych w GUI. Koniec programu.")
         return
 
     measurement_interval = config.get('measurement_interval', 20)
+    if config.get('float32_values'):
+        set_value_dtype(np.float32)
     output_dir = os.path.dirname(long_file_A)
     long_file_B = os.path.join(output_dir, "long_measB.csv")
+    ratio_mapping = config.get('ratio_mapping') or None
+    force = force or bool(config.get('force_recompute', False))
+    # Etapy z niezmienionymi wejściami (skróty plików + klucze konfiguracji) są pomijane – pipeline_manifest.json
+    pipeline = Pipeline(output_dir, force=force)
+    value_params = {'float32_values': bool(config.get('float32_values'))}
+    # Zapisy wyników w tle – etap czeka tylko na zapis swoich wejść (pipeline_graph.py)
+    if config.get('async_writes', True):
+        set_writer(AsyncWriter())
+
+    # Parsowanie eksportu EnSpire do plików long – tylko gdy zmienił się plik lub przypisanie dołków
+    assignments = config.get('well_assignments')
+    pipeline.stage("parse", parse_enspire_file, config['file_path'], output_dir, sample_mapping=assignments,
+                   inputs=[config['file_path']],
+                   params={'well_assignments': assignments.to_mapping() if assignments is not None else None},
+                   outputs=[long_file_A, long_file_B])
+    wait_for(long_file_A, long_file_B)
+    if not os.path.isfile(long_file_A):
+        print("Brak wygenerowanego pliku long_measA.csv. Koniec programu.")
+        return
     
     # Scalanie danych z obu plików long (jeśli long_measB.csv istnieje)
     if os.path.isfile(long_file_B):
-        print("Scalam pliki long_measA.csv oraz long_measB.csv...")
-        df_A = pd.read_csv(long_file_A, encoding="latin1")
-        df_B = pd.read_csv(long_file_B, encoding="latin1")
-        merged_df = pd.concat([df_A, df_B], ignore_index=True)
         merged_file = os.path.join(output_dir, "long_merged.csv")
-        merged_df.to_csv(merged_file, index=False)
-        print("Scalony plik zapisano jako:", merged_file)
+        pipeline.stage("merge", merge_long_files, long_file_A, long_file_B, merged_file,
+                       inputs=[long_file_A, long_file_B], params=value_params, outputs=[merged_file])
     else:
         print("Plik long_measB.csv nie został znaleziony – używam tylko long_measA.csv.")
         merged_file = long_file_A
 
+    # Kontrola jakości dołków (odstające, nasycone, z brakami) przed uśrednianiem
+    qc_flags = os.path.join(output_dir, "qc", "well_flags.csv")
+    pipeline.stage("qc", qc_file, merged_file, saturation_level=config.get('saturation_level'),
+                   inputs=[merged_file], params={'saturation_level': config.get('saturation_level')},
+                   outputs=[qc_flags])
+
     # Blank correction – przetwarzamy scalony plik
-    print("Uruchamiam analizę blank correction...")
-    blank_correct_file(merged_file, measurement_interval)
     blank_analysis_folder = os.path.join(output_dir, "blank_corrected_analysis")
     blank_summary_file = os.path.join(blank_analysis_folder, "blank_corrected_summary.csv")
+    pipeline.stage("blank", blank_correct_file, merged_file, measurement_interval, qc_flags=qc_flags,
+                   inputs=[merged_file, qc_flags],
+                   params=dict(value_params, measurement_interval=measurement_interval),
+                   outputs=[blank_summary_file])
+    wait_for(blank_summary_file)
     if not os.path.isfile(blank_summary_file):
         print("Plik blank_corrected_summary.csv nie został wygenerowany. Koniec programu.")
+        pipeline.finish()
+        set_writer(None)
         return
 
+    # Cechy kinetyczne (AUC, nachylenie, czas do progu) dla dołków i prób
+    pipeline.stage("features", extract_kinetic_features, merged_file, measurement_interval,
+                   threshold=config.get('feature_threshold'), summary_file=blank_summary_file, qc_flags=qc_flags,
+                   inputs=[merged_file, blank_summary_file, qc_flags],
+                   params=dict(value_params, measurement_interval=measurement_interval,
+                               feature_threshold=config.get('feature_threshold')),
+                   outputs=[os.path.join(output_dir, "kinetic_features", "kinetic_features.csv")])
+
+    # Normalizacja przestrzenna (efekty wierszy i kolumn płytki) – obok zwykłej korekty BLANK
+    spatial_method = config.get('spatial_method')
+    if spatial_method:
+        pipeline.stage("spatial", spatial_file, merged_file, measurement_interval, method=spatial_method, qc_flags=qc_flags,
+                       inputs=[merged_file, qc_flags],
+                       params=dict(value_params, measurement_interval=measurement_interval, spatial_method=spatial_method),
+                       outputs=[os.path.join(output_dir, "spatial")])
+
     # Analiza danych – wykresy raw_diagram_in_time (użycie danych skorygowanych lub oryginalnych)
-    print("Uruchamiam analizę danych (skorygowane)...")
-    analyze_long_file(blank_summary_file, measurement_interval)
+    pipeline.stage("analysis", analyze_long_file, blank_summary_file, measurement_interval,
+                   inputs=[blank_summary_file],
+                   params=dict(value_params, measurement_interval=measurement_interval),
+                   outputs=[os.path.join(blank_analysis_folder, "analysis")])
     
     # Analiza ratio – korzystamy z pliku long_merged.csv
-    print("Uruchamiam analizę ratio...")
-    calculate_ratio(merged_file, measurement_interval)
+    ratio0 = (ratio_mapping or [{"numerator": "Meas A", "denominator": "Meas B"}])[0]
+    ratio_folder = os.path.join(output_dir, f"{ratio0.get('numerator')}_to_{ratio0.get('denominator')}_ratio")
+    pipeline.stage("ratio", calculate_ratio, merged_file, measurement_interval, ratio_mapping, qc_flags=qc_flags,
+                   inputs=[merged_file, qc_flags],
+                   params=dict(value_params, measurement_interval=measurement_interval, ratio_mapping=ratio_mapping),
+                   outputs=[os.path.join(ratio_folder, "ratio_summary.csv")])
+
+    # Metryki pochodne – wyrażenia nad pomiarami ze wspólnym cache podwyrażeń
+    metrics = config.get('metrics') or None
+    pipeline.stage("metrics", metrics_file, merged_file, measurement_interval, metrics=metrics,
+                   ratio_mapping=ratio_mapping, qc_flags=qc_flags,
+                   inputs=[merged_file, qc_flags],
+                   params=dict(value_params, measurement_interval=measurement_interval,
+                               metrics=metrics, ratio_mapping=ratio_mapping),
+                   outputs=[os.path.join(output_dir, "metrics", "metrics_summary.csv")])
+
+    # Wygładzone krzywe i szybkości (pochodne) – selektor przełącza je bez przeliczania
+    smoothing = config.get('smoothing') or None
+    pipeline.stage("smoothing", smooth_file, merged_file, measurement_interval, smoothing=smoothing, qc_flags=qc_flags,
+                   inputs=[merged_file, qc_flags],
+                   params=dict(value_params, measurement_interval=measurement_interval, smoothing=smoothing),
+                   outputs=[os.path.join(output_dir, "smoothing", "smoothed_summary.csv")])
+
+    # Przedziały ufności bootstrap (losowanie dołków) dla średnich skorygowanych i ilorazu
+    n_boot = int(config.get('bootstrap_resamples', 2000) or 0)
+    if n_boot > 0:
+        pipeline.stage("bootstrap", bootstrap_file, merged_file, measurement_interval, n_boot=n_boot,
+                       ratio_mapping=ratio_mapping, qc_flags=qc_flags,
+                       inputs=[merged_file, qc_flags],
+                       params=dict(value_params, measurement_interval=measurement_interval,
+                                   ratio_mapping=ratio_mapping, bootstrap_resamples=n_boot),
+                       outputs=[os.path.join(output_dir, "bootstrap", "bootstrap_ci.csv")])
+    pipeline.finish()
+    set_writer(None)
+
+    # Zbiory z partycjami (pomiar / próba) do szybkiego wczytywania wybranych danych w wykresach
+    try:
+        build_results_datasets(output_dir, force=force)
+    except Exception as e:
+        print("Nie udało się zapisać zbiorów z partycjami:", e)
+
+    # Zapis analizy do lokalnej bazy eksperymentów (porównania między analizami bez ponownego parsowania CSV)
+    try:
+        db = ExperimentDB(config.get('experiment_db') or default_db_path(output_dir))
+        db.ingest_run(output_dir)
+    except Exception as e:
+        print("Nie udało się zapisać analizy do bazy eksperymentów:", e)
+
+    # Raport HTML (wykresy w cache wg skrótu danych – przebudowa rysuje tylko zmienione wykresy)
+    if config.get('html_report', True):
+        try:
+            build_report(output_dir)
+        except Exception as e:
+            print("Nie udało się zbudować raportu HTML:", e)
     
     # Uruchomienie interfejsu do wyboru wykresów
     odp = input("Czy wyświetlić interaktywny wybór wykresów? (t/n): ").strip().lower()
@@ -78,4 +228,4 @@ def main():
         odp = input("Czy chcesz uruchomić interfejs ponownie? (t/n): ").strip().lower()
 
 if __name__ == "__main__":
-    main()
+    main(force="--force" in sys.argv)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: metrics.py
+
+Metryki pochodne definiowane wyrażeniami nad pomiarami, np.
+    {"F/OD": "corrected(MeasA) / corrected(MeasB)", "log A": "log2(MeasA)",
+     "A względem kontroli": "MeasA / ref(MeasA, 'Kontrola')"}
+Wyrażenie (składnia Pythona, parsowana modułem ast – bez eval) jest kompilowane do drzewa węzłów
+i liczone wektorowo na kostce pomiar × cykl × dołek (plate_cube.py) – wynikiem jest warstwa cykl × dołek,
+a statystyki replikatów (średnia, std, n) liczone są dla każdej próby jak w data_ratio.py.
+Dostępne elementy:
+  - pomiary: MeasA (nazwa pomiaru bez spacji i znaków specjalnych) lub m("Meas A"),
+  - liczby, + - * / ** oraz minus jednoargumentowy (dzielenie przez 0 -> NaN),
+  - log2, log10, log, exp, sqrt, abs (log z wartości <= 0 -> NaN),
+  - blank(x)      – średnia x w dołkach BLANK dla każdego cyklu (brak BLANK -> 0, jak w blank correction),
+  - corrected(x)  – x − blank(x),
+  - mean(x)       – średnia x w replikatach próby (dla każdego cyklu), np. mean(corrected(MeasA)) / mean(...)
+                    daje iloraz średnich jak w trybie "F/OD Ratio" selektora,
+  - ref(x, "Próba") – średnia x w dołkach wskazanej próby dla każdego cyklu (normalizacja do kontroli).
+Obliczenia są leniwe (metryka liczona dopiero przy odczycie) i współdzielone: węzły drzewa są krotkami,
+więc identyczne podwyrażenia różnych metryk (np. corrected(MeasA)) trafiają do jednego cache silnika.
+"""
+
+import os
+import re
+import ast
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from data_qc import load_qc_flags, qc_mask
+from data_schema import read_long_csv, apply_schema
+from plate_cube import PlateCube
+from async_writer import write_csv
+
+FUNCTIONS = {
+    "log2": np.log2,
+    "log10": np.log10,
+    "log": np.log,
+    "exp": np.exp,
+    "sqrt": np.sqrt,
+    "abs": np.abs,
+}
+POSITIVE_ONLY = {"log2", "log10", "log"}
+OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.Pow: "**"}
+METRIC_COLUMNS = {'mean': 'Metric_mean', 'std': 'Metric_std', 'n': 'n'}
+
+def identifier(name):
+    """Nazwa pomiaru jako identyfikator wyrażenia: "Meas A" -> "MeasA"."""
+    return re.sub(r"\W", "", name)
+
+def default_metrics(ratio_mapping=None):
+    """Metryki domyślne dla definicji ilorazów: iloraz surowych wartości dołków i iloraz skorygowanych średnich."""
+    metrics = {}
+    for mapping in (ratio_mapping or [{"numerator": "Meas A", "denominator": "Meas B"}]):
+        num, den = mapping["numerator"], mapping["denominator"]
+        metrics[f"{num}/{den}"] = f"m({num!r}) / m({den!r})"
+        metrics[f"{num}/{den} (corrected)"] = f"mean(corrected(m({num!r}))) / mean(corrected(m({den!r})))"
+    return metrics
+
+def _string_argument(node, func):
+    if not (isinstance(node, ast.Constant) and isinstance(node.value, str)):
+        raise ValueError(f"{func}(): oczekiwano nazwy w cudzysłowie")
+    return node.value
+
+def compile_expression(expression, measurements, samples=None):
+    """
+    Drzewo wyrażenia z krotek, np. ("/", ("m", "Meas A"), ("m", "Meas B")).
+    ValueError dla nieznanych pomiarów, prób, funkcji i niedozwolonej składni.
+    """
+    by_identifier = {identifier(m): m for m in measurements}
+
+    def build(node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return ("num", float(node.value))
+        if isinstance(node, ast.Name):
+            if node.id not in by_identifier:
+                raise ValueError(f"Nieznany pomiar '{node.id}' (dostępne: {', '.join(by_identifier)})")
+            return ("m", by_identifier[node.id])
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            return (OPERATORS[type(node.op)], build(node.left), build(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = build(node.operand)
+            return ("neg", operand) if isinstance(node.op, ast.USub) else operand
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            func, args = node.func.id, node.args
+            if func == "m" and len(args) == 1:
+                name = _string_argument(args[0], func)
+                if name not in measurements:
+                    raise ValueError(f"Nieznany pomiar '{name}'")
+                return ("m", name)
+            if func in FUNCTIONS and len(args) == 1:
+                return (func, build(args[0]))
+            if func in ("blank", "mean") and len(args) == 1:
+                return (func, build(args[0]))
+            if func == "corrected" and len(args) == 1:
+                inner = build(args[0])
+                return ("-", inner, ("blank", inner))
+            if func == "ref" and len(args) == 2:
+                sample = _string_argument(args[1], func)
+                if samples is not None and sample not in samples:
+                    raise ValueError(f"Nieznana próba odniesienia '{sample}'")
+                return ("ref", build(args[0]), sample)
+            raise ValueError(f"Nieznana funkcja lub zła liczba argumentów: {func}()")
+        raise ValueError(f"Niedozwolony element wyrażenia: {ast.dump(node)}")
+
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Błąd składni wyrażenia '{expression}': {e.msg}") from None
+    return build(tree.body)
+
+def channels(node):
+    """Pomiary użyte w drzewie wyrażenia."""
+    if node[0] == "m":
+        return {node[1]}
+    return set().union(*(channels(child) for child in node[1:] if isinstance(child, tuple)))
+
+class MetricEngine:
+    def __init__(self, cube, metrics=None, blank_name="BLANK"):
+        self.cube = cube
+        self.blank_name = blank_name
+        self.metrics = {}
+        self.cache = {}
+        self.stats_cache = {}
+        self.evaluations = 0
+        for name, expression in (metrics or {}).items():
+            self.define(name, expression)
+
+    def define(self, name, expression):
+        """Kompiluje metrykę (błędy wyrażenia zgłaszane od razu); obliczenie – dopiero przy odczycie."""
+        self.metrics[name] = (expression, compile_expression(expression, self.cube.measurements, self.cube.sample_names))
+        self.stats_cache.pop(name, None)
+
+    def _wells_of(self, sample):
+        return self.cube.sample_of_well == self.cube.sample_code(sample)
+
+    def _wells_mean(self, values, wells):
+        """Średnia poprawnych wartości w wybranych dołkach dla każdego cyklu -> (cykl, 1); NaN gdy brak."""
+        valid = ~np.isnan(values[:, wells])
+        total = np.where(valid, values[:, wells], 0.0).sum(axis=1)
+        count = valid.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)[:, None]
+
+    def _replicate_mean(self, values):
+        """Średnia replikatów próby rozgłoszona na dołki próby (dołki bez próby -> NaN)."""
+        codes = self.cube.sample_of_well
+        onehot = np.zeros((len(codes), len(self.cube.sample_names)))
+        assigned = codes >= 0
+        onehot[np.flatnonzero(assigned), codes[assigned]] = 1.0
+        valid = ~np.isnan(values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (np.where(valid, values, 0.0) @ onehot) / (valid.astype(float) @ onehot)
+        return np.where(assigned, np.take(mean, np.maximum(codes, 0), axis=1), np.nan)
+
+    def evaluate(self, node):
+        """Wartości węzła (cykl × dołek lub cykl × 1); wynik każdego węzła liczony raz na silnik."""
+        if node in self.cache:
+            return self.cache[node]
+        self.evaluations += 1
+        kind = node[0]
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            if kind == "num":
+                result = np.float64(node[1])
+            elif kind == "m":
+                result = self.cube.values[self.cube.measurements.index(node[1])]
+            elif kind == "neg":
+                result = -self.evaluate(node[1])
+            elif kind in ("+", "-", "*", "**"):
+                a, b = self.evaluate(node[1]), self.evaluate(node[2])
+                result = a + b if kind == "+" else a - b if kind == "-" else a * b if kind == "*" else a ** b
+            elif kind == "/":
+                a, b = self.evaluate(node[1]), self.evaluate(node[2])
+                result = np.where(b != 0, a / b, np.nan)
+            elif kind in FUNCTIONS:
+                x = self.evaluate(node[1])
+                result = np.where(x > 0, FUNCTIONS[kind](x), np.nan) if kind in POSITIVE_ONLY else FUNCTIONS[kind](x)
+            elif kind == "blank":
+                x = np.broadcast_to(self.evaluate(node[1]), self.cube.shape[1:])
+                result = np.nan_to_num(self._wells_mean(x, self._wells_of(self.blank_name)), nan=0.0)
+            elif kind == "mean":
+                result = self._replicate_mean(np.broadcast_to(self.evaluate(node[1]), self.cube.shape[1:]))
+            elif kind == "ref":
+                result = self._wells_mean(np.broadcast_to(self.evaluate(node[1]), self.cube.shape[1:]),
+                                          self._wells_of(node[2]))
+            else:
+                raise ValueError(f"Nieznany węzeł wyrażenia: {kind}")
+        self.cache[node] = result
+        return result
+
+    def layer(self, name):
+        """Jednowarstwowa kostka metryki; odczyt istnieje tam, gdzie istniały odczyty wszystkich użytych pomiarów."""
+        expression, node = self.metrics[name]
+        present = np.ones(self.cube.shape[1:], dtype=bool)
+        for measurement in channels(node):
+            present &= self.cube.present[self.cube.measurements.index(measurement)]
+        values = np.broadcast_to(self.evaluate(node), self.cube.shape[1:])
+        return self.cube.with_values(values[None], [name], present[None])
+
+    def stats(self, name):
+        """Statystyki replikatów metryki (plate_cube.replicate_stats, z BLANK) – liczone raz."""
+        if name not in self.stats_cache:
+            self.stats_cache[name] = self.layer(name).replicate_stats(include_blank=True)
+        return self.stats_cache[name]
+
+    def frame(self, measurement_interval, names=None):
+        """Tabela long: Measurement (nazwa metryki), Sample, Kinetics, Time_min, Metric_mean, Metric_std, n."""
+        frames = []
+        for name in (names or list(self.metrics)):
+            layer = self.layer(name)
+            frames.append(layer.stats_frame(self.stats(name), measurement_interval, METRIC_COLUMNS))
+        if not frames:
+            return pd.DataFrame(columns=["Measurement", "Sample", "Kinetics", "Time_min"] + list(METRIC_COLUMNS.values()))
+        return apply_schema(pd.concat(frames, ignore_index=True))
+
+def metrics_file(long_merged_file, measurement_interval, metrics=None, ratio_mapping=None, qc_flags=None):
+    """Etap potoku: metryki (config 'metrics', domyślnie default_metrics) -> metrics/metrics_summary.csv."""
+    df = read_long_csv(long_merged_file)
+    flags = load_qc_flags(qc_flags)
+    if flags is not None:
+        df['Value'] = df['Value'].where(qc_mask(df, flags))
+    engine = MetricEngine(PlateCube.from_long(df))
+    for name, expression in (metrics or default_metrics(ratio_mapping)).items():
+        try:
+            engine.define(name, expression)
+        except ValueError as e:
+            print(f"Pomijam metrykę '{name}': {e}")
+    result = engine.frame(measurement_interval)
+    folder = os.path.join(os.path.dirname(long_merged_file), "metrics")
+    os.makedirs(folder, exist_ok=True)
+    out_path = os.path.join(folder, "metrics_summary.csv")
+    write_csv(result, out_path, index=False)
+    print(f"Metryki ({len(engine.metrics)}) zapisano do: {out_path} (węzłów obliczonych: {engine.evaluations})")
+    return result
+
+def benchmark_metrics(n_wells=384, n_cycles=1000, n_samples=48, repeats=3, seed=0):
+    """Dziesięć metryk ze wspólnymi podwyrażeniami: jeden silnik (wspólny cache) vs osobny silnik dla każdej."""
+    rng = np.random.default_rng(seed)
+    values = rng.normal(1000, 30, (2, n_cycles, n_wells))
+    sample_of_well = np.arange(n_wells) % (n_samples + 1)
+    cube = PlateCube(values, ["Meas A", "Meas B"], np.arange(1, n_cycles + 1), [f"W{i}" for i in range(n_wells)],
+                     sample_of_well, ["BLANK"] + [f"S{i}" for i in range(1, n_samples + 1)])
+    metrics = {
+        "ratio": "corrected(MeasA) / corrected(MeasB)",
+        "ratio of means": "mean(corrected(MeasA)) / mean(corrected(MeasB))",
+        "log2 ratio": "log2(corrected(MeasA) / corrected(MeasB))",
+        "A norm": "corrected(MeasA) / ref(corrected(MeasA), 'S1')",
+        "B norm": "corrected(MeasB) / ref(corrected(MeasB), 'S1')",
+        "norm ratio": "(corrected(MeasA) / ref(corrected(MeasA), 'S1')) / (corrected(MeasB) / ref(corrected(MeasB), 'S1'))",
+        "diff": "corrected(MeasA) - corrected(MeasB)",
+        "log A": "log10(corrected(MeasA))",
+        "sqrt B": "sqrt(corrected(MeasB))",
+        "raw ratio": "MeasA / MeasB",
+    }
+
+    def shared():
+        engine = MetricEngine(cube, metrics)
+        for name in metrics:
+            engine.stats(name)
+        return engine.evaluations
+
+    def separate():
+        evaluations = 0
+        for name, expression in metrics.items():
+            engine = MetricEngine(cube, {name: expression})
+            engine.stats(name)
+            evaluations += engine.evaluations
+        return evaluations
+
+    for label, func in (("wspólny cache", shared), ("osobno", separate)):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            evaluations = func()
+            timings.append(time.perf_counter() - start)
+        print(f"{label}: {len(metrics)} metryk, {evaluations} obliczonych węzłów – najlepszy czas {min(timings):.3f} s "
+              f"({n_wells} dołków × {n_cycles} cykli)")
+    # Zgodność z PlateCube.ratio (data_ratio.py)
+    engine = MetricEngine(cube, {"r": "MeasA / MeasB"})
+    same = np.array_equal(engine.layer("r").values, cube.ratio("Meas A", "Meas B").values, equal_nan=True)
+    print("Iloraz MeasA / MeasB zgodny z PlateCube.ratio:", "tak" if same else "NIE")
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_metrics()
+        sys.exit(0)
+    path = input("Podaj ścieżkę do pliku long_merged.csv: ").strip()
+    expression = input("Wyrażenie metryki (np. corrected(MeasA) / corrected(MeasB)): ").strip()
+    engine = MetricEngine(PlateCube.from_long(read_long_csv(path)), {"metryka": expression})
+    print(engine.frame(20).head(20))
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: partitioned_store.py
+
+Wyniki zapisane jako zbiór danych podzielony na partycje (katalogi w stylu Hive):
+    dataset/<nazwa>/Measurement=Meas%20A/part-0.csv
+Kolumny partycji nie są powtarzane w plikach – ich wartości wynikają ze ścieżki.
+Plik _metadata.json opisuje zbiór: format, kolumny partycji, kolumny plików, listę partycji
+(wartości, ścieżka, liczba wierszy) oraz sygnaturę pliku źródłowego (rozmiar, mtime) –
+zbiór nieaktualny względem źródła nie jest używany (plot_data_store wraca wtedy do pliku CSV).
+Odczyt (read_partitioned) wybiera partycje na podstawie filtrów z samego _metadata.json
+(bez otwierania plików) i czyta z nich tylko żądane kolumny – koszt otwarcia zależy od wybranych
+pomiarów i kolumn, a nie od wielkości całego pliku wyników.
+Format plików: Parquet, gdy dostępny jest pyarrow, w przeciwnym razie CSV (latin1).
+Zbiory budowane z folderu wyników (build_results_datasets):
+  - blank_corrected – blank_corrected_summary.csv, partycje: Measurement,
+  - raw             – long_merged.csv (lub long_measA.csv), partycje: Measurement.
+Próby nie są poziomem partycji: selektor wykresów zawsze wczytuje wszystkie próby pomiaru (lista prób,
+zmiany nazw i łączenie replikatów działają na całym zbiorze), więc podział na próby tylko mnożyłby pliki.
+Zbiór zapisany z innymi kolumnami partycji niż w RESULT_DATASETS jest traktowany jako nieaktualny.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+
+from group_stats import GroupIndex
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+DATASET_DIR = "dataset"
+METADATA_NAME = "_metadata.json"
+METADATA_VERSION = 1
+
+# Nazwa zbioru -> (pliki źródłowe w kolejności preferencji, kolumny partycji)
+RESULT_DATASETS = {
+    "blank_corrected": ([os.path.join("blank_corrected_analysis", "blank_corrected_summary.csv")], ["Measurement"]),
+    "raw": (["long_merged.csv", "long_measA.csv"], ["Measurement"]),
+}
+
+def default_format():
+    return "parquet" if PARQUET_AVAILABLE else "csv"
+
+def _source_signature(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _partition_dir(partition_cols, values):
+    return "/".join(f"{col}={quote(str(value), safe='')}" for col, value in zip(partition_cols, values))
+
+def _write_part(df, path, fmt):
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding="latin1")
+
+def _read_part(path, fmt, columns):
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, encoding="latin1", usecols=columns)
+
+def write_partitioned(df, root, partition_cols, fmt=None, source=None):
+    """
+    Zapisuje df jako zbiór z partycjami po partition_cols (wiersze bez wartości klucza są pomijane).
+    Nowy zbiór powstaje w folderze tymczasowym i zastępuje poprzedni dopiero po zapisaniu wszystkich partycji.
+    """
+    fmt = fmt or default_format()
+    root = os.path.abspath(root)
+    parent = os.path.dirname(root)
+    os.makedirs(parent, exist_ok=True)
+    tmp_root = tempfile.mkdtemp(prefix=".tmp_", dir=parent)
+    file_columns = [c for c in df.columns if c not in partition_cols]
+    groups = GroupIndex.from_frame(df, partition_cols, sort=True)
+    keys = groups.keys_frame()
+    order = np.argsort(groups.codes, kind="stable")
+    bounds = np.searchsorted(groups.codes[order], np.arange(groups.n_groups + 1))
+    partitions = []
+    for g in range(groups.n_groups):
+        values = [str(keys[col].iloc[g]) for col in partition_cols]
+        rel_dir = _partition_dir(partition_cols, values)
+        os.makedirs(os.path.join(tmp_root, rel_dir), exist_ok=True)
+        rel_path = f"{rel_dir}/part-0.{fmt}"
+        part = df.iloc[order[bounds[g]:bounds[g + 1]]][file_columns]
+        _write_part(part, os.path.join(tmp_root, rel_path), fmt)
+        partitions.append({"values": dict(zip(partition_cols, values)), "path": rel_path, "rows": len(part)})
+    metadata = {
+        "version": METADATA_VERSION,
+        "format": fmt,
+        "partition_cols": list(partition_cols),
+        "columns": list(df.columns),
+        "file_columns": file_columns,
+        "partitions": partitions,
+        "source": source,
+    }
+    with open(os.path.join(tmp_root, METADATA_NAME), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    old_root = None
+    if os.path.isdir(root):
+        old_root = tempfile.mkdtemp(prefix=".old_", dir=parent)
+        os.replace(root, os.path.join(old_root, "dataset"))
+    os.replace(tmp_root, root)
+    if old_root:
+        shutil.rmtree(old_root, ignore_errors=True)
+    return metadata
+
+def read_metadata(root):
+    """_metadata.json zbioru lub None, gdy zbioru nie ma albo ma inną wersję."""
+    try:
+        with open(os.path.join(root, METADATA_NAME), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return metadata if metadata.get("version") == METADATA_VERSION else None
+
+def dataset_columns(root):
+    """Wszystkie kolumny zbioru (razem z kolumnami partycji) – z _metadata.json."""
+    metadata = read_metadata(root)
+    return metadata["columns"] if metadata is not None else []
+
+def partition_values(root, column, filters=None):
+    """Wartości kolumny partycji (np. lista prób danego pomiaru) – tylko z _metadata.json."""
+    metadata = read_metadata(root)
+    if metadata is None:
+        return []
+    return sorted({p["values"][column] for p in _select_partitions(metadata, filters)})
+
+def _select_partitions(metadata, filters):
+    wanted = {}
+    for col, value in (filters or {}).items():
+        if col not in metadata["partition_cols"]:
+            raise ValueError(f"Filtr po kolumnie spoza partycji: {col}")
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        wanted[col] = {str(v) for v in values}
+    return [p for p in metadata["partitions"]
+            if all(p["values"][col] in allowed for col, allowed in wanted.items())]
+
+def read_partitioned(root, columns=None, filters=None):
+    """
+    Wczytuje zbiór: tylko partycje zgodne z filters ({kolumna partycji: wartość lub lista wartości})
+    i tylko kolumny z columns (domyślnie wszystkie). Kolumny partycji odtwarzane są ze ścieżek (jako tekst).
+    """
+    metadata = read_metadata(root)
+    if metadata is None:
+        raise FileNotFoundError(f"Brak zbioru danych: {root}")
+    columns = list(columns) if columns is not None else metadata["columns"]
+    missing = [c for c in columns if c not in metadata["columns"]]
+    if missing:
+        raise ValueError(f"Brak kolumn w zbiorze {root}: {missing}")
+    file_columns = [c for c in columns if c in metadata["file_columns"]]
+    frames = []
+    for part in _select_partitions(metadata, filters):
+        path = os.path.join(root, *part["path"].split("/"))
+        if file_columns:
+            frame = _read_part(path, metadata["format"], file_columns)
+        else:
+            frame = pd.DataFrame(index=pd.RangeIndex(part["rows"]))
+        for col, value in part["values"].items():
+            if col in columns:
+                frame[col] = value
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame({c: pd.Series(dtype=object) for c in columns})
+    return pd.concat(frames, ignore_index=True)[columns]
+
+def dataset_path(base_dir, name):
+    return os.path.join(base_dir, DATASET_DIR, name)
+
+def _dataset_source(base_dir, name):
+    for rel in RESULT_DATASETS[name][0]:
+        path = os.path.join(base_dir, rel)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def _source_entry(base_dir, source):
+    return dict(_source_signature(source), path=os.path.relpath(source, base_dir).replace(os.sep, "/"))
+
+def current_dataset(base_dir, name):
+    """Ścieżka zbioru, jeśli istnieje i jest aktualny względem pliku źródłowego; w przeciwnym razie None."""
+    root = dataset_path(base_dir, name)
+    metadata = read_metadata(root)
+    source = _dataset_source(base_dir, name)
+    if metadata is None or source is None or metadata.get("source") is None:
+        return None
+    if metadata["partition_cols"] != RESULT_DATASETS[name][1]:
+        return None
+    return root if metadata["source"] == _source_entry(base_dir, source) else None
+
+def build_results_datasets(base_dir, fmt=None, names=None, force=False):
+    """
+    Buduje zbiory z partycjami dla folderu wyników – tylko brakujące lub nieaktualne względem pliku
+    źródłowego (force=True przebudowuje wszystkie); zwraca {nazwa: liczba partycji} zbudowanych zbiorów.
+    """
+    built = {}
+    for name in (names or RESULT_DATASETS):
+        source = _dataset_source(base_dir, name)
+        if source is None:
+            print(f"[DEBUG] Pomijam zbiór {name}: brak pliku źródłowego")
+            continue
+        if not force and current_dataset(base_dir, name) is not None:
+            print(f"Zbiór {name}: aktualny – bez zmian")
+            continue
+        df = pd.read_csv(source, encoding="latin1")
+        metadata = write_partitioned(df, dataset_path(base_dir, name), RESULT_DATASETS[name][1], fmt,
+                                     _source_entry(base_dir, source))
+        built[name] = len(metadata["partitions"])
+        print(f"Zbiór {name}: {len(metadata['partitions'])} partycji ({metadata['format']}) "
+              f"w {dataset_path(base_dir, name)}")
+    return built
+
+def benchmark_partitioned(n_wells=384, n_cycles=1000, n_samples=96, repeats=3, seed=0):
+    """Odczyt jednego pomiaru: cały long_merged.csv + filtr vs zbiór z partycjami (wszystkie / wybrane kolumny)."""
+    rng = np.random.default_rng(seed)
+    wells = np.array([f"{chr(65 + i // 24)}{i % 24 + 1}" for i in range(n_wells)])
+    samples = np.array([f"S{i % n_samples}" for i in range(n_wells)])
+    frames = [pd.DataFrame({
+        "Measurement": meas,
+        "Kinetics": np.repeat(np.arange(1, n_cycles + 1), n_wells),
+        "Row": np.tile([w[0] for w in wells], n_cycles),
+        "Column": np.tile([w[1:] for w in wells], n_cycles),
+        "Well": np.tile(wells, n_cycles),
+        "Value": rng.integers(400, 5000, n_cycles * n_wells),
+        "Sample": np.tile(samples, n_cycles),
+    }) for meas in ("Meas A", "Meas B")]
+    base_dir = tempfile.mkdtemp(prefix="partitioned_benchmark_")
+    try:
+        pd.concat(frames, ignore_index=True).to_csv(os.path.join(base_dir, "long_merged.csv"), index=False)
+        start = time.perf_counter()
+        build_results_datasets(base_dir, names=["raw"])
+        print(f"Budowa zbioru: {time.perf_counter() - start:.2f} s")
+        root = current_dataset(base_dir, "raw")
+        cases = (
+            ("cały CSV, filtr pomiaru", lambda: (lambda df: df[df["Measurement"] == "Meas A"])(
+                pd.read_csv(os.path.join(base_dir, "long_merged.csv"), encoding="latin1"))),
+            ("partycje – jeden pomiar", lambda: read_partitioned(root, filters={"Measurement": "Meas A"})),
+            ("partycje – jeden pomiar, 3 kolumny", lambda: read_partitioned(root, ["Sample", "Kinetics", "Value"],
+                                                                            {"Measurement": "Meas A"})),
+        )
+        for label, func in cases:
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                rows = len(func())
+                timings.append(time.perf_counter() - start)
+            print(f"{label}: {min(timings):.3f} s ({rows} wierszy)")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_partitioned()
+        sys.exit(0)
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    base_dir = args[0] if args else input("Podaj folder wyników ([nazwa_pliku]_results): ").strip()
+    build_results_datasets(base_dir, force="--force" in sys.argv)
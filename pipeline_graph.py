@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: pipeline_graph.py
+
+Przyrostowe wykonywanie etapów potoku (main.py) – graf zależności oparty na plikach.
+Każdy etap deklaruje:
+  - wejścia    – pliki lub foldery, identyfikowane skrótem SHA-256 zawartości,
+  - parametry  – wartości konfiguracji wpływające na wynik (measurement_interval, ratio_mapping,
+                 przypisanie dołków, ...),
+  - wyjścia    – pliki lub foldery zapisywane przez etap.
+Klucz etapu = skrót (nazwa, parametry, skróty wejść, skrót kodu etapu). Skrót kodu obejmuje plik z funkcją
+etapu i wszystkie moduły repozytorium importowane przez niego pośrednio lub bezpośrednio (także importy
+wewnątrz funkcji, wyszukiwane w drzewie składni; pomijane są funkcje benchmark_* i bloki __main__, które
+nie wpływają na wyniki) – zmiana modułu pomocniczego, np. plate_cube.py, readers.py, też powoduje przeliczenie.
+Etap jest pomijany, gdy klucz jest taki sam jak poprzednio, a jego wyjścia istnieją i nie były
+od tego czasu zmieniane. Zależności między etapami wynikają z plików: wyjście wcześniejszego etapu
+jest wejściem późniejszego. Porównywane są skróty treści, nie daty – jeśli przeliczony etap zapisze
+identyczny plik, kolejne etapy nadal są pomijane.
+Stan zapisywany jest w pipeline_manifest.json w folderze wyników: wpis każdego etapu (klucz, skróty
+wejść, parametry, sygnatury wyjść, czas, przyczyna przeliczenia), pamięć skrótów plików
+(po rozmiarze i czasie modyfikacji – niezmieniony plik nie jest ponownie czytany) oraz lista etapów
+przeliczonych i użytych ponownie w ostatnim uruchomieniu.
+Przy zapisie asynchronicznym (async_writer.py) etap czeka tylko na zapis swoich wejść; sygnatury wyjść
+zapisywane są w finish(), po opróżnieniu kolejki – etap, którego wyjścia nie zapisały się, jest usuwany
+z manifestu i zostanie przeliczony przy następnym uruchomieniu.
+"""
+
+import os
+import sys
+import json
+import time
+import ast
+import hashlib
+import inspect
+from datetime import datetime
+from async_writer import wait_for, flush_writes
+
+MANIFEST_NAME = "pipeline_manifest.json"
+MANIFEST_VERSION = 1
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+def _sha256_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _walk_files(path):
+    """Pliki folderu (ścieżki względne, posortowane) – lub sam plik."""
+    if os.path.isfile(path):
+        return [""]
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            files.append(os.path.relpath(os.path.join(root, name), path))
+    return sorted(files)
+
+def _is_main_block(node):
+    return (isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == "__name__")
+
+def _imported_names(path):
+    """
+    Nazwy modułów importowanych w pliku (import x, from x import y – także w funkcjach),
+    z pominięciem funkcji benchmark_* i bloku if __name__ == "__main__".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        pending = [ast.parse(f.read(), filename=path)]
+    names = set()
+    while pending:
+        node = pending.pop()
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("benchmark"):
+            continue
+        elif _is_main_block(node):
+            continue
+        pending.extend(ast.iter_child_nodes(node))
+    return names
+
+def local_module_files(path):
+    """Plik path i pliki modułów z jego folderu importowane przez niego przechodnio (posortowane)."""
+    root = os.path.dirname(os.path.abspath(path))
+    seen = set()
+    pending = [os.path.abspath(path)]
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        for name in _imported_names(current):
+            base = os.path.join(root, *name.split("."))
+            for candidate in (base + ".py", os.path.join(base, "__init__.py")):
+                if os.path.isfile(candidate):
+                    pending.append(candidate)
+                    break
+    return sorted(seen)
+
+class Pipeline:
+    def __init__(self, results_dir, force=False):
+        self.results_dir = os.path.abspath(results_dir)
+        self.manifest_path = os.path.join(self.results_dir, MANIFEST_NAME)
+        self.force = force
+        self.manifest = self._load_manifest()
+        self.computed = []
+        self.reused = []
+        self.unsigned = {}
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {"version": MANIFEST_VERSION, "stages": {}, "files": {}}
+
+    def save(self):
+        """Zapis manifestu (przez plik tymczasowy – przerwany zapis nie psuje poprzedniej wersji)."""
+        os.makedirs(self.results_dir, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _rel(self, path):
+        path = os.path.abspath(path)
+        rel = os.path.relpath(path, self.results_dir)
+        return path if rel.startswith("..") else rel.replace(os.sep, "/")
+
+    def file_hash(self, path):
+        """Skrót pliku lub folderu; None dla nieistniejącej ścieżki. Skróty plików są zapamiętywane po (rozmiar, mtime)."""
+        if not os.path.exists(path):
+            return None
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for rel in _walk_files(path):
+                digest.update(f"{rel}:{self.file_hash(os.path.join(path, rel))}\n".encode("utf-8"))
+            return digest.hexdigest()
+        st = os.stat(path)
+        stat = [st.st_size, st.st_mtime_ns]
+        cached = self.manifest["files"].get(self._rel(path))
+        if cached is not None and cached["stat"] == stat:
+            return cached["sha256"]
+        sha = _sha256_file(path)
+        self.manifest["files"][self._rel(path)] = {"stat": stat, "sha256": sha}
+        return sha
+
+    def _output_signature(self, path):
+        """Sygnatura wyjścia: (plik względny, rozmiar, mtime) – wykrywa usunięcie lub ręczną zmianę wyników."""
+        if not os.path.exists(path):
+            return None
+        signature = []
+        for rel in _walk_files(path):
+            st = os.stat(os.path.join(path, rel) if rel else path)
+            signature.append([rel, st.st_size, st.st_mtime_ns])
+        return signature
+
+    def _code_hash(self, func):
+        """Skrót pliku z funkcją etapu i wszystkich lokalnych modułów, które importuje (przechodnio)."""
+        try:
+            source = inspect.getsourcefile(func)
+            files = local_module_files(source)
+        except (TypeError, OSError, SyntaxError):
+            return getattr(func, "__qualname__", repr(func))
+        root = os.path.dirname(os.path.abspath(source))
+        digest = hashlib.sha256()
+        for path in files:
+            digest.update(f"{os.path.relpath(path, root)}:{self.file_hash(path)}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _reason(self, previous, entry):
+        if self.force:
+            return "wymuszone"
+        if previous is None:
+            return "brak poprzedniego wyniku"
+        if previous.get("code") != entry["code"]:
+            return "zmiana kodu etapu"
+        changed_params = sorted(k for k in set(previous.get("params", {})) | set(entry["params"])
+                                if _canonical(previous.get("params", {}).get(k)) != _canonical(entry["params"].get(k)))
+        if changed_params:
+            return "zmiana parametrów: " + ", ".join(changed_params)
+        changed_inputs = sorted(k for k in set(previous.get("inputs", {})) | set(entry["inputs"])
+                                if previous.get("inputs", {}).get(k) != entry["inputs"].get(k))
+        if changed_inputs:
+            return "zmiana wejść: " + ", ".join(changed_inputs)
+        return "brak lub zmiana wyjść"
+
+    def stage(self, name, func, *args, inputs=(), params=None, outputs=(), **kwargs):
+        """
+        Uruchamia func(*args, **kwargs), chyba że wejścia, parametry i kod etapu są takie same jak poprzednio,
+        a wyjścia nie zostały zmienione. Zwraca True, gdy etap został przeliczony.
+        """
+        params = json.loads(_canonical(params or {}))
+        wait_for(*inputs)
+        entry = {
+            "inputs": {self._rel(p): self.file_hash(p) for p in inputs},
+            "params": params,
+            "code": self._code_hash(func),
+        }
+        entry["key"] = hashlib.sha256(_canonical([name, entry["inputs"], params, entry["code"]]).encode("utf-8")).hexdigest()
+        previous = self.manifest["stages"].get(name)
+        outputs_unchanged = previous is not None and all(
+            previous.get("outputs", {}).get(self._rel(p)) is not None
+            and previous["outputs"][self._rel(p)] == self._output_signature(p) for p in outputs)
+        if not self.force and previous is not None and previous.get("key") == entry["key"] and outputs_unchanged:
+            previous["status"] = "reused"
+            self.reused.append(name)
+            print(f"[pipeline] {name}: bez zmian – użyto poprzednich wyników")
+            return False
+        reason = self._reason(previous, entry)
+        print(f"[pipeline] {name}: przeliczam ({reason})")
+        # Wpis usuwany przed uruchomieniem – przerwany etap zostanie przeliczony przy następnym uruchomieniu
+        self.manifest["stages"].pop(name, None)
+        self.save()
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        # Sygnatury wyjść dopiero w finish() – zapis wyjść może jeszcze trwać w tle
+        self.unsigned[name] = list(outputs)
+        entry["seconds"] = round(time.perf_counter() - start, 3)
+        entry["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        entry["reason"] = reason
+        entry["status"] = "computed"
+        self.manifest["stages"][name] = entry
+        self.computed.append(name)
+        self.save()
+        return True
+
+    def _sign_outputs(self):
+        """Po opróżnieniu kolejki zapisów: sygnatury wyjść przeliczonych etapów; etapy z błędem zapisu są usuwane."""
+        failed = [os.path.abspath(path) for path, _ in flush_writes()]
+        for name, outputs in self.unsigned.items():
+            entry = self.manifest["stages"].get(name)
+            if entry is None:
+                continue
+            paths = [os.path.abspath(p) for p in outputs]
+            if any(f == p or f.startswith(p + os.sep) for f in failed for p in paths):
+                print(f"[pipeline] {name}: błąd zapisu wyjść – etap zostanie przeliczony przy następnym uruchomieniu")
+                self.manifest["stages"].pop(name)
+                continue
+            entry["outputs"] = {self._rel(p): self._output_signature(p) for p in outputs}
+        self.unsigned = {}
+
+    def finish(self):
+        """Opróżnia kolejkę zapisów, zapisuje sygnatury wyjść i podsumowanie uruchomienia w manifeście."""
+        self._sign_outputs()
+        self.manifest["last_run"] = {
+            "started_at": self.started_at,
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "computed": self.computed,
+            "reused": self.reused,
+        }
+        self.save()
+        print(f"[pipeline] Przeliczono etapów: {len(self.computed)}, użyto ponownie: {len(self.reused)} "
+              f"(manifest: {self.manifest_path})")
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else input("Podaj folder wyników ([nazwa_pliku]_results): ").strip()
+    pipeline = Pipeline(path)
+    last = pipeline.manifest.get("last_run", {})
+    for name, stage in pipeline.manifest["stages"].items():
+        print(f"{name:12s} {stage.get('status', ''):9s} {stage.get('seconds', 0):8.2f} s  {stage.get('reason', '')}")
+    if last:
+        print(f"Ostatnie uruchomienie {last.get('started_at')}: przeliczone {last.get('computed')}, "
+              f"użyte ponownie {last.get('reused')}")
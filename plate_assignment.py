@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: plate_assignment.py
+
+Przypisanie dołków do prób w postaci kodów całkowitych:
+  - codes – płaska tablica int16 (indeks dołka -> kod próby, -1 = brak przypisania),
+    indeks dołka = wiersz * liczba_kolumn + (kolumna - 1), np. A1 -> 0, A2 -> 1, B1 -> 12,
+  - names – tabela nazw prób (kod -> nazwa).
+Zastosowanie przypisania do danych to jedno `take` na tablicy kodów, a wynikowa kolumna Sample
+jest typu categorical. Zmiana nazwy próby zmienia tylko wpis w tabeli nazw.
+Klasa udostępnia też interfejs słownika (get, [], keys, items) z kluczami w postaci "A1",
+dzięki czemu może zastąpić dotychczasowy słownik well_assignments w gui.py.
+Rozmiar płytki w from_mapping wynika z dołków mapy (najmniejszy pasujący format z plate_cube.PLATE_FORMATS,
+co najmniej 8 × 12) – mapy płytek 384/1536 (wiersze do "AF") nie wychodzą poza płytkę; nazwy, których
+nie da się odczytać jako dołek, są pomijane z ostrzeżeniem.
+"""
+
+import numpy as np
+import pandas as pd
+
+from plate_cube import well_positions, row_label
+
+class PlateAssignment:
+    def __init__(self, n_rows=8, n_cols=12):
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.codes = np.full(n_rows * n_cols, -1, dtype=np.int16)
+        self.names = []
+        self._code_of = {}
+
+    @classmethod
+    def from_mapping(cls, mapping, n_rows=8, n_cols=12):
+        """
+        Tworzy przypisanie ze słownika {"A1": "próba", ...} (wartości puste/None są pomijane).
+        Płytka ma co najmniej n_rows × n_cols dołków i jest powiększana do formatu mieszczącego wszystkie dołki mapy.
+        """
+        wells = [well for well, name in mapping.items() if name]
+        rows, cols, (fit_rows, fit_cols) = well_positions(wells)
+        unknown = [well for well, row in zip(wells, rows) if row < 0]
+        if unknown:
+            print(f"[DEBUG] Pomijam nierozpoznane dołki mapy płytki: {unknown}")
+        assignment = cls(max(n_rows, fit_rows), max(n_cols, fit_cols))
+        for well, row in zip(wells, rows):
+            if row >= 0:
+                assignment[well] = mapping[well]
+        return assignment
+
+    # --- dołki ---
+    @property
+    def wells(self):
+        return [f"{row_label(r)}{c}" for r in range(self.n_rows) for c in range(1, self.n_cols + 1)]
+
+    def well_index(self, well):
+        """Indeks dołka dla nazw typu "A1", "A01" lub "AF48"; -1 dla dołka spoza płytki."""
+        rows, cols, _ = well_positions([well])
+        row, col = rows[0], cols[0]
+        if row < 0 or row >= self.n_rows or col >= self.n_cols:
+            return -1
+        return int(row * self.n_cols + col)
+
+    def well_indices(self, rows, columns):
+        """Wektorowo: indeksy dołków dla kolumn Row (litery) i Column (numery); -1 poza płytką."""
+        row_idx = pd.Series(rows, dtype=object).astype(str).str.strip().str.upper() \
+                    .map({row_label(i): i for i in range(self.n_rows)}) \
+                    .to_numpy(dtype=float, na_value=np.nan)
+        col_idx = pd.to_numeric(pd.Series(columns), errors="coerce").to_numpy(dtype=float)
+        valid = ~np.isnan(row_idx) & ~np.isnan(col_idx) & (col_idx >= 1) & (col_idx <= self.n_cols)
+        idx = np.full(len(row_idx), -1, dtype=np.int64)
+        idx[valid] = (row_idx[valid] * self.n_cols + col_idx[valid] - 1).astype(np.int64)
+        return idx
+
+    # --- próby ---
+    def code_for(self, name):
+        """Kod próby (nowa nazwa dostaje kolejny kod)."""
+        if name not in self._code_of:
+            self._code_of[name] = len(self.names)
+            self.names.append(name)
+        return self._code_of[name]
+
+    def rename(self, old_name, new_name):
+        """Zmiana nazwy próby; gdy new_name już istnieje, dołki obu prób są łączone."""
+        if old_name not in self._code_of or old_name == new_name:
+            return
+        old_code = self._code_of.pop(old_name)
+        if new_name in self._code_of:
+            self.codes[self.codes == old_code] = self._code_of[new_name]
+            self.names[old_code] = None  # kod nieużywany, pomijany w kategoriach
+        else:
+            self.names[old_code] = new_name
+            self._code_of[new_name] = old_code
+
+    def remove(self, name):
+        """Usuwa przypisanie próby ze wszystkich dołków."""
+        code = self._code_of.get(name)
+        if code is not None:
+            self.codes[self.codes == code] = -1
+
+    def set_row(self, row_letter, name):
+        row = self.well_index(f"{row_letter}1") // self.n_cols
+        if row < 0:
+            return
+        self.codes[row * self.n_cols:(row + 1) * self.n_cols] = -1 if not name else self.code_for(name)
+
+    def set_column(self, column, name):
+        self.codes[int(column) - 1::self.n_cols] = -1 if not name else self.code_for(name)
+
+    def wells_by_sample(self):
+        """{nazwa: [dołki]} dla prób z co najmniej jednym dołkiem (kolejność dołków jak na płytce)."""
+        assigned = np.flatnonzero(self.codes >= 0)
+        wells = self.wells
+        result = {}
+        for idx in assigned:
+            result.setdefault(self.names[self.codes[idx]], []).append(wells[idx])
+        return result
+
+    def apply(self, well_indices):
+        """Kolumna Sample (categorical) dla wektora indeksów dołków; -1 / brak przypisania -> NaN."""
+        well_indices = np.asarray(well_indices, dtype=np.int64)
+        inside = (well_indices >= 0) & (well_indices < len(self.codes))
+        codes = np.where(inside, self.codes.take(np.where(inside, well_indices, 0)), -1)
+        # Kategorie tylko z aktywnych nazw; remap[-1] = -1 zachowuje brak przypisania
+        live = [code for code, name in enumerate(self.names) if name is not None]
+        remap = np.full(len(self.names) + 1, -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        return pd.Categorical.from_codes(remap[codes], categories=[self.names[code] for code in live])
+
+    # --- interfejs słownika (klucze "A1") ---
+    def __getitem__(self, well):
+        idx = self.well_index(well)
+        if idx < 0:
+            raise KeyError(well)
+        code = self.codes[idx]
+        return None if code < 0 else self.names[code]
+
+    def get(self, well, default=None):
+        idx = self.well_index(well)
+        if idx < 0 or self.codes[idx] < 0:
+            return default
+        return self.names[self.codes[idx]]
+
+    def __setitem__(self, well, name):
+        idx = self.well_index(well)
+        if idx < 0:
+            raise KeyError(well)
+        self.codes[idx] = -1 if not name else self.code_for(name)
+
+    def __contains__(self, well):
+        return self.well_index(well) >= 0
+
+    def __iter__(self):
+        return iter(self.wells)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def keys(self):
+        return self.wells
+
+    def values(self):
+        return [self.get(w) for w in self.wells]
+
+    def items(self):
+        return [(w, self.get(w)) for w in self.wells]
+
+    def to_mapping(self):
+        return dict(self.items())
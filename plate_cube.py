@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: plate_cube.py
+
+Gęsty model danych jednej analizy: tablica NumPy values[pomiar, cykl, dołek]
+z etykietami osi (measurements, kinetics, wells), przypisaniem dołek -> próba (sample_of_well)
+oraz maską present (czy dany odczyt istniał w danych – puste dołki / brakujące cykle to False).
+Blank correction, statystyki replikatów i ilorazy pomiarów są operacjami na osiach:
+  - średnia BLANK    – nanmean po dołkach BLANK -> (pomiar, cykl),
+  - statystyki prób  – mnożenie macierzowe przez macierz przynależności dołek × próba
+                       (suma, liczność, suma kwadratów odchyleń) -> (pomiar, cykl, próba),
+  - iloraz pomiarów  – dzielenie dwóch warstw kostki dołek do dołka.
+Tabele long (DataFrame) tworzone są tylko na żądanie – do zapisu (to_long, stats_frame).
+Pozycje dołków na płytce (well_positions, row_label) – wspólne dla mapy płytki (plate_heatmap.py)
+i normalizacji przestrzennej (data_spatial.py): wiersze "A"…"Z", "AA"…"AF" (płytki do 32 × 48).
+"""
+
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from data_schema import apply_schema, time_minutes
+
+ROW_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+PLATE_FORMATS = [(8, 12), (16, 24), (32, 48)]
+_WELL_RE = re.compile(r"^\s*([A-Za-z]{1,2})\s*0*(\d+)\s*$")
+
+def _row_index(letters):
+    index = 0
+    for ch in letters.upper():
+        index = index * 26 + ROW_LETTERS.index(ch) + 1
+    return index - 1
+
+def row_label(row):
+    """Etykieta wiersza dla indeksu: 0 -> "A", 25 -> "Z", 26 -> "AA"."""
+    return ROW_LETTERS[row] if row < 26 else ROW_LETTERS[row // 26 - 1] + ROW_LETTERS[row % 26]
+
+def well_positions(wells):
+    """
+    (wiersze, kolumny, (liczba wierszy, liczba kolumn)) dla nazw dołków "A1"/"P24"/"AF48";
+    dołki o nierozpoznanej nazwie mają pozycję -1. Kształt to najmniejszy pasujący format płytki.
+    """
+    rows = np.full(len(wells), -1, dtype=np.int64)
+    cols = np.full(len(wells), -1, dtype=np.int64)
+    for i, well in enumerate(wells):
+        match = _WELL_RE.match(str(well))
+        if match:
+            rows[i] = _row_index(match.group(1))
+            cols[i] = int(match.group(2)) - 1
+    n_rows = rows.max() + 1 if len(rows) else 0
+    n_cols = cols.max() + 1 if len(cols) else 0
+    shape = next(((r, c) for r, c in PLATE_FORMATS if n_rows <= r and n_cols <= c), (n_rows, n_cols))
+    return rows, cols, shape
+
+class PlateCube:
+    def __init__(self, values, measurements, kinetics, wells, sample_of_well, sample_names, present=None):
+        self.values = np.asarray(values, dtype=float)
+        self.measurements = list(measurements)
+        self.kinetics = np.asarray(kinetics)
+        self.wells = list(wells)
+        self.sample_of_well = np.asarray(sample_of_well, dtype=np.int64)
+        self.sample_names = list(sample_names)
+        self.present = ~np.isnan(self.values) if present is None else np.asarray(present, dtype=bool)
+
+    @classmethod
+    def from_long(cls, df, value_column="Value"):
+        """Buduje kostkę z tabeli long (Measurement, Kinetics, Well, Sample, Value); powtórzony odczyt -> ValueError."""
+        # factorize działa bezpośrednio na kodach kolumn category (bez konwersji na napisy)
+        meas_codes, measurements = pd.factorize(df["Measurement"], sort=False)
+        kin = pd.to_numeric(df["Kinetics"], errors="coerce").to_numpy(dtype=float)
+        kinetics = np.unique(kin[~np.isnan(kin)])
+        well_codes, wells = pd.factorize(df["Well"], sort=False)
+        sample_codes, sample_names = pd.factorize(df["Sample"], sort=True)
+        ok = (meas_codes >= 0) & ~np.isnan(kin) & (well_codes >= 0)
+        m, w, s = meas_codes[ok], well_codes[ok], sample_codes[ok]
+        k = np.searchsorted(kinetics, kin[ok])
+        shape = (len(measurements), len(kinetics), len(wells))
+        # Jedna komórka kostki = jeden odczyt; powtórzony (Measurement, Kinetics, Well) nadpisałby poprzedni po cichu
+        counts = np.bincount(np.ravel_multi_index((m, k, w), shape), minlength=int(np.prod(shape)))
+        if counts.max(initial=0) > 1:
+            dm, dk, dw = np.unravel_index(int(np.argmax(counts > 1)), shape)
+            raise ValueError(f"Powtórzony odczyt w danych long: {int((counts > 1).sum())} komórek, np. "
+                             f"Measurement={measurements[dm]}, Kinetics={kinetics[dk]:g}, Well={wells[dw]}")
+        values = np.full(shape, np.nan)
+        present = np.zeros(shape, dtype=bool)
+        values[m, k, w] = pd.to_numeric(df[value_column], errors="coerce").to_numpy(dtype=float)[ok]
+        present[m, k, w] = True
+        # Próba dołka – pierwsze wystąpienie (zapis w odwrotnej kolejności, wygrywa pierwszy wiersz)
+        sample_of_well = np.full(len(wells), -1, dtype=np.int64)
+        sample_of_well[w[::-1]] = s[::-1]
+        if np.issubdtype(kinetics.dtype, np.floating) and np.all(kinetics == np.round(kinetics)):
+            kinetics = kinetics.astype(np.int64)
+        return cls(values, [str(v) for v in measurements], kinetics, [str(v) for v in wells],
+                   sample_of_well, [str(v) for v in sample_names], present)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def mask(self):
+        """True tam, gdzie jest poprawna (nie-NaN) wartość."""
+        return self.present & ~np.isnan(self.values)
+
+    def time_min(self, measurement_interval):
+        return time_minutes(pd.Series(self.kinetics), measurement_interval).to_numpy()
+
+    def sample_code(self, name):
+        return self.sample_names.index(name) if name in self.sample_names else -1
+
+    def with_values(self, values, measurements=None, present=None):
+        """Nowa kostka z innymi wartościami (te same dołki i cykle)."""
+        return PlateCube(values, measurements or self.measurements, self.kinetics, self.wells,
+                         self.sample_of_well, self.sample_names, self.present if present is None else present)
+
+    def _membership(self, include_blank):
+        """Macierz przynależności (dołki × próby), kody uwzględnionych prób i kolumna próby dla każdego dołka."""
+        blank = self.sample_code("BLANK")
+        codes = [c for c in range(len(self.sample_names)) if include_blank or c != blank]
+        onehot = np.zeros((len(self.wells), len(codes)))
+        lookup = np.full(len(self.sample_names) + 1, -1, dtype=np.int64)
+        lookup[codes] = np.arange(len(codes))
+        col = lookup[self.sample_of_well]
+        assigned = col >= 0
+        onehot[np.flatnonzero(assigned), col[assigned]] = 1.0
+        return onehot, codes, col
+
+    def blank_mean(self, blank_name="BLANK"):
+        """Średnia dołków BLANK dla każdego (pomiar, cykl); NaN gdy brak poprawnych odczytów."""
+        blank_wells = self.sample_of_well == self.sample_code(blank_name)
+        if not blank_wells.any():
+            return np.full(self.shape[:2], np.nan)
+        valid = self.mask[:, :, blank_wells]
+        total = np.where(valid, self.values[:, :, blank_wells], 0.0).sum(axis=2)
+        count = valid.sum(axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+    def replicate_stats(self, include_blank=False):
+        """
+        Statystyki replikatów dla każdej (pomiar, cykl, próba): mean, std (ddof=1), n (liczba poprawnych
+        odczytów), sum i m2 (suma kwadratów odchyleń – statystyki dostateczne do łączenia płytek, data_pooling.py)
+        oraz present (czy próba miała w tym cyklu jakikolwiek odczyt). Klucz samples – nazwy prób.
+        """
+        onehot, codes, col = self._membership(include_blank)
+        valid = self.mask
+        filled = np.where(valid, self.values, 0.0)
+        n = valid.astype(float) @ onehot
+        total = filled @ onehot
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(n > 0, total / n, np.nan)
+            mean_of_well = np.where(col >= 0, np.take(mean, np.maximum(col, 0), axis=2), np.nan)
+            # NaN * 0 w mnożeniu macierzowym dałoby NaN – dołki spoza prób (np. BLANK) zerujemy jawnie
+            dev2 = np.where(valid & (col >= 0), (self.values - mean_of_well) ** 2, 0.0)
+            m2 = dev2 @ onehot
+            std = np.where(n > 1, np.sqrt(m2 / (n - 1)), np.nan)
+        return {
+            "samples": [self.sample_names[c] for c in codes],
+            "mean": mean,
+            "std": std,
+            "n": n.astype(np.int64),
+            "sum": total,
+            "m2": m2,
+            "present": (self.present.astype(float) @ onehot) > 0,
+        }
+
+    def blank_corrected(self, blank_name="BLANK"):
+        """Statystyki prób (bez BLANK) oraz Blank_avg i Corrected = mean − Blank_avg (brak BLANK -> 0)."""
+        stats = self.replicate_stats(include_blank=False)
+        blank = np.nan_to_num(self.blank_mean(blank_name), nan=0.0)
+        stats["blank"] = np.broadcast_to(blank[:, :, None], stats["mean"].shape)
+        stats["corrected"] = stats["mean"] - stats["blank"]
+        return stats
+
+    def ratio(self, numerator, denominator):
+        """Kostka jednowarstwowa: iloraz pomiarów dołek do dołka (mianownik 0 -> NaN)."""
+        num = self.values[self.measurements.index(numerator)]
+        den = self.values[self.measurements.index(denominator)]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = np.where(den != 0, num / den, np.nan)
+        present = self.present[self.measurements.index(numerator)] & self.present[self.measurements.index(denominator)]
+        return self.with_values(ratio[None], [f"{numerator}/{denominator}"], present[None])
+
+    def stats_frame(self, stats, measurement_interval, columns):
+        """
+        Tabela long z tablic statystyk (pomiar, cykl, próba) – tylko dla obecnych grup,
+        w kolejności pomiar, próba, cykl. columns – {klucz w stats: nazwa kolumny}.
+        """
+        present = stats["present"]
+        m, s, k = np.nonzero(present.transpose(0, 2, 1))
+        samples = np.asarray(stats["samples"], dtype=object)
+        frame = pd.DataFrame({
+            "Measurement": np.asarray(self.measurements, dtype=object)[m],
+            "Sample": samples[s],
+            "Kinetics": self.kinetics[k],
+            "Time_min": self.time_min(measurement_interval)[k],
+        })
+        for key, name in columns.items():
+            frame[name] = np.asarray(stats[key])[m, k, s]
+        return frame
+
+    def to_long(self, measurement_interval=None):
+        """Tabela long (Measurement, Kinetics, Well, Sample, Value) – tylko do eksportu."""
+        m, k, w = np.nonzero(self.present)
+        names = np.asarray(self.sample_names + [None], dtype=object)
+        frame = pd.DataFrame({
+            "Measurement": np.asarray(self.measurements, dtype=object)[m],
+            "Kinetics": self.kinetics[k],
+            "Well": np.asarray(self.wells, dtype=object)[w],
+            "Sample": names[self.sample_of_well[w]],
+            "Value": self.values[m, k, w],
+        })
+        if measurement_interval is not None:
+            frame["Time_min"] = self.time_min(measurement_interval)[k]
+        return frame
+
+def benchmark_cube(n_wells=384, n_cycles=1000, n_samples=96, repeats=3, seed=0):
+    """Porównuje blank correction na kostce z dotychczasowym groupby w pandas."""
+    rng = np.random.default_rng(seed)
+    wells = np.array([f"W{i}" for i in range(n_wells)])
+    samples = np.array(["BLANK" if i < 8 else f"S{i % n_samples}" for i in range(n_wells)])
+    kinetics = np.arange(1, n_cycles + 1)
+    df = pd.concat([pd.DataFrame({
+        "Measurement": meas,
+        "Kinetics": np.repeat(kinetics, n_wells),
+        "Well": np.tile(wells, n_cycles),
+        "Sample": np.tile(samples, n_cycles),
+        "Value": rng.normal(1000, 30, n_cycles * n_wells),
+    }) for meas in ("Meas A", "Meas B")], ignore_index=True)
+    df = apply_schema(df)  # jak po read_long_csv
+
+    def run_cube():
+        cube = PlateCube.from_long(df)
+        return cube.blank_corrected()
+
+    def run_pandas():
+        blank = df[df["Sample"] == "BLANK"].groupby(["Measurement", "Kinetics"], observed=True)["Value"].mean()
+        stats = df[df["Sample"] != "BLANK"].groupby(["Measurement", "Sample", "Kinetics"], observed=True)["Value"] \
+                  .agg(["mean", "std", "count"])
+        return stats, blank
+
+    results = {}
+    for name, func in (("kostka", run_cube), ("pandas groupby", run_pandas)):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        results[name] = min(timings)
+        print(f"{name}: {n_wells} dołków × {n_cycles} cykli × 2 pomiary – najlepszy czas {results[name]:.3f} s")
+    return results
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_cube()
+        sys.exit(0)
+    from data_schema import read_long_csv
+    cube = PlateCube.from_long(read_long_csv(input("Podaj ścieżkę do pliku long (CSV): ").strip()))
+    print(f"Kostka: {len(cube.measurements)} pomiary × {len(cube.kinetics)} cykli × {len(cube.wells)} dołków")
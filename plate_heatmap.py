@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: plate_heatmap.py
+
+Mapa cieplna płytki (wiersze × kolumny) z suwakiem po cyklach kinetyki – do wykrywania efektów
+brzegowych, gradientów i źle przypisanych dołków.
+Warstwy: surowe wartości pomiaru, wartości po korekcie BLANK (wartość dołka − średnia BLANK
+w danym cyklu) oraz iloraz pomiarów dołek do dołka – pierwsza definicja stosunku z ratio_mapping
+(jak w bootstrap_file), bez definicji dwa pierwsze pomiary (np. Meas A / Meas B).
+Wszystkie klatki liczone są raz z kostki płytki (plate_cube.py) do jednej tablicy
+(cykl, wiersz, kolumna) float32; przesunięcie suwaka podmienia tylko dane jednego artysty imshow
+(set_data) i odrysowuje go na zapamiętanym tle (blitting) – bez przerysowania osi, etykiet i paska kolorów.
+Skala kolorów jest wspólna dla wszystkich cykli (percentyle 1–99 całej warstwy).
+Dołki oznaczone w QC (qc/well_flags.csv, data_qc.py) są wykluczane jak w potoku – puste pola płytki
+i pominięte w średniej BLANK, więc warstwa po korekcie zgadza się z blank_corrected_summary.csv.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+
+from plate_cube import PlateCube, well_positions, row_label
+
+LAYERS = ["Raw", "Blank Corrected", "Ratio"]
+
+def ratio_pair(cube, ratio_mapping=None):
+    """(licznik, mianownik) warstwy Ratio: pierwsza definicja z ratio_mapping, domyślnie dwa pierwsze pomiary kostki."""
+    if ratio_mapping:
+        mapping0 = ratio_mapping[0]
+        pair = (mapping0.get("numerator"), mapping0.get("denominator"))
+        if all(name in cube.measurements for name in pair):
+            return pair
+        print(f"[DEBUG] Brak pomiarów {pair[0]}/{pair[1]} w danych płytki – iloraz dwóch pierwszych pomiarów.")
+    numerator, denominator = (cube.measurements + cube.measurements)[:2]
+    return numerator, denominator
+
+def plate_frames(cube, layer="Raw", measurement=None, numerator="Meas A", denominator="Meas B"):
+    """
+    Klatki mapy płytki: tablica (cykl, wiersz, kolumna) float32 (NaN = brak dołka / odczytu)
+    oraz etykiety (wiersze, kolumny) i nazwa próby dla każdego pola płytki.
+    """
+    if layer == "Ratio":
+        values = cube.ratio(numerator, denominator).values[0]
+    else:
+        m = cube.measurements.index(measurement or cube.measurements[0])
+        values = np.where(cube.mask[m], cube.values[m], np.nan)
+        if layer == "Blank Corrected":
+            values = values - np.nan_to_num(cube.blank_mean()[m], nan=0.0)[:, None]
+    rows, cols, (n_rows, n_cols) = well_positions(cube.wells)
+    inside = rows >= 0
+    frames = np.full((values.shape[0], n_rows, n_cols), np.nan, dtype=np.float32)
+    frames[:, rows[inside], cols[inside]] = values[:, inside]
+    samples = np.full((n_rows, n_cols), "", dtype=object)
+    names = np.asarray(cube.sample_names + [""], dtype=object)
+    samples[rows[inside], cols[inside]] = names[cube.sample_of_well[inside]]
+    row_labels = [row_label(r) for r in range(n_rows)]
+    col_labels = [str(c + 1) for c in range(n_cols)]
+    return frames, row_labels, col_labels, samples
+
+def color_limits(frames):
+    """Wspólna skala kolorów dla wszystkich cykli (percentyle 1 i 99 wartości skończonych)."""
+    finite = frames[np.isfinite(frames)]
+    if finite.size == 0:
+        return 0.0, 1.0
+    low, high = np.percentile(finite, [1, 99])
+    return float(low), float(high if high > low else low + 1)
+
+class HeatmapAnimator:
+    """
+    Jeden artysta imshow na osi; show(k) podmienia dane (set_data) i odrysowuje tylko obraz
+    i tytuł na tle zapamiętanym po ostatnim pełnym rysowaniu (copy_from_bbox / restore_region / blit).
+    """
+    def __init__(self, fig, ax, frames, row_labels, col_labels, times=None, cmap="viridis"):
+        self.fig = fig
+        self.ax = ax
+        self.canvas = fig.canvas
+        self.frames = frames
+        self.times = times
+        vmin, vmax = color_limits(frames)
+        self.image = ax.imshow(frames[0], cmap=cmap, vmin=vmin, vmax=vmax, interpolation="nearest",
+                               aspect="equal", animated=True)
+        ax.set_xticks(range(len(col_labels)))
+        ax.set_xticklabels(col_labels, fontsize=7)
+        ax.set_yticks(range(len(row_labels)))
+        ax.set_yticklabels(row_labels, fontsize=7)
+        ax.xaxis.tick_top()
+        self.colorbar = fig.colorbar(self.image, ax=ax)
+        self.label = ax.text(0.0, -0.08, "", transform=ax.transAxes, animated=True)
+        self.index = 0
+        self.background = None
+        self.cid = self.canvas.mpl_connect("draw_event", self.on_draw)
+
+    def on_draw(self, event=None):
+        # Pełne rysowanie (zmiana rozmiaru okna itp.) – nowe tło bez animowanych artystów
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        self.ax.draw_artist(self.image)
+        self.ax.draw_artist(self.label)
+
+    def label_text(self, k):
+        if self.times is None:
+            return f"Cykl {k + 1} / {len(self.frames)}"
+        return f"Cykl {k + 1} / {len(self.frames)}  ({self.times[k]:g} min)"
+
+    def show(self, k):
+        k = int(min(max(k, 0), len(self.frames) - 1))
+        self.index = k
+        self.image.set_data(self.frames[k])
+        self.label.set_text(self.label_text(k))
+        if self.background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self._draw_animated()
+        self.canvas.blit(self.fig.bbox)
+
+def load_plate_cube(base_dir):
+    """Kostka płytki z long_merged.csv (lub long_measA.csv) w folderze wyników; bez dołków oznaczonych w QC."""
+    from data_schema import read_long_csv
+    from data_qc import load_qc_flags, qc_mask
+    path = os.path.join(base_dir, "long_merged.csv")
+    if not os.path.isfile(path):
+        path = os.path.join(base_dir, "long_measA.csv")
+    df = read_long_csv(path)
+    flags = load_qc_flags(os.path.join(base_dir, "qc", "well_flags.csv"))
+    if flags is not None:
+        df['Value'] = df['Value'].where(qc_mask(df, flags))
+    return PlateCube.from_long(df)
+
+def open_plate_heatmap(master, base_dir, measurement_interval=None, cube=None, ratio_mapping=None):
+    """Okno mapy płytki (Tk) dla folderu wyników (ratio_mapping – definicje stosunków dla warstwy Ratio); zwraca obiekt okna."""
+    import tkinter as tk
+    from tkinter import ttk
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+    cube = cube if cube is not None else load_plate_cube(base_dir)
+    window = tk.Toplevel(master)
+    window.title(f"Mapa płytki – {os.path.basename(os.path.normpath(base_dir))}")
+    controls = tk.Frame(window)
+    controls.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+    layer_var = tk.StringVar(value="Raw")
+    measurement_var = tk.StringVar(value=cube.measurements[0])
+    tk.Label(controls, text="Warstwa:").pack(side=tk.LEFT, padx=5)
+    layer_combo = ttk.Combobox(controls, textvariable=layer_var, values=LAYERS, state="readonly", width=16)
+    layer_combo.pack(side=tk.LEFT, padx=5)
+    tk.Label(controls, text="Pomiar:").pack(side=tk.LEFT, padx=5)
+    measurement_combo = ttk.Combobox(controls, textvariable=measurement_var, values=cube.measurements,
+                                     state="readonly", width=10)
+    measurement_combo.pack(side=tk.LEFT, padx=5)
+    hover_var = tk.StringVar(value="")
+    tk.Label(controls, textvariable=hover_var).pack(side=tk.RIGHT, padx=5)
+
+    fig = Figure(figsize=(9, 6))
+    canvas = FigureCanvasTkAgg(fig, master=window)
+    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+    times = cube.time_min(measurement_interval) if measurement_interval else None
+    slider = tk.Scale(window, from_=1, to=len(cube.kinetics), orient=tk.HORIZONTAL, label="Cykl kinetyki")
+    slider.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
+    state = {"animator": None, "samples": None, "pending": None}
+
+    def build(*_):
+        layer = layer_var.get()
+        if layer == "Ratio" and len(cube.measurements) < 2:
+            layer_var.set("Raw")
+            layer = "Raw"
+        numerator, denominator = ratio_pair(cube, ratio_mapping)
+        frames, row_labels, col_labels, samples = plate_frames(cube, layer, measurement_var.get(),
+                                                               numerator, denominator)
+        fig.clear()
+        ax = fig.add_subplot(111)
+        title = f"{numerator}/{denominator}" if layer == "Ratio" else f"{measurement_var.get()} – {layer}"
+        ax.set_title(title, pad=20)
+        if state["animator"] is not None:
+            canvas.mpl_disconnect(state["animator"].cid)
+        state["animator"] = HeatmapAnimator(fig, ax, frames, row_labels, col_labels, times)
+        state["samples"] = samples
+        state["animator"].show(slider.get() - 1)
+        canvas.draw()
+
+    def on_slider(value):
+        # Zdarzenia suwaka łączone – rysowana jest tylko ostatnia pozycja przed bezczynnością Tk
+        if state["pending"] is None:
+            def flush():
+                state["pending"] = None
+                state["animator"].show(slider.get() - 1)
+            state["pending"] = window.after_idle(flush)
+
+    def on_motion(event):
+        animator = state["animator"]
+        if animator is None or event.inaxes is not animator.ax or event.xdata is None:
+            return
+        r, c = int(round(event.ydata)), int(round(event.xdata))
+        frames = animator.frames
+        if 0 <= r < frames.shape[1] and 0 <= c < frames.shape[2]:
+            well = f"{animator.ax.get_yticklabels()[r].get_text()}{c + 1}"
+            hover_var.set(f"{well}  {state['samples'][r, c]}  {frames[animator.index, r, c]:.4g}")
+
+    slider.configure(command=on_slider)
+    layer_combo.bind("<<ComboboxSelected>>", build)
+    measurement_combo.bind("<<ComboboxSelected>>", build)
+    canvas.mpl_connect("motion_notify_event", on_motion)
+    build()
+    return window
+
+def benchmark_heatmap(n_cycles=1000, n_rows=16, n_cols=24, seed=0):
+    """Klatki na sekundę przy przewijaniu wszystkich cykli: set_data + blitting vs pełne przerysowanie figury."""
+    rng = np.random.default_rng(seed)
+    frames = rng.normal(1000, 50, (n_cycles, n_rows, n_cols)).astype(np.float32)
+    fig, ax = plt.subplots(figsize=(9, 6))
+    animator = HeatmapAnimator(fig, ax, frames, [row_label(r) for r in range(n_rows)],
+                               [str(c + 1) for c in range(n_cols)])
+    fig.canvas.draw()
+    start = time.perf_counter()
+    for k in range(n_cycles):
+        animator.show(k)
+    blit_fps = n_cycles / (time.perf_counter() - start)
+    n_full = min(n_cycles, 100)
+    start = time.perf_counter()
+    for k in range(n_full):
+        animator.image.set_data(frames[k])
+        fig.canvas.draw()
+    full_fps = n_full / (time.perf_counter() - start)
+    plt.close(fig)
+    print(f"Płytka {n_rows}×{n_cols}, {n_cycles} cykli: blitting {blit_fps:.0f} kl./s, "
+          f"pełne przerysowanie {full_fps:.0f} kl./s")
+    return blit_fps, full_fps
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        plt.switch_backend("Agg")
+        benchmark_heatmap()
+        sys.exit(0)
+    import tkinter as tk
+    from plot_data_store import get_measurement_interval, get_ratio_mapping
+    base_dir = input("Podaj folder wyników ([nazwa_pliku]_results): ").strip()
+    root = tk.Tk()
+    root.withdraw()
+    window = open_plate_heatmap(root, base_dir, get_measurement_interval(base_dir),
+                                ratio_mapping=get_ratio_mapping(base_dir))
+    window.protocol("WM_DELETE_WINDOW", root.destroy)
+    root.mainloop()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: plot_data_store.py
+
+Wspólne wczytywanie danych do wykresów z folderu wynikowego ([nazwa_pliku]_results).
+Używane przez interactive_plot_selector (tryb interaktywny) oraz figure_export (eksport bez GUI),
+dzięki czemu oba narzędzia rysują dokładnie te same dane:
+  - "F/OD Ratio"       – iloraz skorygowanych średnich Meas A / Meas B (+ Ratio_std, jeśli dostępne),
+  - "Blank Corrected"  – blank_corrected_summary.csv dla wybranego pomiaru,
+  - "Raw Measurements" – średnia, std i liczność surowych wartości (long_merged.csv / long_measA.csv),
+  - "Metrics"          – metryki pochodne z metrics/metrics_summary.csv (metrics.py); "pomiar" to nazwa metryki.
+Dla "Raw Measurements" i "Blank Corrected" można zamiast danych wczytać krzywe wygładzone lub szybkości
+(curve = "Smoothed" / "Rate") z smoothing/smoothed_summary.csv (data_smoothing.py) – w tych samych kolumnach.
+Jeżeli istnieje bootstrap/bootstrap_ci.csv (data_bootstrap.py), do trybów "F/OD Ratio" i "Blank Corrected"
+dołączane są kolumny przedziałów ufności (CI_low, CI_high, BCa_low, BCa_high).
+Gdy folder zawiera aktualny zbiór z partycjami (dataset/, partitioned_store.py), wczytywane są tylko
+partycje wybranego pomiaru oraz potrzebne kolumny – zamiast całego pliku CSV z filtrem.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from data_schema import read_long_csv, time_minutes, apply_schema
+from group_stats import group_agg
+from partitioned_store import current_dataset, dataset_columns, read_partitioned
+
+MODE_OPTIONS = ["F/OD Ratio", "Blank Corrected", "Raw Measurements", "Metrics"]
+
+# Tryb -> (kolumna y, kolumna błędu, domyślna etykieta osi Y)
+CI_COLUMNS = ["CI_low", "CI_high", "BCa_low", "BCa_high"]
+
+MODE_COLUMNS = {
+    "F/OD Ratio": ("Ratio", "Ratio_std", "F/OD Ratio"),
+    "Blank Corrected": ("Corrected", "Sample_std", "Corrected Value"),
+    "Raw Measurements": ("Value_mean", "Value_std", "Value"),
+    "Metrics": ("Metric_mean", "Metric_std", "Metric"),
+}
+
+# Krzywa w selektorze -> prefiks kolumn smoothed_summary.csv (None – dane bez wygładzania)
+CURVE_OPTIONS = {"Dane": None, "Wygładzone": "Smoothed", "Szybkość (/min)": "Rate"}
+SMOOTHABLE_MODES = ("Raw Measurements", "Blank Corrected")
+
+def get_measurement_interval(base_dir):
+    config_path = os.path.join(base_dir, "config.txt")
+    interval = 20
+    if os.path.isfile(config_path):
+        try:
+            with open(config_path, "r") as f:
+                for line in f:
+                    if "measurement_interval" in line:
+                        interval = float(line.split("=")[1].strip())
+                        break
+        except Exception:
+            interval = 20
+    return interval
+
+def get_ratio_mapping(base_dir):
+    """Definicje stosunków z config.txt (ratio_N_numerator / ratio_N_denominator zapisane przez GUI) albo None."""
+    config_path = os.path.join(base_dir, "config.txt")
+    mapping = {}
+    if os.path.isfile(config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            for line in f:
+                key, sep, value = line.partition("=")
+                parts = key.strip().split("_")
+                if sep and len(parts) == 3 and parts[0] == "ratio" and parts[1].isdigit() \
+                        and parts[2] in ("numerator", "denominator"):
+                    mapping.setdefault(int(parts[1]), {})[parts[2]] = value.strip()
+    ratios = [mapping[i] for i in sorted(mapping) if len(mapping[i]) == 2]
+    return ratios or None
+
+def ratio_from_blank_corrected(df_bc):
+    """Iloraz skorygowanych średnich Meas A / Meas B dla każdej pary (Sample, Kinetics, Time_min)."""
+    df_A = df_bc[df_bc["Measurement"]=="Meas A"].copy()
+    df_B = df_bc[df_bc["Measurement"]=="Meas B"].copy()
+    if df_A.empty or df_B.empty:
+        raise ValueError("Brak danych dla obu pomiarów w pliku blank_corrected_summary.csv.")
+    df_A = df_A.rename(columns={"Corrected": "Corrected_A"})
+    df_B = df_B.rename(columns={"Corrected": "Corrected_B"})
+    df_merged = pd.merge(df_A, df_B, on=["Sample", "Kinetics", "Time_min"], suffixes=("_A", "_B"))
+    df_merged["Ratio"] = df_merged["Corrected_A"] / df_merged["Corrected_B"]
+    return df_merged
+
+def load_ratio_data(base_dir):
+    bc_file = os.path.join(base_dir, "blank_corrected_analysis", "blank_corrected_summary.csv")
+    if not os.path.isfile(bc_file):
+        raise FileNotFoundError(f"Brak pliku: {bc_file}")
+    dataset = current_dataset(base_dir, "blank_corrected")
+    if dataset is not None:
+        df_bc = read_partitioned(dataset, filters={"Measurement": ["Meas A", "Meas B"]})
+    else:
+        df_bc = pd.read_csv(bc_file, encoding="latin1")
+    df_merged = ratio_from_blank_corrected(df_bc)
+    ratio_file = os.path.join(base_dir, "Fluorescence_to_OD_ratio", "ratio_summary.csv")
+    if os.path.isfile(ratio_file):
+        df_ratio = pd.read_csv(ratio_file, encoding="latin1")
+        return pd.merge(df_merged, df_ratio[["Sample", "Time_min", "Ratio_std"]], on=["Sample", "Time_min"], how="left")
+    return df_merged
+
+def load_blank_corrected_data(base_dir, measurement, samples=None):
+    file_path = os.path.join(base_dir, "blank_corrected_analysis", "blank_corrected_summary.csv")
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"Brak pliku: {file_path}")
+    required = {"Sample", "Time_min", "Corrected", "Measurement"}
+    dataset = current_dataset(base_dir, "blank_corrected")
+    if dataset is not None:
+        df = read_partitioned(dataset, filters={"Measurement": measurement})
+        if not required.issubset(df.columns):
+            raise ValueError("Plik blank_corrected_summary.csv nie zawiera wymaganych kolumn.")
+    else:
+        df = pd.read_csv(file_path, encoding="latin1")
+        if not required.issubset(df.columns):
+            raise ValueError("Plik blank_corrected_summary.csv nie zawiera wymaganych kolumn.")
+        df = df[df["Measurement"] == measurement]
+    if samples is not None:
+        df = df[df["Sample"].astype(str).isin([str(s) for s in samples])]
+    return df
+
+def load_raw_data(base_dir, measurement, interval=None, samples=None):
+    file_path = os.path.join(base_dir, "long_merged.csv")
+    if not os.path.isfile(file_path):
+        file_path = os.path.join(base_dir, "long_measA.csv")
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"Brak pliku raw: {file_path}")
+    dataset = current_dataset(base_dir, "raw")
+    if dataset is not None:
+        # Tylko partycja wybranego pomiaru oraz kolumny potrzebne do agregacji
+        columns = [c for c in ["Measurement", "Sample", "Kinetics", "Value", "Time_min"] if c in dataset_columns(dataset)]
+        df = apply_schema(read_partitioned(dataset, columns, {"Measurement": measurement}))
+    else:
+        df = read_long_csv(file_path)
+    if "Time_min" not in df.columns:
+        if interval is None:
+            interval = get_measurement_interval(base_dir)
+        df['Time_min'] = time_minutes(df['Kinetics'], interval)
+    required = {"Sample", "Time_min", "Value", "Measurement"}
+    if not required.issubset(df.columns):
+        raise ValueError("Plik raw nie zawiera wymaganych kolumn.")
+    df = df[df["Measurement"] == measurement]
+    if samples is not None:
+        df = df[df["Sample"].astype(str).isin([str(s) for s in samples])]
+    grouped = group_agg(df, ['Sample','Time_min'], 'Value', ('mean', 'std', 'count'))
+    grouped['Sample'] = grouped['Sample'].astype(str)  # selektor zmienia nazwy prób w miejscu
+    grouped.rename(columns={"mean": "Value_mean", "std": "Value_std", "count": "n"}, inplace=True)
+    return grouped
+
+def metrics_path(base_dir):
+    return os.path.join(base_dir, "metrics", "metrics_summary.csv")
+
+def metric_names(base_dir):
+    """Nazwy metryk zapisanych w folderze wynikowym (pusta lista, gdy brak pliku)."""
+    if not os.path.isfile(metrics_path(base_dir)):
+        return []
+    names = pd.read_csv(metrics_path(base_dir), encoding="latin1", usecols=["Measurement"])["Measurement"]
+    return list(pd.unique(names.astype(str)))
+
+def load_metric_data(base_dir, metric, samples=None):
+    file_path = metrics_path(base_dir)
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"Brak pliku: {file_path}")
+    df = read_long_csv(file_path)
+    df = df[df["Measurement"] == metric]
+    if samples is not None:
+        df = df[df["Sample"].astype(str).isin([str(s) for s in samples])]
+    df = df.astype({"Sample": str})  # selektor zmienia nazwy prób w miejscu
+    return df.reset_index(drop=True)
+
+def smoothing_path(base_dir):
+    return os.path.join(base_dir, "smoothing", "smoothed_summary.csv")
+
+def load_smoothed_data(base_dir, mode, measurement, curve, samples=None):
+    """Krzywe wygładzone ("Smoothed") lub szybkości ("Rate") w kolumnach trybu (Value_mean/Value_std lub Corrected/Sample_std)."""
+    file_path = smoothing_path(base_dir)
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"Brak pliku: {file_path}")
+    if mode not in SMOOTHABLE_MODES:
+        raise ValueError(f"Krzywe wygładzone są dostępne tylko dla trybów: {', '.join(SMOOTHABLE_MODES)}")
+    df = read_long_csv(file_path)
+    df = df[df["Measurement"] == measurement]
+    if mode == "Raw Measurements":
+        df = df.rename(columns={f"{curve}_mean": "Value_mean", f"{curve}_std": "Value_std"})
+        df = df[["Sample", "Kinetics", "Time_min", "Value_mean", "Value_std", "n"]]
+    else:
+        # Jak blank_corrected_summary.csv – bez prób BLANK
+        df = df[df["Sample"] != "BLANK"].rename(columns={f"{curve}_corrected": "Corrected", f"{curve}_std": "Sample_std"})
+        df = df[["Sample", "Kinetics", "Time_min", "Corrected", "Sample_std", "n", "Measurement"]]
+    if samples is not None:
+        df = df[df["Sample"].astype(str).isin([str(s) for s in samples])]
+    return df.astype({"Sample": str}).reset_index(drop=True)
+
+def attach_bootstrap_ci(df, base_dir, label):
+    """Dołącza przedziały bootstrap (Measurement == label) po (Sample, Time_min), jeśli plik istnieje."""
+    ci_file = os.path.join(base_dir, "bootstrap", "bootstrap_ci.csv")
+    if df is None or not os.path.isfile(ci_file):
+        return df
+    ci = pd.read_csv(ci_file, encoding="latin1")
+    ci = ci[ci["Measurement"] == label]
+    if ci.empty:
+        return df
+    ci = ci[["Sample", "Time_min"] + CI_COLUMNS].astype({"Sample": str})
+    return pd.merge(df.drop(columns=[c for c in CI_COLUMNS if c in df.columns]), ci,
+                    on=["Sample", "Time_min"], how="left")
+
+def load_mode_data(base_dir, mode, measurement="Meas A", interval=None, samples=None, curve=None):
+    """
+    Zwraca DataFrame dla trybu wykresu lub None dla nieznanego trybu (samples – opcjonalnie tylko te próby;
+    curve – "Smoothed" / "Rate" zamiast danych, dla SMOOTHABLE_MODES).
+    """
+    if curve is not None and mode in SMOOTHABLE_MODES:
+        return load_smoothed_data(base_dir, mode, measurement, curve, samples)
+    if mode == "F/OD Ratio":
+        df = load_ratio_data(base_dir)
+        if samples is not None:
+            df = df[df["Sample"].astype(str).isin([str(s) for s in samples])]
+        return attach_bootstrap_ci(df, base_dir, "Meas A/Meas B")
+    if mode == "Blank Corrected":
+        return attach_bootstrap_ci(load_blank_corrected_data(base_dir, measurement, samples), base_dir, measurement)
+    if mode == "Raw Measurements":
+        return load_raw_data(base_dir, measurement, interval, samples)
+    if mode == "Metrics":
+        return load_metric_data(base_dir, measurement, samples)
+    return None
+
+def prepare_plot_store(base_dir, modes=None, measurements=("Meas A", "Meas B")):
+    """
+    Przygotowuje jednorazowo wszystkie dane wykresów dla jednej płytki:
+    słownik {(tryb, pomiar): DataFrame}; dla "F/OD Ratio" pomiar to None, dla "Metrics" – nazwa metryki.
+    Tryby/pomiary, dla których brakuje plików, są pomijane.
+    """
+    interval = get_measurement_interval(base_dir)
+    store = {}
+    for mode in (modes or MODE_OPTIONS):
+        names = [None] if mode == "F/OD Ratio" else metric_names(base_dir) if mode == "Metrics" else measurements
+        for meas in names:
+            try:
+                df = load_mode_data(base_dir, mode, meas, interval)
+            except (FileNotFoundError, ValueError) as e:
+                print(f"[DEBUG] Pomijam {mode} / {meas}: {e}")
+                continue
+            if df is not None and not df.empty:
+                store[(mode, meas)] = df
+    return store
+
+def fit_trendline(x, y, trend_type):
+    """Zwraca (funkcja trendu, tekst równania) lub None dla nieznanego typu."""
+    if trend_type == "Liniowy":
+        coeffs = np.polyfit(x, y, 1)
+        return np.poly1d(coeffs), f"y = {coeffs[0]:.2f}x + {coeffs[1]:.2f}"
+    if trend_type == "Wielomianowy (2nd stopnia)":
+        coeffs = np.polyfit(x, y, 2)
+        return np.poly1d(coeffs), f"y = {coeffs[0]:.2f}x² + {coeffs[1]:.2f}x + {coeffs[2]:.2f}"
+    return None
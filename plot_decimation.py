@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: plot_decimation.py
+
+Warstwa decymacji (downsamplingu) pomiędzy danymi a artystami matplotlib w interactive_plot_selector.
+Dla długich serii kinetycznych zamiast rysować każdy punkt, wybierane są punkty reprezentatywne:
+  - LTTB (Largest-Triangle-Three-Buckets) – zachowuje kształt krzywej,
+  - min/max w kubełku (odpowiadającym ~1 pikselowi) – zachowuje ekstrema.
+DecimationPyramid buduje jednorazowo piramidę wielu rozdzielczości (każdy poziom ma ~2x mniej punktów),
+więc zmiana zakresu osi X (suwak "Maksimum X") wybiera jedynie poziom, bez ponownego liczenia.
+"""
+
+import numpy as np
+
+def lttb_indices(x, y, n_out):
+    """
+    Zwraca indeksy (rosnące) n_out punktów wybranych algorytmem LTTB.
+    Pierwszy i ostatni punkt są zawsze zachowane.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # Granice kubełków dla punktów wewnętrznych (bez pierwszego i ostatniego)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    # Średnie kolejnych kubełków liczone naraz (potrzebne jako trzeci wierzchołek trójkąta)
+    cx = np.cumsum(np.concatenate(([0.0], x)))
+    cy = np.cumsum(np.concatenate(([0.0], y)))
+    starts, ends = edges[:-1], edges[1:]
+    counts = np.maximum(ends - starts, 1)
+    avg_x = (cx[ends] - cx[starts]) / counts
+    avg_y = (cy[ends] - cy[starts]) / counts
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.append(avg_y[1:], y[-1])
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for b, (start, end) in enumerate(zip(starts, ends)):
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs((x[a] - avg_x[b]) * (by - y[a]) - (x[a] - bx) * (avg_y[b] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+def minmax_indices(x, y, n_buckets):
+    """
+    Zwraca indeksy (rosnące) minimum i maksimum w każdym z n_buckets kubełków
+    równej szerokości na osi X (plus pierwszy i ostatni punkt).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n <= 2 * n_buckets or n_buckets < 1:
+        return np.arange(n)
+    span = x[-1] - x[0]
+    bucket = np.zeros(n, dtype=int) if span <= 0 else \
+        np.minimum(((x - x[0]) / span * n_buckets).astype(int), n_buckets - 1)
+    # Sortowanie po (kubełek, y) – pierwszy element segmentu to minimum, ostatni to maksimum
+    order = np.lexsort((y, bucket))
+    sorted_buckets = bucket[order]
+    first = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    picked = np.concatenate(([0, n - 1], order[first], order[last]))
+    return np.unique(picked)
+
+class DecimationPyramid:
+    """
+    Piramida rozdzielczości dla jednej serii (x rosnące).
+    levels[0] – wszystkie punkty, levels[i] – ok. n / 2**i punktów wybranych metodą `method`.
+    """
+
+    def __init__(self, x, y, method="lttb", min_points=64):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.method = method
+        finite = np.flatnonzero(~np.isnan(self.x) & ~np.isnan(self.y))
+        self.levels = [np.arange(len(self.x))]
+        current = finite
+        target = len(current) // 2
+        while target >= min_points:
+            if method == "minmax":
+                local = minmax_indices(self.x[current], self.y[current], max(target // 2, 1))
+            else:
+                local = lttb_indices(self.x[current], self.y[current], target)
+            if len(local) >= len(current):
+                break
+            current = current[local]
+            self.levels.append(current)
+            target = len(current) // 2
+
+    def select(self, x_max=None, max_points=1000):
+        """
+        Zwraca indeksy punktów z najdokładniejszego poziomu, który w zakresie x <= x_max
+        mieści się w budżecie max_points.
+        """
+        for level in self.levels:
+            if x_max is None:
+                count = len(level)
+            else:
+                count = int(np.searchsorted(self.x[level], x_max, side="right"))
+            if count <= max_points:
+                return level[:count]
+        level = self.levels[-1]
+        return level if x_max is None else level[:int(np.searchsorted(self.x[level], x_max, side="right"))]
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: readers.py
+
+Rejestr czytników plików z danymi z czytników płytek.
+Format pliku rozpoznawany jest wyłącznie na podstawie początku pliku (SNIFF_BYTES bajtów):
+każdy zarejestrowany czytnik zwraca ocenę sniff(head) w zakresie 0–1, wybierany jest czytnik
+z najwyższą oceną (rozszerzenie pliku rozstrzyga tylko remisy). Dopiero wybrany czytnik czyta cały plik.
+Czytnik udostępnia:
+  - read(path) – tabela long: Measurement, Kinetics, Row, Column, Well, Value,
+  - scan(path) – metadane dla GUI: {"measurements": [...], "platemap": {"A1": "próba", ...}},
+    bez budowania tabeli wartości.
+Wbudowane czytniki:
+  - EnSpire   – eksport bloków "Plate information" / "Results for Meas X" (pliki .txt i .csv),
+  - Long CSV  – gotowa tabela long (np. long_measA.csv z innej analizy).
+Obsługa eksportu innego urządzenia to nowa klasa z dekoratorem @register_reader.
+"""
+
+import os
+import re
+import sys
+import csv
+import time
+import tempfile
+import pandas as pd
+
+SNIFF_BYTES = 8192
+LONG_COLUMNS = ["Measurement", "Kinetics", "Row", "Column", "Well", "Value"]
+
+READERS = []
+
+def register_reader(cls):
+    """Dekorator klasy czytnika – instancja trafia do rejestru READERS."""
+    READERS.append(cls())
+    return cls
+
+def sniff_head(path, size=SNIFF_BYTES):
+    """Początek pliku jako tekst (latin1, bez BOM) – jedyna część czytana przy rozpoznawaniu formatu."""
+    with open(path, "rb") as f:
+        head = f.read(size)
+    if head.startswith(b"\xef\xbb\xbf"):
+        head = head[3:]
+    return head.decode("latin1")
+
+def detect_reader(path):
+    """Czytnik o najwyższej ocenie dla początku pliku; ValueError, gdy żaden nie rozpoznaje formatu."""
+    head = sniff_head(path)
+    ext = os.path.splitext(path)[1].lower()
+    best, best_score = None, 0.0
+    for reader in READERS:
+        score = reader.sniff(head)
+        if score > 0 and ext in reader.extensions:
+            score += 0.01
+        if score > best_score:
+            best, best_score = reader, score
+    if best is None:
+        raise ValueError(f"Nie rozpoznano formatu pliku: {path}")
+    return best
+
+def read_plate_file(path):
+    """Tabela long (LONG_COLUMNS) z pliku w dowolnym zarejestrowanym formacie."""
+    return detect_reader(path).read(path)
+
+def scan_plate_file(path):
+    """Metadane pliku (pomiary, mapa płytki) z dowolnego zarejestrowanego formatu."""
+    return detect_reader(path).scan(path)
+
+def integral_values(values):
+    """Kolumna Value jako int64, gdy wszystkie wartości są całkowite (pliki long zapisują wtedy 525, nie 525.0)."""
+    if len(values) and values.notna().all() and (values == values.round()).all():
+        return values.astype("int64")
+    return values
+
+def _empty_long():
+    return pd.DataFrame({col: pd.Series(dtype=float if col == "Value" else object) for col in LONG_COLUMNS})
+
+_RESULTS_RE = re.compile(r"^Results for (.+?)(?:\s+-.*)?$")
+_PLATEMAP_HEADER_RE = re.compile(r"^,(\s*\S+\s*,)+")
+PLATEMAP_ROWS = ["A", "B", "C", "D", "E", "F", "G", "H"]
+
+@register_reader
+class EnSpireReader:
+    """
+    Eksport EnSpire: dla każdego cyklu blok "Plate information" (Kinetics w 12. kolumnie trzeciej linii),
+    potem bloki "Results for Meas X" – nagłówek z numerami kolumn i wiersze A–H.
+    Cały plik czytany jest jednym wywołaniem read(), wartości zbierane w listach kolumn (bez słownika
+    na każdy odczyt), konwersja liczb – jednym pd.to_numeric na końcu.
+    """
+    name = "EnSpire"
+    extensions = (".txt", ".csv")
+
+    def sniff(self, head):
+        if not head.startswith("Plate information"):
+            return 0.0
+        return 1.0 if "Results for " in head else 0.6
+
+    def _lines(self, path):
+        with open(path, "r", encoding="latin1") as f:
+            return f.read().splitlines()
+
+    def read(self, path):
+        lines = self._lines(path)
+        measurement, kinetics, rows, columns, wells, values = [], [], [], [], [], []
+        current_kinetics = None
+        i, n = 0, len(lines)
+        while i < n:
+            line = lines[i].strip()
+            if line.startswith("Plate information"):
+                if i + 2 < n:
+                    plate_data = next(csv.reader([lines[i + 2].strip()]))
+                    if len(plate_data) >= 12:
+                        current_kinetics = plate_data[11].strip()
+                i += 3
+                continue
+            match = _RESULTS_RE.match(line) if line.startswith("Results for ") else None
+            if match is None or i + 1 >= n:
+                i += 1
+                continue
+            meas = match.group(1).strip()
+            # Pozycje kolumn z nagłówka (",01,02,...") – wartość dołka to komórka na tej samej pozycji
+            header = [(pos, cell.strip()) for pos, cell in enumerate(lines[i + 1].strip().split(",")) if cell.strip()]
+            labels = {col: f"{int(col)}" if col.isdigit() else col for _, col in header}
+            i += 2
+            while i < n and lines[i].strip() and "," in lines[i]:
+                cells = lines[i].strip().split(",")
+                row_letter = cells[0].strip()
+                if row_letter:
+                    for pos, col in header:
+                        if pos < len(cells):
+                            value = cells[pos].strip()
+                            if value:
+                                measurement.append(meas)
+                                kinetics.append(current_kinetics)
+                                rows.append(row_letter)
+                                columns.append(col)
+                                wells.append(f"{row_letter}{labels[col]}")
+                                values.append(value)
+                i += 1
+        if not values:
+            return _empty_long()
+        return pd.DataFrame({
+            "Measurement": measurement,
+            "Kinetics": kinetics,
+            "Row": rows,
+            "Column": columns,
+            "Well": wells,
+            "Value": pd.to_numeric(pd.Series(values), errors="coerce"),
+        })
+
+    def _platemap(self, lines):
+        start = next((i for i, line in enumerate(lines) if "Platemap:" in line), None)
+        if start is None:
+            return {}
+        header = next((i for i in range(start, len(lines)) if _PLATEMAP_HEADER_RE.match(lines[i])), None)
+        if header is None:
+            return {}
+        assignments = {}
+        for line in lines[header + 1:header + 1 + len(PLATEMAP_ROWS)]:
+            parts = line.strip().split(",")
+            row = parts[0].strip()
+            if row not in PLATEMAP_ROWS:
+                continue
+            for j, cell in enumerate(parts[1:], start=1):
+                if cell.strip():
+                    assignments[f"{row}{j}"] = cell.strip()
+        return assignments
+
+    def platemap(self, path):
+        return self._platemap(self._lines(path))
+
+    def scan(self, path):
+        lines = self._lines(path)
+        measurements = sorted({m.group(1).strip() for m in
+                               (_RESULTS_RE.match(line.strip()) for line in lines if line.startswith("Results for "))
+                               if m is not None})
+        return {"measurements": measurements, "platemap": self._platemap(lines)}
+
+@register_reader
+class LongCsvReader:
+    """Tabela long (CSV) z kolumnami Measurement, Kinetics, Well, Value (Row/Column uzupełniane z Well)."""
+    name = "Long CSV"
+    extensions = (".csv",)
+    required = {"Measurement", "Kinetics", "Well", "Value"}
+
+    def sniff(self, head):
+        first_line = head.splitlines()[0] if head else ""
+        columns = {c.strip() for c in next(csv.reader([first_line]), [])}
+        return 0.9 if self.required <= columns else 0.0
+
+    def read(self, path):
+        df = pd.read_csv(path, encoding="latin1", dtype={"Measurement": str, "Well": str, "Kinetics": str})
+        well = df["Well"].str.extract(r"^\s*([A-Za-z]{1,2})\s*0*(\d+)\s*$")
+        if "Row" not in df.columns:
+            df["Row"] = well[0].str.upper()
+        if "Column" not in df.columns:
+            df["Column"] = well[1]
+        df["Value"] = pd.to_numeric(df["Value"], errors="coerce")
+        extra = [c for c in df.columns if c not in LONG_COLUMNS]
+        return df[LONG_COLUMNS + extra]
+
+    def scan(self, path):
+        df = pd.read_csv(path, encoding="latin1", usecols=lambda c: c in ("Measurement", "Well", "Sample"), dtype=str)
+        platemap = {}
+        if "Sample" in df.columns:
+            pairs = df[["Well", "Sample"]].dropna().drop_duplicates("Well")
+            platemap = dict(zip(pairs["Well"], pairs["Sample"]))
+        return {"measurements": sorted(df["Measurement"].dropna().unique()), "platemap": platemap}
+
+def benchmark_readers(n_cycles=1000, repeats=3):
+    """Syntetyczny eksport EnSpire (n_cycles cykli × 2 pomiary × 96 dołków): czas rozpoznania formatu i odczytu."""
+    block = ["Plate information ", "Plate,Repeat,Barcode,Chamber temperature at start,Chamber temperature at end,"
+             "Ambient temperature at start,Ambient temperature at end,Meas,ScanX,ScanY,Measinfo,Kinetics,Measurement date,"]
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="latin1", newline="\r\n") as f:
+        path = f.name
+        for k in range(1, n_cycles + 1):
+            for meas in ("Meas A", "Meas B"):
+                f.write("\n".join(block + [f"1,1,,37,37,21.4,21.6,{meas},0,0,De=1st Ex=Top Em=Top,{k},2/13/2025 4:45:56 PM,",
+                                           "", f"Results for {meas} -  (RFU)", "," + ",".join(f"{c:02d}" for c in range(1, 13)) + ","]
+                                  + [r + "," + ",".join(str(500 + k + c) for c in range(12)) + "," for r in PLATEMAP_ROWS]
+                                  + ["", ""]))
+    try:
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        for label, func in (("rozpoznanie formatu", detect_reader), ("odczyt", read_plate_file)):
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                result = func(path)
+                timings.append(time.perf_counter() - start)
+            print(f"{label}: {min(timings):.4f} s (plik {size_mb:.1f} MB)")
+        print(f"Wczytano {len(result)} odczytów czytnikiem {detect_reader(path).name}")
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_readers()
+        sys.exit(0)
+    paths = sys.argv[1:] or [input("Podaj ścieżkę do pliku z danymi: ").strip()]
+    for path in paths:
+        reader = detect_reader(path)
+        df = reader.read(path)
+        print(f"{path}: format {reader.name}, {len(df)} odczytów, pomiary: {sorted(df['Measurement'].unique())}")
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: report_html.py
+
+Samodzielny raport HTML dla każdej przetworzonej analizy (folder [nazwa_pliku]_results) – zamiast zrzutów
+ekranu (save_plot) i ręcznego kopiowania tabel do dokumentów. Raport (report/report.html) zawiera:
+  - mapę płytki (próba w każdym dołku; dołki oznaczone w QC wyróżnione),
+  - mapy cieplne płytki w ostatnim cyklu: surowe wartości i po korekcie BLANK dla każdego pomiaru oraz iloraz
+    pomiarów z pierwszej definicji stosunku w config.txt (plate_heatmap.py),
+  - krzywe każdej próby osobno i wszystkich razem ("Blank Corrected", "F/OD Ratio" – figure_export.render_figure),
+  - podsumowanie korekty BLANK, tabele ilorazów (*_ratio/ratio_summary.csv) i flagi QC (qc/well_flags.csv).
+Obrazy PNG są osadzone w pliku (base64) – raport to jeden plik, który można przesłać dalej.
+Każdy wykres ma klucz: SHA-256 z rodzaju wykresu, opcji, wersji rysowania (RENDER_VERSION) i danych, z których
+powstaje (tylko użyte kolumny). Wyrenderowany wykres zapisywany jest jako <klucz>.png w folderze zasobów
+(report/assets danej analizy albo wspólny cache_dir). Przy przebudowie rysowane są tylko wykresy bez pliku
+zasobu – po zmianie konfiguracji w 50 analizach renderuje się tylko to, czego dane się zmieniły.
+Brakujące wykresy wszystkich raportów renderowane są razem w puli procesów (backend Agg, jak w figure_export.py).
+"""
+
+import os
+import sys
+import time
+import html
+import base64
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from data_qc import load_qc_flags
+from data_schema import read_long_csv
+from experiment_db import find_result_folders
+from figure_export import DEFAULT_OPTIONS, plan_figures, render_figure, _worker_init
+from plate_heatmap import load_plate_cube, plate_frames, color_limits, ratio_pair
+from plot_data_store import MODE_COLUMNS, prepare_plot_store, get_ratio_mapping
+from async_writer import atomic_write
+
+# Zmiana sposobu rysowania wykresów -> nowa wersja (unieważnia wszystkie zasoby w cache)
+RENDER_VERSION = 1
+CURVE_MODES = ("Blank Corrected", "F/OD Ratio")
+REPORT_OPTIONS = dict(DEFAULT_OPTIONS, figsize=(7, 4.5), dpi=80)
+
+def _frame_bytes(df):
+    """Bajty opisujące zawartość tabeli (kolumny + skróty wierszy) – do klucza wykresu."""
+    hashed = pd.util.hash_pandas_object(df.reset_index(drop=True), index=False).to_numpy()
+    return repr(list(df.columns)).encode("utf-8") + hashed.tobytes()
+
+def asset_key(kind, spec, data):
+    """Klucz zasobu: SHA-256 z rodzaju, specyfikacji (repr), wersji rysowania i bajtów danych."""
+    digest = hashlib.sha256(f"{kind}|{RENDER_VERSION}|{spec!r}|".encode("utf-8"))
+    digest.update(data)
+    return digest.hexdigest()
+
+def _curve_jobs(store, options):
+    """Wykresy krzywych: (klucz, rodzaj, dane zadania, podpis) dla trybów CURVE_MODES."""
+    jobs = []
+    for mode, meas, group_name, samples in plan_figures(store):
+        if mode not in CURVE_MODES:
+            continue
+        y_col, err_col, _ = MODE_COLUMNS[mode]
+        df = store[(mode, meas)]
+        columns = [c for c in ("Sample", "Time_min", y_col, err_col) if c in df.columns]
+        df = df.loc[df["Sample"].astype(str).isin(samples), columns].reset_index(drop=True)
+        spec = (mode, meas, group_name, tuple(samples), sorted(options.items(), key=lambda kv: kv[0]))
+        caption = " – ".join(part for part in (mode, meas, group_name) if part)
+        jobs.append((asset_key("curves", spec, _frame_bytes(df)), "curves",
+                     (df, mode, meas, group_name, samples, options), caption))
+    return jobs
+
+def _heatmap_jobs(cube, ratio_mapping=None):
+    """Mapy cieplne ostatniego cyklu: surowe i po korekcie BLANK dla każdego pomiaru oraz iloraz (ratio_mapping[0])."""
+    layers = [(layer, meas) for meas in cube.measurements for layer in ("Raw", "Blank Corrected")]
+    if len(cube.measurements) >= 2:
+        layers.append(("Ratio", None))
+    numerator, denominator = ratio_pair(cube, ratio_mapping)
+    jobs = []
+    for layer, meas in layers:
+        frames, row_labels, col_labels, _ = plate_frames(cube, layer, meas, numerator, denominator)
+        frame = np.ascontiguousarray(frames[-1])
+        name = f"{numerator}/{denominator}" if layer == "Ratio" else f"{meas} – {layer}"
+        title = f"{name} (ostatni cykl: {cube.kinetics[-1]})"
+        spec = (layer, meas, title, tuple(row_labels), tuple(col_labels))
+        jobs.append((asset_key("heatmap", spec, frame.tobytes()), "heatmap",
+                     (frame, row_labels, col_labels, title), name))
+    return jobs
+
+def render_heatmap(frame, row_labels, col_labels, title, out_path, cmap="viridis"):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(7, 4.5), dpi=80)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    vmin, vmax = color_limits(frame)
+    image = ax.imshow(frame, cmap=cmap, vmin=vmin, vmax=vmax, interpolation="nearest", aspect="equal")
+    ax.set_xticks(range(len(col_labels)))
+    ax.set_xticklabels(col_labels, fontsize=7)
+    ax.set_yticks(range(len(row_labels)))
+    ax.set_yticklabels(row_labels, fontsize=7)
+    ax.xaxis.tick_top()
+    ax.set_title(title, pad=20)
+    fig.colorbar(image, ax=ax)
+    fig.savefig(out_path, format="png")
+
+def render_asset(kind, payload, path):
+    """Rysuje jeden wykres do path (PNG) – atomowo, więc przerwany zapis nie zostawia niepełnego zasobu."""
+    if os.path.isfile(path):
+        return
+    def write(tmp_path):
+        png_path = tmp_path + ".png"
+        try:
+            if kind == "heatmap":
+                render_heatmap(*payload, png_path)
+            else:
+                render_figure(*payload, [png_path])
+            os.replace(png_path, tmp_path)
+        finally:
+            if os.path.exists(png_path):
+                os.remove(png_path)
+    atomic_write(path, write)
+
+def _render_batch(jobs):
+    """Renderuje listę zadań [(rodzaj, dane, ścieżka), ...]; zwraca (liczba wykresów, błędy)."""
+    count = 0
+    errors = []
+    for kind, payload, path in jobs:
+        try:
+            render_asset(kind, payload, path)
+            count += 1
+        except Exception as e:
+            errors.append(f"{os.path.basename(path)}: {e}")
+    return count, errors
+
+def _html_table(df, float_format="{:.4g}"):
+    if df is None or df.empty:
+        return "<p><i>Brak danych.</i></p>"
+    return df.to_html(index=False, border=0, classes="data", na_rep="",
+                      float_format=lambda x: float_format.format(x))
+
+def blank_summary_table(df_bc):
+    """Dla każdego pomiaru i próby: replikaty, średnia BLANK, Corrected w ostatnim cyklu i maksymalny."""
+    df_bc = df_bc.sort_values("Time_min")
+    grouped = df_bc.groupby(["Measurement", "Sample"], observed=True, sort=True)
+    table = grouped.agg(n=("n", "max"), Blank_avg_mean=("Blank_avg", "mean"),
+                        Corrected_final=("Corrected", "last"), Corrected_max=("Corrected", "max"))
+    return table.reset_index()
+
+def ratio_tables(base_dir):
+    """{nazwa folderu ilorazu: tabela wartości w ostatnim punkcie czasowym i średnich po czasie}."""
+    tables = {}
+    for name in sorted(os.listdir(base_dir)):
+        path = os.path.join(base_dir, name, "ratio_summary.csv")
+        if not name.endswith("_ratio") or not os.path.isfile(path):
+            continue
+        df = pd.read_csv(path, encoding="latin1")
+        last = df[df["Time_min"] == df["Time_min"].max()].set_index("Sample")
+        table = pd.DataFrame({
+            "Ratio_final": last["Ratio_mean"],
+            "Ratio_std_final": last["Ratio_std"],
+            "Ratio_time_mean": df.groupby("Sample")["Ratio_mean"].mean(),
+            "Count": last["Count"],
+        }).rename_axis("Sample").reset_index()
+        tables[name] = table
+    return tables
+
+def _sample_color(name):
+    hue = int(hashlib.md5(str(name).encode("utf-8")).hexdigest()[:4], 16) % 360
+    return f"hsl({hue}, 55%, 82%)"
+
+def plate_map_html(cube, flags=None):
+    """Mapa płytki jako tabela HTML: nazwa próby w dołku, kolor wg próby, dołki z flagą QC obramowane."""
+    _, row_labels, col_labels, samples = plate_frames(cube, "Raw", cube.measurements[0])
+    flagged = set()
+    if flags is not None and not flags.empty:
+        flagged = set(flags.loc[flags["Flagged"].astype(bool), "Well"].astype(str))
+    rows = ["<tr><th></th>" + "".join(f"<th>{c}</th>" for c in col_labels) + "</tr>"]
+    for r, row_label in enumerate(row_labels):
+        cells = []
+        for c, col_label in enumerate(col_labels):
+            sample = samples[r, c]
+            well = f"{row_label}{col_label}"
+            css = ' class="flagged"' if well in flagged else ""
+            style = f' style="background:{_sample_color(sample)}"' if sample else ""
+            cells.append(f'<td{css}{style} title="{well}">{html.escape(str(sample))}</td>')
+        rows.append(f"<tr><th>{row_label}</th>{''.join(cells)}</tr>")
+    return '<table class="plate">' + "".join(rows) + "</table>"
+
+def plan_report(base_dir, options=None):
+    """
+    Zawartość raportu jednej analizy bez renderowania wykresów:
+    {"run", "base_dir", "sections": [(tytuł, [element, ...]), ...], "jobs": {klucz: (rodzaj, dane)}},
+    element to ("html", tekst) albo ("figure", klucz, podpis).
+    """
+    options = dict(REPORT_OPTIONS, **(options or {}))
+    run = os.path.basename(os.path.normpath(base_dir))
+    sections = []
+    jobs = {}
+
+    def add_figures(title, figure_jobs):
+        items = []
+        for key, kind, payload, caption in figure_jobs:
+            jobs[key] = (kind, payload)
+            items.append(("figure", key, caption))
+        sections.append((title, items))
+
+    flags = load_qc_flags(os.path.join(base_dir, "qc", "well_flags.csv"))
+    try:
+        cube = load_plate_cube(base_dir)
+    except FileNotFoundError as e:
+        print(f"[DEBUG] Raport {run}: brak danych płytki ({e})")
+        cube = None
+    if cube is not None:
+        sections.append(("Mapa płytki", [("html", plate_map_html(cube, flags))]))
+        add_figures("Mapy cieplne płytki", _heatmap_jobs(cube, get_ratio_mapping(base_dir)))
+
+    store = prepare_plot_store(base_dir, modes=CURVE_MODES)
+    add_figures("Krzywe prób", _curve_jobs(store, options))
+
+    bc_file = os.path.join(base_dir, "blank_corrected_analysis", "blank_corrected_summary.csv")
+    if os.path.isfile(bc_file):
+        sections.append(("Korekta BLANK", [("html", _html_table(blank_summary_table(read_long_csv(bc_file))))]))
+    ratio_items = []
+    for name, table in ratio_tables(base_dir).items():
+        ratio_items += [("html", f"<h3>{html.escape(name)}</h3>"), ("html", _html_table(table))]
+    if ratio_items:
+        sections.append(("Ilorazy", ratio_items))
+    if flags is not None:
+        flagged = flags[flags["Flagged"].astype(bool)]
+        summary = f"<p>Oznaczono {len(flagged)} z {len(flags)} dołków (pomiar × dołek).</p>"
+        sections.append(("Flagi QC", [("html", summary), ("html", _html_table(flagged))]))
+    return {"run": run, "base_dir": base_dir, "sections": sections, "jobs": jobs}
+
+STYLE = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+h1 { border-bottom: 2px solid #446; }
+h2 { margin-top: 1.5em; color: #446; }
+figure { display: inline-block; margin: 0.5em; text-align: center; }
+figcaption { font-size: 0.85em; color: #555; }
+table.data { border-collapse: collapse; font-size: 0.85em; }
+table.data th, table.data td { border: 1px solid #ccc; padding: 2px 6px; text-align: right; }
+table.plate { border-collapse: collapse; font-size: 0.7em; }
+table.plate td, table.plate th { border: 1px solid #ccc; padding: 2px 4px; text-align: center; min-width: 2.5em; }
+table.plate td.flagged { outline: 2px solid #c00; outline-offset: -2px; }
+.missing { color: #c00; }
+"""
+
+def render_html(plan, asset_dir):
+    """Tekst raportu HTML; wykresy osadzone jako PNG base64 z plików zasobów."""
+    parts = [f"<h1>Raport analizy: {html.escape(plan['run'])}</h1>",
+             f"<p>Folder: {html.escape(os.path.abspath(plan['base_dir']))}<br>"
+             f"Wygenerowano: {datetime.now():%Y-%m-%d %H:%M}</p>"]
+    for title, items in plan["sections"]:
+        parts.append(f"<h2>{html.escape(title)}</h2>")
+        for item in items:
+            if item[0] == "html":
+                parts.append(item[1])
+                continue
+            _, key, caption = item
+            path = os.path.join(asset_dir, f"{key}.png")
+            if not os.path.isfile(path):
+                parts.append(f'<p class="missing">Brak wykresu: {html.escape(caption)}</p>')
+                continue
+            with open(path, "rb") as f:
+                data = base64.b64encode(f.read()).decode("ascii")
+            parts.append(f'<figure><img src="data:image/png;base64,{data}" alt="{html.escape(caption)}">'
+                         f"<figcaption>{html.escape(caption)}</figcaption></figure>")
+    return ("<!DOCTYPE html>\n<html lang=\"pl\"><head><meta charset=\"utf-8\">"
+            f"<title>{html.escape(plan['run'])}</title><style>{STYLE}</style></head><body>\n"
+            + "\n".join(parts) + "\n</body></html>\n")
+
+def _write_text(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def build_reports(base_dirs, cache_dir=None, workers=None, options=None):
+    """
+    Buduje report/report.html dla każdego folderu z base_dirs.
+    cache_dir – wspólny folder zasobów (None – report/assets każdej analizy; nieużywane zasoby są wtedy usuwane).
+    workers – liczba procesów renderujących (domyślnie liczba rdzeni); 1 oznacza pracę w bieżącym procesie.
+    Zwraca słownik: reports, figures, rendered, reused, seconds, errors.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    plans = []
+    pending = {}
+    n_figures = 0
+    for base_dir in base_dirs:
+        plan = plan_report(base_dir, options)
+        asset_dir = cache_dir or os.path.join(base_dir, "report", "assets")
+        os.makedirs(asset_dir, exist_ok=True)
+        plans.append((plan, asset_dir))
+        n_figures += len(plan["jobs"])
+        for key, (kind, payload) in plan["jobs"].items():
+            path = os.path.join(asset_dir, f"{key}.png")
+            if not os.path.isfile(path):
+                pending[path] = (kind, payload, path)
+
+    tasks = list(pending.values())
+    rendered = 0
+    errors = []
+    if tasks and (workers == 1 or len(tasks) == 1):
+        _worker_init()
+        rendered, errors = _render_batch(tasks)
+    elif tasks:
+        # Kilka paczek na proces – mniej przesyłania danych niż przy osobnym zadaniu na wykres
+        n_batches = min(len(tasks), workers * 4)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as pool:
+            futures = [pool.submit(_render_batch, tasks[i::n_batches]) for i in range(n_batches)]
+            for future in as_completed(futures):
+                count, errs = future.result()
+                rendered += count
+                errors.extend(errs)
+
+    for plan, asset_dir in plans:
+        report_path = os.path.join(plan["base_dir"], "report", "report.html")
+        atomic_write(report_path, lambda tmp_path, text=render_html(plan, asset_dir): _write_text(tmp_path, text))
+        if cache_dir is None:
+            used = {f"{key}.png" for key in plan["jobs"]}
+            for name in os.listdir(asset_dir):
+                if name.endswith(".png") and name not in used:
+                    os.remove(os.path.join(asset_dir, name))
+        print(f"Raport zapisano do: {report_path}")
+
+    seconds = time.perf_counter() - start
+    for err in errors:
+        print("[DEBUG] Błąd raportu:", err)
+    stats = {"reports": len(plans), "figures": n_figures, "rendered": rendered,
+             "reused": n_figures - len(tasks), "seconds": seconds, "errors": errors}
+    print(f"Raporty: {stats['reports']}, wykresy: {n_figures} (wyrenderowano {rendered}, "
+          f"z cache {stats['reused']}) w {seconds:.2f} s")
+    return stats
+
+def build_report(base_dir, **kwargs):
+    """Raport HTML jednej analizy (build_reports dla jednego folderu)."""
+    return build_reports([base_dir], **kwargs)
+
+def benchmark_reports(base_dir, copies=5, workers=None):
+    """
+    Przebudowa raportów copies kopii analizy base_dir: pierwsze budowanie (wszystkie wykresy), przebudowa bez zmian
+    (tylko HTML) oraz po zmianie danych jednej próby w jednej kopii (tylko wykresy zależne od tej próby).
+    """
+    workdir = tempfile.mkdtemp(prefix="report_html_")
+    try:
+        dirs = []
+        for i in range(copies):
+            target = os.path.join(workdir, f"run{i}_results")
+            shutil.copytree(base_dir, target, ignore=shutil.ignore_patterns("report", "dataset"))
+            dirs.append(target)
+        results = {"pierwsze budowanie": build_reports(dirs, workers=workers)}
+        results["bez zmian"] = build_reports(dirs, workers=workers)
+        bc_file = os.path.join(dirs[0], "blank_corrected_analysis", "blank_corrected_summary.csv")
+        df = pd.read_csv(bc_file, encoding="latin1")
+        sample = sorted(s for s in df["Sample"].astype(str).unique() if s != "BLANK")[0]
+        df.loc[df["Sample"].astype(str) == sample, "Corrected"] *= 1.1
+        df.to_csv(bc_file, index=False)
+        results[f"zmiana próby {sample} w 1 kopii"] = build_reports(dirs, workers=workers)
+        print(f"\nRaporty dla {copies} kopii {os.path.basename(os.path.normpath(base_dir))}:")
+        for label, stats in results.items():
+            print(f"  {label}: {stats['seconds']:.2f} s, wyrenderowano {stats['rendered']} z {stats['figures']} wykresów")
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args:
+        print("Użycie: python report_html.py FOLDER_WYNIKÓW [FOLDER ...] [--benchmark]")
+        sys.exit(1)
+    folders = [f for arg in args for f in find_result_folders(arg)]
+    if "--benchmark" in sys.argv:
+        benchmark_reports(folders[0])
+    else:
+        build_reports(folders)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: results_server.py
+
+Lokalny serwis HTTP/JSON (tylko odczyt) z wynikami przetworzonych analiz – kilka osób lub notatników
+pobiera wycinki tych samych wyników bez kopiowania folderów i ponownego parsowania CSV.
+Katalog główny to folder wynikowy ([nazwa_pliku]_results) albo folder z wieloma takimi folderami.
+Zapytania (GET):
+  /runs                            – lista analiz i dostępnych tabel,
+  /runs/<analiza>/<tabela>         – wiersze tabeli, parametry:
+      measurement=Meas A           – tylko ten pomiar (kolumna Measurement),
+      sample=S1,S2                 – tylko te próby,
+      time_min=0&time_max=300      – zakres Time_min,
+      columns=Sample,Time_min,...  – tylko te kolumny,
+      limit=1000                   – najwyżej tyle wierszy,
+      orient=split                 – {"columns": [...], "data": [[...], ...]} zamiast listy rekordów.
+Tabele: pliki wynikowe etapów potoku (TABLES) oraz "fod_ratio" – iloraz skorygowanych średnich jak w trybie
+"F/OD Ratio" selektora (plot_data_store.py).
+Wczytane tabele trzymane są w pamięci procesu (LRU, max_tables); przy każdym zapytaniu sprawdzany jest
+rozmiar i czas modyfikacji pliku – zmieniony plik jest wczytywany ponownie. Odpowiedzi mają ETag
+(sygnatura pliku + zapytanie); klient z If-None-Match dostaje 304 bez treści. Gotowe odpowiedzi JSON
+też są w LRU, więc powtórzone zapytanie nie jest ponownie filtrowane ani serializowane.
+Serwer domyślnie nasłuchuje tylko na 127.0.0.1.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from email.utils import formatdate
+import pandas as pd
+
+from data_schema import read_long_csv
+from experiment_db import find_result_folders
+from plot_data_store import load_ratio_data
+
+DEFAULT_PORT = 8765
+
+# Tabela -> ścieżka względem folderu wynikowego (wzorzec z * – pierwszy pasujący folder)
+TABLES = {
+    "blank_corrected": os.path.join("blank_corrected_analysis", "blank_corrected_summary.csv"),
+    "analysis": os.path.join("blank_corrected_analysis", "analysis", "blank_corrected_summary_summary.csv"),
+    "ratio": os.path.join("*_ratio", "ratio_summary.csv"),
+    "features": os.path.join("kinetic_features", "kinetic_features.csv"),
+    "metrics": os.path.join("metrics", "metrics_summary.csv"),
+    "smoothing": os.path.join("smoothing", "smoothed_summary.csv"),
+    "spatial": os.path.join("spatial", "spatial_summary.csv"),
+    "bootstrap": os.path.join("bootstrap", "bootstrap_ci.csv"),
+    "qc": os.path.join("qc", "well_flags.csv"),
+}
+DERIVED_TABLES = {"fod_ratio": (TABLES["blank_corrected"], load_ratio_data)}
+
+class LRUCache:
+    """Słownik o ograniczonej liczbie wpisów – najdawniej używany wpis jest usuwany jako pierwszy (bezpieczny wątkowo)."""
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+def _signature(path):
+    st = os.stat(path)
+    return f"{st.st_size}-{st.st_mtime_ns}", st.st_mtime
+
+class ResultsStore:
+    def __init__(self, root, max_tables=32, max_responses=256):
+        self.root = os.path.abspath(root)
+        self.tables = LRUCache(max_tables)
+        self.responses = LRUCache(max_responses)
+
+    def runs(self):
+        """{nazwa analizy: folder} – foldery wynikowe w katalogu głównym (odświeżane przy każdym zapytaniu)."""
+        return {os.path.basename(os.path.normpath(f)): f for f in find_result_folders(self.root)}
+
+    def table_path(self, folder, table):
+        pattern = DERIVED_TABLES[table][0] if table in DERIVED_TABLES else TABLES.get(table)
+        if pattern is None:
+            return None
+        if "*" not in pattern:
+            path = os.path.join(folder, pattern)
+            return path if os.path.isfile(path) else None
+        directory, name = os.path.split(pattern)
+        for child in sorted(os.listdir(folder)):
+            path = os.path.join(folder, child, name)
+            if child.endswith(directory.lstrip("*")) and os.path.isfile(path):
+                return path
+        return None
+
+    def available_tables(self, folder):
+        return [t for t in list(TABLES) + list(DERIVED_TABLES) if self.table_path(folder, t) is not None]
+
+    def load(self, folder, table, path):
+        """Tabela z cache, jeśli plik nie zmienił się od wczytania; w przeciwnym razie wczytanie od nowa."""
+        signature, mtime = _signature(path)
+        key = (folder, table)
+        cached = self.tables.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1], signature, mtime
+        df = DERIVED_TABLES[table][1](folder) if table in DERIVED_TABLES else read_long_csv(path)
+        self.tables.put(key, (signature, df))
+        return df, signature, mtime
+
+    def query(self, run, table, params):
+        """(status, treść JSON, ETag, czas modyfikacji) dla zapytania o tabelę analizy."""
+        folder = self.runs().get(run)
+        if folder is None:
+            return 404, {"error": f"Nieznana analiza: {run}"}, None, None
+        path = self.table_path(folder, table)
+        if path is None:
+            return 404, {"error": f"Brak tabeli '{table}' w analizie {run}",
+                         "tables": self.available_tables(folder)}, None, None
+        signature, mtime = _signature(path)
+        canonical = urllib.parse.urlencode(sorted((k, v[-1]) for k, v in params.items()))
+        etag = '"' + hashlib.sha1(f"{run}/{table}?{canonical}@{signature}".encode("utf-8")).hexdigest() + '"'
+        body = self.responses.get(etag)
+        if body is None:
+            df, _, _ = self.load(folder, table, path)
+            try:
+                df = filter_frame(df, params)
+            except ValueError as e:
+                return 400, {"error": str(e)}, None, None
+            orient = "split" if params.get("orient", [""])[-1] == "split" else "records"
+            body = df.to_json(orient=orient, index=False, force_ascii=False).encode("utf-8")
+            self.responses.put(etag, body)
+        return 200, body, etag, mtime
+
+def _param(params, name):
+    values = params.get(name)
+    return values[-1] if values else None
+
+def filter_frame(df, params):
+    """Wycinek tabeli wg parametrów zapytania (measurement, sample, time_min, time_max, columns, limit)."""
+    mask = pd.Series(True, index=df.index)
+    measurement = _param(params, "measurement")
+    if measurement is not None and "Measurement" in df.columns:
+        mask &= df["Measurement"].astype(str) == measurement
+    samples = _param(params, "sample")
+    if samples is not None and "Sample" in df.columns:
+        mask &= df["Sample"].astype(str).isin(samples.split(","))
+    for name, compare in (("time_min", lambda col, v: col >= v), ("time_max", lambda col, v: col <= v)):
+        value = _param(params, name)
+        if value is not None and "Time_min" in df.columns:
+            mask &= compare(df["Time_min"], float(value))
+    df = df[mask]
+    columns = _param(params, "columns")
+    if columns is not None:
+        missing = [c for c in columns.split(",") if c not in df.columns]
+        if missing:
+            raise ValueError(f"Nieznane kolumny: {', '.join(missing)}")
+        df = df[columns.split(",")]
+    limit = _param(params, "limit")
+    if limit is not None:
+        df = df.head(int(limit))
+    return df
+
+class ResultsHandler(BaseHTTPRequestHandler):
+    store = None  # ResultsStore – ustawiany w make_server
+
+    def _send(self, status, body, etag=None, mtime=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if mtime is not None:
+            self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        parts = [urllib.parse.unquote(p) for p in url.path.strip("/").split("/") if p]
+        params = urllib.parse.parse_qs(url.query)
+        if parts == ["runs"] or not parts:
+            runs = self.store.runs()
+            return self._send(200, {name: self.store.available_tables(folder) for name, folder in runs.items()})
+        if len(parts) == 3 and parts[0] == "runs":
+            status, body, etag, mtime = self.store.query(parts[1], parts[2], params)
+            if status == 200 and etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            return self._send(status, body, etag, mtime)
+        self._send(404, {"error": "Nieznany adres (dostępne: /runs, /runs/<analiza>/<tabela>)"})
+
+    do_HEAD = do_GET
+
+    def _read_only(self):
+        self._send(405, {"error": "Serwis tylko do odczytu"})
+
+    do_POST = do_PUT = do_DELETE = do_PATCH = _read_only
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+def make_server(root, host="127.0.0.1", port=DEFAULT_PORT, quiet=False, **store_options):
+    """Serwer (ThreadingHTTPServer) dla katalogu wyników; port 0 – dowolny wolny port."""
+    handler = type("Handler", (ResultsHandler,), {"store": ResultsStore(root, **store_options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.quiet = quiet
+    return server
+
+def benchmark_server(root, table="blank_corrected", repeats=50):
+    """Czas zapytania: pierwsze (parsowanie CSV), kolejne (cache), warunkowe (304) i pd.read_csv dla porównania."""
+    server = make_server(root, port=0, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        runs = json.loads(urllib.request.urlopen(base + "/runs").read())
+        run = next((name for name, tables in runs.items() if table in tables), None)
+        if run is None:
+            print(f"Brak analizy z tabelą '{table}' w {root}")
+            return
+        url = f"{base}/runs/{urllib.parse.quote(run)}/{table}?measurement=Meas%20A"
+
+        def timed(request):
+            start = time.perf_counter()
+            try:
+                response = urllib.request.urlopen(request)
+                response.read()
+                etag = response.headers.get("ETag")
+            except urllib.error.HTTPError as e:
+                etag = e.headers.get("ETag")
+            return time.perf_counter() - start, etag
+
+        cold, etag = timed(url)
+        warm = min(timed(url)[0] for _ in range(repeats))
+        conditional = min(timed(urllib.request.Request(url, headers={"If-None-Match": etag}))[0] for _ in range(repeats))
+        store = server.RequestHandlerClass.store
+        path = store.table_path(store.runs()[run], table)
+        start = time.perf_counter()
+        df = pd.read_csv(path, encoding="latin1")
+        df[df["Measurement"] == "Meas A"].to_json(orient="records")
+        direct = time.perf_counter() - start
+        print(f"Analiza {run}, tabela {table} ({os.path.getsize(path) / 1024:.0f} KB):")
+        print(f"  pierwsze zapytanie: {cold * 1000:.1f} ms, z cache: {warm * 1000:.2f} ms, "
+              f"warunkowe (304): {conditional * 1000:.2f} ms; pd.read_csv + filtr: {direct * 1000:.1f} ms")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    root = args[0] if args else input("Podaj folder wyników (lub folder z wieloma analizami): ").strip()
+    if "--benchmark" in sys.argv:
+        benchmark_server(root)
+        sys.exit(0)
+    port = int(args[1]) if len(args) > 1 else DEFAULT_PORT
+    server = make_server(root, port=port)
+    print(f"Serwis wyników: http://127.0.0.1:{port}/runs (Ctrl+C kończy)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
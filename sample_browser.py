@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plik: sample_browser.py
+
+Lista prób dla interaktywnego wyboru wykresów, przygotowana na tysiące pozycji (wiele analiz z sufiksami):
+  - wirtualizacja – Listbox zawiera tylko wiersze mieszczące się w oknie; przewijanie (pasek, kółko myszy)
+    zmienia jedynie numer pierwszego widocznego wiersza i podmienia kilkadziesiąt pozycji,
+  - wyszukiwanie – pole "Szukaj" filtruje próby w trakcie pisania (fragment nazwy, bez rozróżniania
+    wielkości liter; kilka fragmentów rozdzielonych spacją muszą wystąpić wszystkie),
+  - grupowanie – po prefiksie (próba bazowa, np. ta sama próba z różnych analiz) lub po sufiksie
+    (analiza); klik w nagłówek grupy zaznacza/odznacza wszystkie jej widoczne próby, podwójny klik zwija grupę,
+  - zaznaczenie przechowywane jest jako zbiór nazw (nie indeksów wierszy) – przetrwa filtrowanie,
+    przewijanie i ponowne wczytanie listy,
+  - zmiany zaznaczenia i filtru zgłaszane są z opóźnieniem (debounce): seria szybkich kliknięć
+    to jedno wywołanie on_change (jedno przerysowanie wykresu).
+Stan listy (SampleListModel) nie zależy od Tk; widżet SampleBrowser tylko go wyświetla.
+"""
+
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk, font as tkfont
+
+GROUP_MODES = {"Brak": None, "Prefiks (próba)": "prefix", "Sufiks (analiza)": "suffix"}
+
+def split_name(name):
+    """Domyślny podział nazwy na (prefiks, sufiks) – przy pierwszym "_" (sufiks analizy dodawany przez selektor)."""
+    prefix, sep, rest = name.partition("_")
+    return prefix, sep + rest
+
+class SampleListModel:
+    """Próby, filtr, grupowanie i zaznaczenie; rows – wiersze do wyświetlenia ("group" lub "item")."""
+    def __init__(self):
+        self.items = []
+        self.groups = {}
+        self.selected = set()
+        self.filter_text = ""
+        self.group_mode = None
+        self.collapsed = set()
+        self.rows = []
+        self.visible = []
+        self._order = {}
+
+    def set_items(self, items, groups=None, keep_selection=True):
+        """Nowa lista prób; groups – {próba: (prefiks, sufiks)} (domyślnie split_name)."""
+        self.items = list(items)
+        self._order = {name: i for i, name in enumerate(self.items)}
+        self.groups = dict(groups) if groups else {}
+        self.selected = {s for s in self.selected if s in self._order} if keep_selection else set()
+        self.rebuild()
+
+    def group_key(self, name):
+        parts = self.groups.get(name) or split_name(name)
+        return parts[0] if self.group_mode == "prefix" else parts[1]
+
+    def matches(self, name):
+        terms = self.filter_text.lower().split()
+        lowered = name.lower()
+        return all(term in lowered for term in terms)
+
+    def rebuild(self):
+        """Przelicza widoczne próby i wiersze – tylko po zmianie listy, filtru lub grupowania."""
+        self.visible = [name for name in self.items if self.matches(name)] if self.filter_text.strip() else list(self.items)
+        if self.group_mode is None:
+            self.rows = [("item", name) for name in self.visible]
+            return
+        members = {}
+        for name in self.visible:
+            members.setdefault(self.group_key(name), []).append(name)
+        self.rows = []
+        for key in sorted(members):
+            self.rows.append(("group", key, members[key]))
+            if key not in self.collapsed:
+                self.rows.extend(("item", name) for name in members[key])
+
+    def set_filter(self, text):
+        self.filter_text = text
+        self.rebuild()
+
+    def set_group_mode(self, mode):
+        self.group_mode = mode
+        self.collapsed.clear()
+        self.rebuild()
+
+    def toggle_collapsed(self, key):
+        self.collapsed.symmetric_difference_update({key})
+        self.rebuild()
+
+    def toggle(self, name):
+        self.selected.symmetric_difference_update({name})
+
+    def toggle_group(self, members):
+        """Zaznacza wszystkie próby grupy; jeśli wszystkie były zaznaczone – odznacza je."""
+        if all(name in self.selected for name in members):
+            self.selected.difference_update(members)
+        else:
+            self.selected.update(members)
+
+    def select_range(self, first_row, last_row):
+        lo, hi = sorted((first_row, last_row))
+        self.selected.update(row[1] for row in self.rows[lo:hi + 1] if row[0] == "item")
+
+    def get_selected(self):
+        """Zaznaczone próby w kolejności listy."""
+        return sorted(self.selected, key=self._order.get)
+
+    def set_selected(self, names):
+        self.selected = {name for name in names if name in self._order}
+
+    def rename(self, old, new):
+        if old in self.selected:
+            self.selected.discard(old)
+            self.selected.add(new)
+
+    def row_text(self, row):
+        if row[0] == "group":
+            members = row[2]
+            marked = sum(1 for name in members if name in self.selected)
+            arrow = "▸" if row[1] in self.collapsed else "▾"
+            return f"{arrow} {row[1] or '(bez sufiksu)'}  [{marked}/{len(members)}]"
+        return ("    " if self.group_mode else "") + row[1]
+
+class SampleBrowser(tk.Frame):
+    """
+    Widżet listy prób. on_change() – po zmianie zaznaczenia (z opóźnieniem debounce_ms),
+    on_activate(próba) – podwójny klik na próbie (np. zmiana koloru).
+    """
+    def __init__(self, master, on_change=None, on_activate=None, height=15, debounce_ms=150):
+        super().__init__(master)
+        self.model = SampleListModel()
+        self.on_change = on_change
+        self.on_activate = on_activate
+        self.debounce_ms = debounce_ms
+        self.rows_visible = height
+        self.top = 0
+        self.anchor = None
+        self.change_job = None
+        self.filter_job = None
+
+        search_frame = tk.Frame(self)
+        search_frame.pack(side=tk.TOP, fill=tk.X)
+        tk.Label(search_frame, text="Szukaj:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar(value="")
+        self.filter_entry = tk.Entry(search_frame, textvariable=self.filter_var, width=18)
+        self.filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2)
+        self.filter_var.trace_add("write", lambda *_: self.schedule_filter())
+        group_frame = tk.Frame(self)
+        group_frame.pack(side=tk.TOP, fill=tk.X)
+        tk.Label(group_frame, text="Grupuj:").pack(side=tk.LEFT)
+        self.group_var = tk.StringVar(value="Brak")
+        group_combo = ttk.Combobox(group_frame, textvariable=self.group_var, values=list(GROUP_MODES),
+                                   state="readonly", width=16)
+        group_combo.pack(side=tk.LEFT, padx=2)
+        group_combo.bind("<<ComboboxSelected>>", lambda e: self.on_group_mode())
+
+        list_frame = tk.Frame(self)
+        list_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # Listbox bez własnego przewijania – zawiera tylko widoczne wiersze
+        self.listbox = tk.Listbox(list_frame, height=height, activestyle="none", exportselection=False,
+                                  selectmode=tk.MULTIPLE)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.listbox.bind("<Button-1>", self.on_click)
+        self.listbox.bind("<Shift-Button-1>", self.on_shift_click)
+        self.listbox.bind("<Double-Button-1>", self.on_double_click)
+        self.listbox.bind("<B1-Motion>", lambda e: "break")
+        self.listbox.bind("<Configure>", self.on_resize)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.listbox.bind(sequence, self.on_wheel)
+        self.status_var = tk.StringVar(value="")
+        tk.Label(self, textvariable=self.status_var).pack(side=tk.TOP)
+
+    # --- API dla selektora ---
+    def set_items(self, items, groups=None, keep_selection=True):
+        self.model.set_items(items, groups, keep_selection)
+        self.render()
+
+    def get_selected(self):
+        return self.model.get_selected()
+
+    def set_selected(self, names):
+        self.model.set_selected(names)
+        self.render()
+
+    def visible_items(self):
+        """Próby spełniające filtr (w kolejności listy)."""
+        return list(self.model.visible)
+
+    def select_all(self):
+        """Zaznacza wszystkie widoczne (przefiltrowane) próby."""
+        self.model.selected.update(self.model.visible)
+        self.render()
+        self.notify()
+
+    def clear_selection(self):
+        self.model.selected.clear()
+        self.render()
+        self.notify()
+
+    def rename(self, old, new):
+        self.model.rename(old, new)
+
+    # --- wyświetlanie ---
+    def render(self):
+        rows = self.model.rows
+        self.top = max(0, min(self.top, len(rows) - self.rows_visible))
+        window = rows[self.top:self.top + self.rows_visible]
+        self.listbox.delete(0, tk.END)
+        if window:
+            self.listbox.insert(tk.END, *(self.model.row_text(row) for row in window))
+        for i, row in enumerate(window):
+            if row[0] == "group":
+                self.listbox.itemconfig(i, background="#e4e4e4")
+            elif row[1] in self.model.selected:
+                self.listbox.selection_set(i)
+        if rows:
+            self.scrollbar.set(self.top / len(rows), min(1.0, (self.top + self.rows_visible) / len(rows)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        shown = len(self.model.visible)
+        self.status_var.set(f"Zaznaczono {len(self.model.selected)} z {len(self.model.items)}"
+                            + (f" (widoczne {shown})" if shown != len(self.model.items) else ""))
+
+    def scroll_to(self, top):
+        top = max(0, min(int(top), len(self.model.rows) - self.rows_visible))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(value) * len(self.model.rows))
+        elif action == "scroll":
+            step = self.rows_visible if unit == "pages" else 1
+            self.scroll_to(self.top + int(value) * step)
+
+    def on_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_to(self.top - 3)
+        else:
+            self.scroll_to(self.top + 3)
+        return "break"
+
+    def on_resize(self, event):
+        font = tkfont.Font(font=self.listbox.cget("font"))
+        line = font.metrics("linespace") + 1 + 2 * int(self.listbox.cget("selectborderwidth"))
+        inner = event.height - 2 * (int(self.listbox.cget("borderwidth")) + int(self.listbox.cget("highlightthickness")))
+        rows = max(1, inner // line)
+        if rows != self.rows_visible:
+            self.rows_visible = rows
+            self.render()
+
+    # --- zdarzenia ---
+    def row_at(self, event):
+        index = self.top + self.listbox.nearest(event.y)
+        return index if 0 <= index < len(self.model.rows) else None
+
+    def on_click(self, event):
+        index = self.row_at(event)
+        if index is not None:
+            row = self.model.rows[index]
+            if row[0] == "group":
+                self.model.toggle_group(row[2])
+            else:
+                self.model.toggle(row[1])
+                self.anchor = index
+            self.render()
+            self.notify()
+        return "break"
+
+    def on_shift_click(self, event):
+        index = self.row_at(event)
+        if index is not None:
+            self.model.select_range(self.anchor if self.anchor is not None else index, index)
+            self.anchor = index
+            self.render()
+            self.notify()
+        return "break"
+
+    def on_double_click(self, event):
+        index = self.row_at(event)
+        if index is None:
+            return "break"
+        row = self.model.rows[index]
+        if row[0] == "group":
+            # Pierwsze kliknięcie zaznaczyło grupę – cofamy je i zwijamy/rozwijamy grupę
+            self.model.toggle_group(row[2])
+            self.model.toggle_collapsed(row[1])
+            self.render()
+            self.notify()
+        elif self.on_activate is not None:
+            self.on_activate(row[1])
+        return "break"
+
+    def on_group_mode(self):
+        self.model.set_group_mode(GROUP_MODES.get(self.group_var.get()))
+        self.top = 0
+        self.render()
+
+    def schedule_filter(self):
+        if self.filter_job is not None:
+            self.after_cancel(self.filter_job)
+        self.filter_job = self.after(self.debounce_ms, self.apply_filter)
+
+    def apply_filter(self):
+        self.filter_job = None
+        self.model.set_filter(self.filter_var.get())
+        self.top = 0
+        self.render()
+        self.notify()
+
+    def notify(self):
+        """Opóźnione on_change – kolejne zmiany w czasie debounce_ms przesuwają jedno wywołanie."""
+        if self.on_change is None:
+            return
+        if self.change_job is not None:
+            self.after_cancel(self.change_job)
+        self.change_job = self.after(self.debounce_ms, self.fire_change)
+
+    def fire_change(self):
+        self.change_job = None
+        self.on_change()
+
+def benchmark_sample_list(n_runs=40, n_samples=96, repeats=5):
+    """Czas odświeżenia listy (set_items), filtrowania i grupowania dla n_runs × n_samples prób – bez Tk."""
+    items = [f"S{s}_run{r}" for r in range(n_runs) for s in range(n_samples)]
+    model = SampleListModel()
+    cases = (
+        ("set_items", lambda: model.set_items(items)),
+        ("filtr 'S1_'", lambda: model.set_filter("S1_")),
+        ("grupowanie po prefiksie", lambda: model.set_group_mode("prefix")),
+        ("filtr pusty", lambda: model.set_filter("")),
+    )
+    for label, func in cases:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        print(f"{label}: {min(timings) * 1000:.2f} ms ({len(model.rows)} wierszy)")
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_sample_list()
+        sys.exit(0)
+    root = tk.Tk()
+    root.title("Lista prób")
+    browser = SampleBrowser(root, on_change=lambda: print("Zaznaczone:", browser.get_selected()[:10]))
+    browser.pack(fill=tk.BOTH, expand=True)
+    browser.set_items([f"S{s}_run{r}" for r in range(20) for s in range(96)])
+    root.mainloop()
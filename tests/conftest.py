@@ -0,0 +1,5 @@
+# Moduły programu leżą w katalogu głównym repozytorium (bez pakietu) – dodajemy go do ścieżki importu testów.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Zgodność jądra agregacji (group_stats.py) z pandas groupby(...).agg."""
+
+import numpy as np
+import pandas as pd
+
+from group_stats import GroupIndex, group_agg, verify_against_pandas
+
+KEYS = ["Measurement", "Sample", "Kinetics"]
+
+def long_frame(n_rows=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Measurement": pd.Categorical(rng.choice(["Meas A", "Meas B"], n_rows)),
+        "Sample": rng.choice([f"S{i}" for i in range(12)] + ["BLANK"], n_rows),
+        "Kinetics": rng.integers(1, 30, n_rows).astype(np.int16),
+        "Value": rng.normal(1000, 50, n_rows),
+    })
+    df.loc[rng.random(n_rows) < 0.05, "Value"] = np.nan
+    return df
+
+def assert_matches(ours, expected, stats):
+    assert len(ours) == len(expected)
+    for key in KEYS:
+        assert (ours[key].astype(str).to_numpy() == expected[key].astype(str).to_numpy()).all(), key
+    for stat in stats:
+        assert np.allclose(ours[stat].to_numpy(dtype=float), expected[stat].to_numpy(dtype=float),
+                           rtol=1e-9, atol=1e-9, equal_nan=True), stat
+
+def test_mean_std_count_match_pandas():
+    df = long_frame()
+    stats = ["mean", "std", "count"]
+    expected = df.groupby(KEYS, observed=True)["Value"].agg(stats).reset_index()
+    assert_matches(group_agg(df, KEYS, "Value", stats), expected, stats)
+
+def test_std_uses_ddof_1():
+    df = long_frame(seed=1)
+    ours = group_agg(df, KEYS, "Value", ("std",))
+    expected = df.groupby(KEYS, observed=True)["Value"].agg(lambda v: np.std(v.dropna(), ddof=1)).reset_index()
+    assert np.allclose(ours["std"].to_numpy(), expected["Value"].to_numpy(), equal_nan=True)
+
+def test_order_stats_and_sum_match_pandas():
+    df = long_frame(seed=2)
+    stats = ["sum", "min", "max", "median"]
+    expected = df.groupby(KEYS, observed=True)["Value"].agg(stats).reset_index()
+    assert_matches(group_agg(df, KEYS, "Value", stats), expected, stats)
+
+def test_first_appearance_order_without_sort():
+    df = long_frame(seed=3)
+    stats = ["mean", "std", "count"]
+    expected = df.groupby(KEYS, observed=True, sort=False)["Value"].agg(stats).reset_index()
+    assert_matches(group_agg(df, KEYS, "Value", stats, sort=False), expected, stats)
+
+def test_single_and_empty_groups():
+    df = pd.DataFrame({"k": ["a", "b", "b", "c"], "v": [1.0, 2.0, 4.0, np.nan]})
+    ours = group_agg(df, ["k"], "v", ("mean", "std", "count"))
+    assert ours["k"].tolist() == ["a", "b", "c"]
+    assert ours["count"].tolist() == [1, 2, 0]
+    assert np.isnan(ours["std"][0]) and np.isclose(ours["std"][1], np.sqrt(2.0))
+    assert np.isclose(ours["mean"][1], 3.0) and np.isnan(ours["mean"][2])
+
+def test_missing_keys_belong_to_no_group():
+    df = pd.DataFrame({"k": ["a", None, "a", "b"], "v": [1.0, 100.0, 3.0, 5.0]})
+    ours = group_agg(df, ["k"], "v", ("mean", "count"))
+    assert ours["k"].tolist() == ["a", "b"]
+    assert ours["count"].tolist() == [2, 1]
+    assert np.allclose(ours["mean"], [2.0, 5.0])
+
+def test_transform_matches_pandas():
+    df = long_frame(seed=4)
+    index = GroupIndex.from_frame(df, KEYS)
+    for stat in ("mean", "median", "count"):
+        expected = df.groupby(KEYS, observed=True)["Value"].transform(stat).to_numpy(dtype=float)
+        assert np.allclose(index.transform(df["Value"], stat), expected, equal_nan=True), stat
+
+def test_verify_against_pandas():
+    verify_against_pandas(n_rows=20_000)